@@ -1,13 +1,37 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response
+from dataclasses import asdict
 import json
 import os
-import asyncio
-from modules.base_runner import BaseTestRunner
-from modules.detect_selector import detect_input_selector
-import importlib
-import sys
+import queue
+import threading
+import time
+from modules.browser_pool import WarmBrowserPool
+from modules.detect_selector import DEFAULT_PROBE_PROMPT, detect_selectors_async
+from modules.job_manager import JobManager
+from modules.live_metrics import get_live_metrics
 
 app = Flask(__name__)
+_job_manager: JobManager = None
+_job_manager_lock = threading.Lock()
+
+def get_job_manager() -> JobManager:
+    """
+    取得背景測試工作管理器（第一次呼叫時建立），同時執行的測試數量可用環境變數 MAX_CONCURRENT_RUNS 調整（預設為 1）。
+    管理器帶有常駐的 Playwright driver 與瀏覽器池，測試與選擇器偵測共用；
+    WARM_BROWSERS 為建立時預先開啟的瀏覽器數，WARM_BROWSER_HEADLESS 為其 headless 模式（選擇器偵測一律使用 headless）。
+    不在匯入時建立，避免 werkzeug reloader 的監看行程也啟動一組不會被使用的瀏覽器。
+    """
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            browser_pool = WarmBrowserPool(
+                max_size=int(os.environ.get("WARM_BROWSER_POOL_SIZE", 4)),
+                idle_timeout=float(os.environ.get("WARM_BROWSER_IDLE_TIMEOUT", 600)))
+            _job_manager = JobManager(max_concurrent_runs=int(os.environ.get("MAX_CONCURRENT_RUNS", 1)), browser_pool=browser_pool)
+            if int(os.environ.get("WARM_BROWSERS", 1)) > 0:
+                _job_manager.schedule(browser_pool.prewarm(
+                    int(os.environ.get("WARM_BROWSERS", 1)), headless=os.environ.get("WARM_BROWSER_HEADLESS", "1") != "0"))
+        return _job_manager
 
 def format_selector(config: dict) -> dict:
     new_config = config.copy()
@@ -107,48 +131,98 @@ def delete_config(config_name):
 @app.route('/detect_selector', methods=['POST'])
 def detect_selector():
     try:
-        print('執行自動偵測輸入框選擇器')
+        print('執行自動偵測選擇器')
         url = request.form['url']
-        result = detect_input_selector(url)
-        return jsonify({"status": "success", "selector": result})
+        # detect_response 為 false 時只偵測輸入框，不送出探測 prompt
+        detect_response = request.form.get('detect_response', 'true').lower() != 'false'
+        probe_prompt = request.form.get('probe_prompt') or DEFAULT_PROBE_PROMPT
+        job_manager = get_job_manager()
+        result = job_manager.run_sync(
+            detect_selectors_async(url, job_manager.browser_pool, probe_prompt=probe_prompt, detect_response=detect_response), timeout=90)
+        return jsonify({
+            "status": "success",
+            "selector": result.input_selector,
+            "response_selector": result.response_selector,
+            "input_candidates": [asdict(c) for c in result.input_candidates],
+            "response_candidates": [asdict(c) for c in result.response_candidates],
+            "elapsed": result.elapsed,
+        })
     except Exception as e:
         print("Error:", str(e))
         return jsonify({"status": "error", "message": "偵測失敗，請手動輸入"}), 500
 
 @app.route('/run_test', methods=['POST'])
 def run_test():
+    """送出測試工作，立即回傳 job_id（測試在背景執行，以 /jobs/<job_id> 查詢進度與結果）"""
     try:
         service_name = request.form['service']
-        os.chdir(os.path.dirname(__file__))
-        config_path = os.path.join("configs",f"{service_name}.json")
+        config_path = os.path.join(os.path.dirname(__file__), "configs", f"{service_name}.json")
         if not os.path.exists(config_path):
             raise ValueError(f"找不到名為 {service_name} 的配置文件")
 
-        # 檢查是否存在對應的 runner 文件
+        # 客製化 runner 以服務名稱底線前的部分命名，例如 chatgpt_xxx 使用 services/chatgpt_runner.py
         runner_name = service_name.lower().split('_')[0].strip()
-        runner_path = os.path.join("services", f"{runner_name}_runner.py")
-        if os.path.exists(runner_path):
-            try:
-                # 動態導入對應的 runner 模組
-                module = importlib.import_module(f"services.{runner_name}_runner")
-                # 獲取 runner 類別（類別名稱為 {runner_name}TestRunner）
-                runner_class = getattr(module, f"{runner_name.title()}TestRunner")
-                print(f"使用 {runner_name} 的客製化測試執行器")
-            except (ImportError, AttributeError) as e:
-                print(f"載入 {runner_name} 的客製化執行器時發生錯誤: {e}")
-                print("使用預設執行器")
-                runner_class = BaseTestRunner
-        else:
-            print(f"使用預設執行器")
-            runner_class = BaseTestRunner
-        
-        # 建立實例並執行測試
-        runner = runner_class(service_name)
-        result = asyncio.run(runner.execute_load_test())
-        return jsonify({"status": "success", "results": result})
+        job = get_job_manager().submit(service_name, runner_name=runner_name, job_id=request.form.get('run_id'))
+        return jsonify({"status": "success", "job_id": job.job_id, "state": job.state}), 202
     except Exception as e:
         print("Error:", str(e))
-        return jsonify({"status": "error", "message": "測試失敗"}), 500
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+@app.route('/jobs')
+def list_jobs():
+    return jsonify([job.to_dict() for job in get_job_manager().list_jobs()])
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"找不到工作 {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if not get_job_manager().cancel(job_id):
+        return jsonify({"status": "error", "message": "工作不存在或已結束"}), 409
+    return jsonify({"status": "success"})
+
+@app.route('/browser_pool')
+def browser_pool_status():
+    return jsonify(get_job_manager().browser_pool.report())
+
+@app.route('/live_metrics/<run_id>')
+def live_metrics_stream(run_id):
+    """以 Server-Sent Events 串流測試期間每秒的即時指標"""
+    def generate():
+        # 前端會在送出 /run_test 的同時連線，稍微等待測試註冊
+        live = None
+        for _ in range(100):
+            live = get_live_metrics(run_id)
+            if live is not None:
+                break
+            time.sleep(0.1)
+        if live is None:
+            yield "event: end\ndata: {}\n\n"
+            return
+        
+        subscription = live.subscribe()
+        try:
+            while True:
+                try:
+                    snapshot = subscription.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if snapshot is None:
+                    yield "event: end\ndata: {}\n\n"
+                    return
+                yield f"data: {json.dumps(snapshot)}\n\n"
+        finally:
+            live.unsubscribe(subscription)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
 
 if __name__ == '__main__':
+    # debug 模式下 reloader 的監看行程不提供服務，只在實際服務的子行程啟動時預熱瀏覽器
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        get_job_manager()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,35 @@
+import argparse
+import json
+from dataclasses import asdict
+from modules.harness_benchmark import format_report, run_benchmark
+from modules.mock_chat import MockSettings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='以本機的模擬聊天服務量測測試工具本身的額外延遲與資源用量')
+    parser.add_argument('--levels', default='1,5,10,20', help='要測試的併發數，以逗號分隔 (預設: 1,5,10,20)')
+    parser.add_argument('--duration', type=float, default=30, help='每個併發數的測試時間，秒 (預設: 30)')
+    parser.add_argument('--driver', choices=['browser', 'http'], default='browser', help='測試器 (預設: browser)')
+    parser.add_argument('--capture-mode', choices=['polling', 'observer'], default='polling', help='回應擷取方式 (預設: polling)')
+    parser.add_argument('--browser-pool-size', type=int, help='共用的瀏覽器行程數')
+    parser.add_argument('--ttft', type=float, default=0.5, help='模擬服務的第一個 token 延遲，秒 (預設: 0.5)')
+    parser.add_argument('--tps', type=float, default=20, help='模擬服務每秒輸出的 token 數 (預設: 20)')
+    parser.add_argument('--tokens', type=int, default=50, help='模擬服務每個回應的 token 數 (預設: 50)')
+    parser.add_argument('--jitter', type=float, default=0.1, help='模擬服務延遲的隨機抖動比例 (預設: 0.1)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模擬服務回應錯誤的機率 (預設: 0)')
+    parser.add_argument('--max-ttft-overhead', type=float, default=0.5, help='判斷可驅動的第一個 token 額外延遲上限，秒 (預設: 0.5)')
+    parser.add_argument('--json', help='另外將結果寫入 JSON 檔案，方便比對不同版本')
+    
+    args = parser.parse_args()
+    config = {"driver": args.driver, "capture_mode": args.capture_mode}
+    if args.browser_pool_size:
+        config["browser_pool_size"] = args.browser_pool_size
+    report = run_benchmark(
+        levels=[int(level) for level in args.levels.split(',')],
+        duration=args.duration,
+        settings=MockSettings(args.ttft, args.tps, args.tokens, args.jitter, args.error_rate),
+        config=config,
+        max_ttft_overhead=args.max_ttft_overhead)
+    print(format_report(report))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(dict(report, settings=asdict(report["settings"])), f, indent=4, ensure_ascii=False)
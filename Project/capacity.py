@@ -0,0 +1,30 @@
+import argparse
+import asyncio
+import json
+from cli import LEVEL_MAP
+from modules.capacity_search import CapacitySearch, format_capacity_report, format_probe
+from utils.config_loader import load_config
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='自動搜尋在 SLA 目標內可以承受的最大併發數')
+    parser.add_argument('service', help='要測試的服務名稱')
+    parser.add_argument('--log-level', choices=['debug', 'info', 'error'], default='error', help='探測的日誌級別 (預設: error)')
+    parser.add_argument('--start', type=int, help='第一次探測的併發數 (預設: capacity_search.start 或 1)')
+    parser.add_argument('--max', type=int, help='搜尋的併發數上限 (預設: capacity_search.max 或 256)')
+    parser.add_argument('--tolerance', type=int, help='搜尋結束時符合與不符合併發數的最大差距 (預設: capacity_search.tolerance 或 1)')
+    parser.add_argument('--probe-duration', type=float, help='每次探測的最長時間，秒 (預設: capacity_search.probe_duration 或 60)')
+    parser.add_argument('--json', help='另外將結果（含量測曲線）寫入 JSON 檔案')
+
+    args = parser.parse_args()
+    config = load_config(args.service)
+    # 命令列參數覆寫配置的 capacity_search
+    overrides = {"start": args.start, "max": args.max, "tolerance": args.tolerance, "probe_duration": args.probe_duration}
+    config["capacity_search"] = dict(config.get("capacity_search", {}), **{k: v for k, v in overrides.items() if v is not None})
+    search = CapacitySearch(args.service, log_level=LEVEL_MAP[args.log_level], config=config)
+    # 每次探測完成時顯示進度
+    search.probe_listeners.append(lambda probe: print(format_probe(probe)))
+    result = asyncio.run(search.run())
+    print(format_capacity_report(result))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=4, ensure_ascii=False)
@@ -1,11 +1,23 @@
 import asyncio
-import importlib
-import os
+import json
 import logging
 import argparse
-from modules.base_runner import BaseTestRunner
+import os
+import sys
+from modules.runner_loader import get_runner_class
+from modules.distributed import Coordinator
 
-async def run_test(service_name: str,log_level:str) -> None:
+# 轉換日誌級別字串為 logging 常數
+LEVEL_MAP = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'error': logging.ERROR
+}
+# SLA 判定失敗時的結束代碼
+EXIT_SLA_VIOLATION = 1
+DEFAULT_VERDICT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "sla_verdict.json")
+
+async def run_test(service_name: str,log_level:str,workers:int=None,worker_hosts:list[str]=None) -> dict | None:
     """
     根據服務名稱執行對應的測試執行器。
     如果找到對應的客製化執行器就使用它，否則使用基礎執行器。
@@ -13,33 +25,30 @@ async def run_test(service_name: str,log_level:str) -> None:
     參數:
     - service_name: 服務名稱
     - log_level: 日誌級別
+    - workers: 本機 worker 行程數量，設定時改由 coordinator 拆分併發數量
+    - worker_hosts: 遠端 worker 位址列表，設定時改由 coordinator 將分片送到遠端 worker
+
+    回傳：
+    - dict: 配置有 sla 時的判定結果，否則為 None
     """
-    # 轉換日誌級別字串為 logging 常數
-    level_map = {
-        'debug': logging.DEBUG,
-        'info': logging.INFO,
-        'error': logging.ERROR
-    }
-    # 檢查是否存在對應的 runner 文件
-    runner_path = os.path.join("services", f"{service_name}_runner.py")
-    if os.path.exists(runner_path):
-        try:
-            # 動態導入對應的 runner 模組
-            module = importlib.import_module(f"services.{service_name}_runner")
-            # 獲取 runner 類別（類別名稱為 {ServiceName}TestRunner）
-            runner_class = getattr(module, f"{service_name.title()}TestRunner")
-            print(f"使用 {service_name} 的客製化測試執行器")
-        except (ImportError, AttributeError) as e:
-            print(f"載入 {service_name} 的客製化執行器時發生錯誤: {e}")
-            print("使用預設執行器")
-            runner_class = BaseTestRunner
-    else:
-        print(f"使用預設執行器")
-        runner_class = BaseTestRunner
+    if workers or worker_hosts:
+        coordinator = Coordinator(service_name, workers=workers, hosts=worker_hosts, log_level=LEVEL_MAP[log_level])
+        await coordinator.execute_load_test()
+        return coordinator.sla_verdict
+
+    runner_class = get_runner_class(service_name)
     
     # 建立實例並執行測試
-    runner = runner_class(service_name, log_level=level_map[log_level])
+    runner = runner_class(service_name, log_level=LEVEL_MAP[log_level])
     await runner.execute_load_test()
+    return runner.sla_verdict
+
+
+def write_verdict(verdict: dict, path: str, service_name: str) -> None:
+    """將 SLA 判定寫成 JSON 檔，供 CI 等工具讀取"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dict(verdict, service=service_name), f, ensure_ascii=False, indent=2)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='執行 AI 服務負載測試')
@@ -51,6 +60,28 @@ if __name__ == "__main__":
         default='info',
         help='設定日誌級別 (預設: info)'
     )
+    # 分散式測試選項
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='將併發數量拆給多個本機 worker 行程執行'
+    )
+    parser.add_argument(
+        '--worker-hosts',
+        help='遠端 worker 位址，以逗號分隔，例如 10.0.0.2:8765,10.0.0.3:8765'
+    )
+    # SLA 判定結果
+    parser.add_argument(
+        '--verdict',
+        default=DEFAULT_VERDICT_PATH,
+        help='配置有 sla 時，判定結果的 JSON 檔路徑 (預設: results/sla_verdict.json)'
+    )
     
     args = parser.parse_args()
-    asyncio.run(run_test(args.service,args.log_level))
\ No newline at end of file
+    worker_hosts = [h.strip() for h in args.worker_hosts.split(',') if h.strip()] if args.worker_hosts else None
+    verdict = asyncio.run(run_test(args.service,args.log_level,args.workers,worker_hosts))
+    if verdict is not None:
+        write_verdict(verdict, args.verdict, args.service)
+        print(f"SLA 判定：{verdict['verdict']}（{args.verdict}）")
+        if verdict['verdict'] != 'pass':
+            sys.exit(EXIT_SLA_VIOLATION)
@@ -0,0 +1,18 @@
+import argparse
+from modules.mock_chat import MockChatService, MockSettings, create_mock_app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='啟動本機的模擬 LLM 聊天服務')
+    parser.add_argument('--host', default='127.0.0.1', help='監聽位址 (預設: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=5001, help='監聽埠號 (預設: 5001)')
+    parser.add_argument('--ttft', type=float, default=0.5, help='第一個 token 延遲，秒 (預設: 0.5)')
+    parser.add_argument('--tps', type=float, default=20, help='每秒輸出的 token 數 (預設: 20)')
+    parser.add_argument('--tokens', type=int, default=50, help='每個回應的 token 數 (預設: 50)')
+    parser.add_argument('--jitter', type=float, default=0.1, help='延遲的隨機抖動比例 (預設: 0.1)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='回應錯誤的機率 (預設: 0)')
+    parser.add_argument('--seed', type=int, help='亂數種子')
+    
+    args = parser.parse_args()
+    settings = MockSettings(args.ttft, args.tps, args.tokens, args.jitter, args.error_rate, args.seed)
+    app = create_mock_app(MockChatService(settings))
+    app.run(host=args.host, port=args.port, threaded=True)
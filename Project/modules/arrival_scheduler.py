@@ -0,0 +1,147 @@
+from modules.base_test_async import BaseTestAsync, TestResult
+from utils.streaming_stats import StreamingHistogram
+from typing import Any, Callable, Dict, Iterator
+import asyncio
+import random
+import time
+import numpy as np
+
+
+class ArrivalScheduler:
+    """
+    開放式（open-loop）負載模型：依照目標到達率送出請求，不受回應時間影響。
+
+    - 到達間隔可為 poisson（指數分佈）或 constant（固定間隔）
+    - 請求由一組事先暖機的工作階段（BaseTestAsync）輪流處理，每個工作階段同時只處理一個請求
+    - 每筆交易記錄預計送出時間與實際送出時間，延遲從預計送出時間起算（修正 coordinated omission）
+    - 若到達時沒有閒置的工作階段，記錄為工作階段池不足
+    """
+    def __init__(self,
+                 rate: float,
+                 duration: float,
+                 distribution: str = "poisson",
+                 seed: int = None,
+                 logger=None) -> None:
+        """ 初始化 ArrivalScheduler
+
+        參數:
+            - rate (float): 目標到達率（每秒請求數）
+            - duration (float): 排程持續時間（秒）
+            - distribution (str, optional): poisson 或 constant，預設為 poisson
+            - seed (int, optional): 亂數種子
+            - logger (Logger, optional): Logger
+        """
+        if rate <= 0:
+            raise ValueError("arrival_rate 必須大於 0")
+        if distribution not in ("poisson", "constant"):
+            raise ValueError(f"不支援的到達分佈: {distribution}")
+        self.rate = rate
+        self.duration = duration
+        self.distribution = distribution
+        self._random = random.Random(seed)
+        self.logger = logger
+
+    def arrival_times(self, start: float) -> Iterator[float]:
+        """ 產生從 start 開始、持續 duration 秒的預計送出時間（time.time()，秒） """
+        t = start
+        while True:
+            if self.distribution == "poisson":
+                t += self._random.expovariate(self.rate)
+            else:
+                t += 1.0 / self.rate
+            if t - start >= self.duration:
+                return
+            yield t
+
+    async def run(self,
+                  sessions: list[BaseTestAsync],
+                  prompts: list[str] = None,
+                  stop_event: asyncio.Event = None,
+                  on_result: Callable[[TestResult], None] = None) -> tuple[list[TestResult], Dict[str, Any]]:
+        """
+        依排程將 prompts 輪流分派給閒置的工作階段；prompts 為 None 時由各工作階段的 prompt 串流取得（prompt_source）。
+        stop_event 被設定時（例如 SLA 已判定）停止排程，等待進行中的交易完成後結束。
+        設定 on_result 時每筆交易結果改為交給 on_result，不保留在記憶體中（排程落後以直方圖統計），供長時間測試使用。
+
+        回傳：
+        - tuple[list[TestResult], dict]: 所有交易結果（設定 on_result 時為空列表），以及排程報告
+        """
+        idle: asyncio.Queue[BaseTestAsync] = asyncio.Queue()
+        for session in sessions:
+            idle.put_nowait(session)
+
+        results: list[TestResult] = []
+        delays = StreamingHistogram()       # 設定 on_result 時以直方圖統計排程落後
+        in_flight: set[asyncio.Task] = set()
+        scheduled = 0
+        sent = 0
+        pool_exhausted = 0
+        dropped = 0
+
+        async def dispatch(session: BaseTestAsync, index: int, intended: float) -> None:
+            nonlocal sent
+            try:
+                if prompts is None:
+                    prompt_index, prompt = session.next_prompt()
+                else:
+                    prompt_index, prompt = index % len(prompts), prompts[index % len(prompts)]
+                result = await session.run_prompt(prompt_index, prompt, intended_send_time=intended)
+                sent += result.is_sent
+                if on_result is None:
+                    results.append(result)
+                else:
+                    if result.is_sent:
+                        delays.add(result.schedule_delay)
+                    on_result(result)
+            finally:
+                idle.put_nowait(session)
+
+        start = time.time()
+        end = start + self.duration
+        for index, intended in enumerate(self.arrival_times(start)):
+            scheduled += 1
+            delay = intended - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if stop_event is not None and stop_event.is_set():
+                break
+            if idle.empty():
+                # 沒有閒置的工作階段：照樣送出，但延遲從預計時間起算，並記錄池不足
+                pool_exhausted += 1
+                try:
+                    session = await asyncio.wait_for(idle.get(), timeout=max(0.0, end - time.time()))
+                except asyncio.TimeoutError:
+                    dropped += 1
+                    continue
+            else:
+                session = idle.get_nowait()
+            task = asyncio.create_task(dispatch(session, index, intended))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+        elapsed = max(time.time() - start, 1e-9)
+        if on_result is None:
+            schedule_delay = [r.schedule_delay for r in results if r.is_sent]
+            p95_delay = float(np.percentile(schedule_delay, 95)) if schedule_delay else 0.0
+            max_delay = max(schedule_delay) if schedule_delay else 0.0
+        else:
+            p95_delay = delays.percentile(95) or 0.0
+            max_delay = delays.percentile(100) or 0.0
+        report = {
+            "target_rate": self.rate,
+            "distribution": self.distribution,
+            "session_pool_size": len(sessions),
+            "scheduled": scheduled,
+            "sent": sent,
+            "achieved_rate": sent / min(elapsed, self.duration),
+            "pool_exhausted": pool_exhausted,
+            "dropped": dropped,
+            "p95_schedule_delay": p95_delay,
+            "max_schedule_delay": max_delay,
+        }
+        if pool_exhausted and self.logger:
+            self.logger.warning(f"工作階段池不足 {pool_exhausted} 次，無法維持目標到達率 {self.rate}/秒，請增加 session_pool_size")
+        return results, report
@@ -3,21 +3,142 @@ import asyncio
 import statistics
 import numpy as np
 from playwright.async_api import async_playwright
-from modules.base_test_async import BaseTestAsync,ResponseMetrics
+from modules.base_test_async import BaseTestAsync,ResponseMetrics,TestResult
+from modules.browser_pool import BrowserPool, WarmBrowserPool
+from modules.http_test_async import HttpTestAsync
+from modules.arrival_scheduler import ArrivalScheduler
+from modules.load_profile import LoadProfile
+from modules.live_metrics import LiveMetrics
+from modules.resource_blocker import ResourceBlocker
+from modules.results_store import ResultsStore
+from modules.session_bootstrap import SessionBootstrap
+from modules.prompt_source import PromptCorpus
+from modules.latency_analysis import analyze_from_config, format_length_analysis
+from modules.sla import SlaMonitor, format_verdict
+from modules.client_monitor import ClientMonitor, format_client_report
+from modules.tracing import Tracer, format_trace_summary
+from modules import login_helper
 from utils.config_loader import load_config
 from utils.log_manager import setup_logger
-from typing import Any, Dict
+from utils.http_stream import HttpStreamClient
+from utils.streaming_stats import StreamingHistogram, StreamingStats
+from typing import Any, Callable, Dict
+import contextlib
+import os
 import time
+import uuid
+
+# 分階段負載的飽和點門檻（可用 knee_thresholds 覆寫），容量搜尋未設定目標時也以此為預設目標
+DEFAULT_KNEE_THRESHOLDS = {"p95_first_token_time": 5.0, "failed_rate": 5.0}
+
+class _ResultCollector:
+    """ 收集逐筆交易結果：一般模式保留 TestResult；streaming_stats 模式只併入固定大小的直方圖，記憶體不隨交易數增加 """
+    def __init__(self, summary: StreamingStats | None = None) -> None:
+        self.summary = summary
+        self.results: list[TestResult] = []
+        self.total_transactions = 0
+        self.failed_transactions = 0
+
+    def add(self, result: TestResult) -> None:
+        if self.summary is None:
+            self.results.append(result)
+            return
+        self.total_transactions += result.is_sent
+        self.failed_transactions += not result.is_successful
+        self.summary.update(ResponseMetrics.from_results([result]))
+
+    def metrics(self) -> ResponseMetrics:
+        if self.summary is None:
+            return ResponseMetrics.from_results(self.results)
+        return ResponseMetrics(
+            total_transactions=self.total_transactions,
+            failed_transactions=self.failed_transactions,
+            first_token_latency=[],
+            total_response_time=[],
+            ai_response_token_count=[],
+            generation_time=[],
+            summary=self.summary)
 
 class BaseTestRunner:
-    def __init__(self, service_name: str,log_level: int = logging.INFO) -> None:
+    def __init__(self, service_name: str,log_level: int = logging.INFO, config: Dict[str, Any] = None) -> None:
+        """
+        參數：
+        - service_name: 服務名稱
+        - log_level: 日誌級別
+        - config: 直接指定配置內容（例如分散式測試的分片配置），預設為 None，即讀取 configs/ 下的配置文件
+        """
         self.service_name = service_name
         self.logger = setup_logger(service_name,level=log_level)
-        self.config = load_config(service_name)
+        self.config = config if config is not None else load_config(service_name)
+        # 測試識別碼（分散式測試的各分片由 coordinator 以 run_id 指定相同的值）
+        self.run_id: str = self.config.get("run_id") or uuid.uuid4().hex
+        # 逐筆交易的結果資料庫（配置 results_store 為 false 時停用）
+        self.results_store: ResultsStore = None
+        # 每個工作階段（或整個負載模型）結束時，會以 ResponseMetrics 呼叫這些 listener
+        self.metrics_listeners: list[Callable[[ResponseMetrics], None]] = []
+        # 每筆交易完成時會以 TestResult 呼叫這些 listener
+        self.result_listeners: list[Callable[[TestResult], None]] = []
+        # 即時指標（由呼叫端設定，例如 Flask 的 /run_test）
+        self.live_metrics: LiveMetrics = None
+        self._active_sessions: set[int] = set()
+        self.browser_pool: BrowserPool = None
+        # 常駐的瀏覽器池（由呼叫端設定，例如 Flask 的 JobManager），有設定時沿用其 Playwright driver 並借用已啟動的瀏覽器
+        self.warm_pool: WarmBrowserPool = None
+        # 從 execute_load_test 開始到送出第一個 prompt 的時間（秒），以及瀏覽器是否為暖啟動
+        self.time_to_first_prompt: float = None
+        self.start_mode: str = None
+        self._run_started: float = None
+        # 所有虛擬使用者共用的請求路由（配置 resource_blocking 時）
+        self.resource_blocker = ResourceBlocker.from_config(self.config, self.logger)
+        # driver 為 "http" 時，所有虛擬使用者共用的 HTTP 客戶端
+        self.http_client: HttpStreamClient = None
+        # 設定 login_method 時，測試開始前登入一次並分發 storage state 給所有虛擬使用者
+        self.session_bootstrap: SessionBootstrap = None
+        # 設定 prompt_source 時，所有虛擬使用者共用的 prompt 語料，以及依 prompt 分類統計的延遲
+        self.prompt_corpus: PromptCorpus = None
+        self._prompt_class_stats: Dict[str, Dict[str, Any]] = {}
+        # 延遲與輸入 / 輸出長度的關係分析（測試結束時計算）
+        self.length_analysis: Dict[str, Any] = None
+        self.open_loop_report: Dict[str, Any] = None
+        self.stage_reports: list[Dict[str, Any]] = None
+        # 設定 sla 時，測試中持續檢查服務目標，並在已有統計定論時以 stop_event 通知所有虛擬使用者提前結束
+        self.sla_monitor = SlaMonitor.from_config(self.config)
+        self.sla_verdict: Dict[str, Any] = None
+        self.stop_event = asyncio.Event()
+        # 測試端的自我監控（配置 client_monitor 為 false 時停用），測試結束時彙整為 client_report
+        self.client_monitor = ClientMonitor.from_config(self.config)
+        self.client_report: Dict[str, Any] = None
+        # 設定 tracing 時，所有虛擬使用者共用的階段追蹤，測試結束時匯出到 trace_path
+        self.tracer = Tracer.from_config(self.config, self.service_name)
+        self.trace_path: str = None
 
     async def before_test(self, test_instance: BaseTestAsync) -> None:
         pass
     
+    async def login(self, page, account: Dict[str, Any]) -> bool:
+        """
+        登入流程（session bootstrap 為每個帳號呼叫一次），依配置的 login_method 選擇登入方式：
+        - form: 前往 login_url，填入 username / password 後點擊 login_button_selector
+        - cookies: 載入 cookies/{name}.json
+        - manual: 開啟瀏覽器等待使用者手動登入
+        登入流程較特殊的服務可以在客製化執行器中覆寫這個方法。
+
+        參數：
+        - page: 登入用的頁面
+        - account: 帳號配置（login_accounts 中的一組帳號覆寫到測試配置上）
+
+        回傳：登入是否成功
+        """
+        method = account.get("login_method")
+        if method == "form":
+            await page.goto(account.get("login_url", account["url"]))
+            return await login_helper.perform_login(page, account)
+        if method == "cookies":
+            return await login_helper.perform_cookies_login(page, account)
+        if method == "manual":
+            return await login_helper.perform_manual_login(page, account)
+        raise ValueError(f"不支援的 login_method：{method}")
+
     async def after_test(self, test_instance: BaseTestAsync) -> None:
         pass
 
@@ -31,19 +152,16 @@ class BaseTestRunner:
         - **kwargs: 額外參數
             - verbose: 是否紀錄AI的回應
             - browser_name: 測試器的名稱，預設為 `測試瀏覽器:{idx}`
+            - browser_pool: 共用的瀏覽器池，預設為 None（每個使用者啟動自己的瀏覽器）
         
         回傳：
         - dict: 包含測試結果的字典
         """
-        test_instance = BaseTestAsync(
-            self.service_name,
-            playwright_instance=playwright,
-            browser_name=f"測試瀏覽器:{browser_idx+1}",
-            logger=self.logger,
-            verbose=kwargs.get('verbose', False))
+        test_instance = self._create_test_instance(playwright, browser_idx, **kwargs)
         
         try:
             await test_instance.setup()
+            self._session_started(test_instance)
             await self.before_test(test_instance)
             
             # 根據是否設定測試時間決定執行模式
@@ -53,41 +171,302 @@ class BaseTestRunner:
                 result = await test_instance.run_test()
                 
             await self.after_test(test_instance)
+            self._publish_metrics(result)
             return result
         finally:
             await test_instance.teardown()
+            self._session_ended(test_instance)
             
 
+    def _create_test_instance(self, playwright=None, browser_idx=None, **kwargs) -> BaseTestAsync:
+        """內部方法：建立一個虛擬使用者的測試實例"""
+        # 分散式測試時，各分片以 browser_index_offset 避免瀏覽器名稱重複
+        browser_number = self.config.get("browser_index_offset", 0) + browser_idx + 1
+        test_class = BaseTestAsync
+        extra_options = {}
+        # driver 為 "http" 時直接呼叫串流 API，不啟動瀏覽器
+        if self.config.get("driver") == "http":
+            if self.http_client is None:
+                self.http_client = HttpStreamClient.from_config(self.config)
+            test_class = HttpTestAsync
+            extra_options["http_client"] = self.http_client
+        test_instance = test_class(
+            self.service_name,
+            playwright_instance=playwright,
+            browser_name=kwargs.get('browser_name', f"測試瀏覽器:{browser_number}"),
+            logger=self.logger,
+            verbose=kwargs.get('verbose', False),
+            browser_pool=kwargs.get('browser_pool'),
+            config=self.config,
+            browser_index=browser_number,
+            resource_blocker=self.resource_blocker,
+            session_bootstrap=self.session_bootstrap,
+            prompt_corpus=self.prompt_corpus,
+            stop_event=self.stop_event,
+            tracer=self.tracer,
+            **extra_options)
+        test_instance.result_listeners.append(self._publish_result)
+        return test_instance
+
+    def _publish_result(self, result: TestResult) -> None:
+        """內部方法：將單筆交易結果送給所有 result listener"""
+        # 只計入真正送出的交易（send_time 預設為 0），且只在 execute_load_test 中計算
+        if self.time_to_first_prompt is None and result.is_sent and self._run_started is not None:
+            self.time_to_first_prompt = result.send_time - self._run_started
+        for listener in self.result_listeners:
+            listener(result)
+
+    def _record_prompt_class(self, result: TestResult) -> None:
+        """內部方法：依 prompt 分類與輸入長度分組累計交易數、失敗數與第一個 token 延遲（固定記憶體）"""
+        key = " / ".join(str(v) for v in (result.prompt_class, result.input_bucket) if v is not None)
+        if not key or not result.is_sent:
+            return
+        stats = self._prompt_class_stats.get(key)
+        if stats is None:
+            stats = self._prompt_class_stats[key] = {"transactions": 0, "failed": 0, "first_token_latency": StreamingHistogram()}
+        stats["transactions"] += 1
+        if result.is_successful:
+            stats["first_token_latency"].add(result.first_token_latency)
+        else:
+            stats["failed"] += 1
+
+    def _check_sla(self, result: TestResult) -> None:
+        """內部方法：將交易結果送給 SLA 判定，結果已有定論時通知所有虛擬使用者提前結束"""
+        self.sla_monitor.on_result(result)
+        if self.sla_monitor.early_stop and not self.stop_event.is_set() and self.sla_monitor.settled:
+            self.sla_monitor.mark_stopped()
+            self.stop_event.set()
+            self.logger.info(f"SLA 判定已有定論（第 {self.sla_monitor.transactions} 筆交易），提前結束測試")
+
+    def _session_started(self, test_instance: BaseTestAsync) -> None:
+        """內部方法：工作階段完成 setup，開始計入活躍工作階段數"""
+        self._active_sessions.add(id(test_instance))
+        if self.live_metrics is not None:
+            self.live_metrics.session_started()
+
+    def _session_ended(self, test_instance: BaseTestAsync) -> None:
+        """內部方法：工作階段結束（只有 setup 成功的工作階段才會被扣除）"""
+        if id(test_instance) not in self._active_sessions:
+            return
+        self._active_sessions.discard(id(test_instance))
+        if self.live_metrics is not None:
+            self.live_metrics.session_ended()
+
+    def _publish_metrics(self, metrics: ResponseMetrics) -> None:
+        """內部方法：將結果送給所有 metrics listener"""
+        for listener in self.metrics_listeners:
+            try:
+                listener(metrics)
+            except Exception as e:
+                self.logger.error(f"metrics listener 發生錯誤：{e}")
+
+    async def _run_open_loop(self, playwright) -> list[ResponseMetrics]:
+        """
+        內部方法：開放式負載模型。
+        先暖機一組工作階段（session_pool_size，預設為 concurrency），
+        再依 arrival_rate 的到達率送出請求，不受回應時間影響。
+        """
+        pool_size = self.config.get("session_pool_size", self.config.get("concurrency", 1))
+        sessions = [
+            self._create_test_instance(playwright, idx, browser_pool=self.browser_pool)
+            for idx in range(pool_size)
+        ]
+        try:
+            async def prepare(session: BaseTestAsync) -> None:
+                await session.setup()
+                self._session_started(session)
+                await self.before_test(session)
+                await session.open_page()
+            await asyncio.gather(*(prepare(s) for s in sessions))
+            
+            scheduler = ArrivalScheduler(
+                rate=self.config["arrival_rate"],
+                duration=self.config.get("test_duration", 60),
+                distribution=self.config.get("arrival_distribution", "poisson"),
+                seed=self.config.get("arrival_seed"),
+                logger=self.logger)
+            prompts = None if sessions[0].prompt_stream is not None else sessions[0].prompts
+            collector = _ResultCollector(self._new_streaming_summary())
+            # streaming_stats 模式下結果直接交給 collector，排程器不保留逐筆結果
+            results, self.open_loop_report = await scheduler.run(
+                sessions, prompts, stop_event=self.stop_event,
+                on_result=collector.add if collector.summary is not None else None)
+            
+            collector.results.extend(results)
+            
+            for session in sessions:
+                await self.after_test(session)
+            return [collector.metrics()]
+        finally:
+            await asyncio.gather(*(s.teardown() for s in sessions), return_exceptions=True)
+            for session in sessions:
+                self._session_ended(session)
+
+    async def _run_load_profile(self, playwright) -> list[ResponseMetrics]:
+        """
+        內部方法：依 load_profile 分階段調整使用者數。
+        在同一個 Playwright 實例中即時新增或退出工作階段，並以每筆交易送出時所在的階段分組統計。
+        """
+        profile = LoadProfile.from_config(self.config["load_profile"])
+        loop = asyncio.get_running_loop()
+        tick = self.config.get("load_profile_tick", 1.0)
+        stage_results = [_ResultCollector(self._new_streaming_summary()) for _ in profile.stages]
+        sessions: list[tuple[asyncio.Task, asyncio.Event]] = []
+        start_time = time.time()
+        # 單一工作階段連續失敗 max_consecutive_failures 次即退出（失敗後以 failure_backoff 秒起算的指數退避再送出）；
+        # 所有工作階段累計的失敗（含 setup 失敗）超過最大使用者數的 3 倍時提前中斷，與封閉式負載相同
+        max_consecutive_failures = self.config.get("max_consecutive_failures", 5)
+        backoff = self.config.get("failure_backoff", 1.0)
+        failure_limit = profile.max_users * 3
+        failures = 0
+        aborted = asyncio.Event()
+
+        def count_failure() -> None:
+            nonlocal failures
+            failures += 1
+            if failures > failure_limit and not aborted.is_set():
+                self.logger.error('錯誤次數過多，提前中斷')
+                aborted.set()
+
+        def on_result(result: TestResult) -> None:
+            elapsed = (result.send_time or time.time()) - start_time
+            stage_idx, _ = profile.target(elapsed)
+            stage_results[min(stage_idx, len(profile.stages)-1)].add(result)
+            if not result.is_successful:
+                count_failure()
+
+        async def run_session(idx: int, stop_event: asyncio.Event) -> None:
+            test_instance = self._create_test_instance(playwright, idx, browser_pool=self.browser_pool)
+            try:
+                await test_instance.setup()
+                self._session_started(test_instance)
+                await self.before_test(test_instance)
+                consecutive_failures = 0
+                while not stop_event.is_set():
+                    result = await test_instance.run_prompt(*test_instance.next_prompt())
+                    on_result(result)
+                    if result.is_successful:
+                        consecutive_failures = 0
+                        continue
+                    consecutive_failures += 1
+                    if consecutive_failures >= max_consecutive_failures:
+                        self.logger.error(f"測試瀏覽器:{idx+1} 連續失敗 {consecutive_failures} 次，結束工作階段")
+                        break
+                    # 退避期間收到停止通知時立即結束
+                    with contextlib.suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(stop_event.wait(), min(backoff * 2 ** (consecutive_failures - 1), 30.0))
+                await self.after_test(test_instance)
+            except Exception as e:
+                self.logger.error(f"測試瀏覽器:{idx+1} 發生錯誤：{e}")
+                count_failure()
+            finally:
+                await test_instance.teardown()
+                self._session_ended(test_instance)
+
+        next_idx = 0
+        current_stage = -1
+        try:
+            while not self.stop_event.is_set() and not aborted.is_set():
+                stage_idx, target = profile.target(time.time() - start_time)
+                if stage_idx >= len(profile.stages):
+                    break
+                if stage_idx != current_stage:
+                    current_stage = stage_idx
+                    self.logger.info(f"進入階段 {stage_idx+1}：{profile.stages[stage_idx].name}")
+                # 移除已結束的工作階段
+                sessions = [(task, stop) for task, stop in sessions if not task.done()]
+                active = [(task, stop) for task, stop in sessions if not stop.is_set()]
+                if len(active) < target:
+                    for _ in range(target - len(active)):
+                        stop_event = asyncio.Event()
+                        sessions.append((loop.create_task(run_session(next_idx, stop_event)), stop_event))
+                        next_idx += 1
+                elif len(active) > target:
+                    # 由最新加入的工作階段開始退出，完成目前的 prompt 後結束
+                    for _, stop_event in active[target:]:
+                        stop_event.set()
+                await asyncio.sleep(tick)
+        finally:
+            for _, stop_event in sessions:
+                stop_event.set()
+            await asyncio.gather(*(task for task, _ in sessions), return_exceptions=True)
+
+        stage_metrics = [collector.metrics() for collector in stage_results]
+        self.stage_reports = self._calculate_stage_statistics(profile, stage_metrics)
+        return [ResponseMetrics.merge(stage_metrics)]
+
+    def _calculate_stage_statistics(self, profile: LoadProfile, stage_metrics: list[ResponseMetrics]) -> list[Dict[str, Any]]:
+        """內部方法：計算每個階段的統計數據，並標記第一個超過門檻的階段（飽和點）"""
+        thresholds = dict(DEFAULT_KNEE_THRESHOLDS, **self.config.get("knee_thresholds", {}))
+        reports = []
+        knee_found = False
+        for stage, metrics in zip(profile.stages, stage_metrics):
+            stats = self._calculate_statistics([metrics])
+            stats["stage"] = stage.name
+            stats["users"] = (stage.start_users, stage.end_users)
+            crossed = [
+                key for key, limit in thresholds.items()
+                if stats.get(key) is not None and stats["total_transactions"] and stats[key] > limit
+            ]
+            stats["crossed"] = crossed
+            stats["is_knee"] = bool(crossed) and not knee_found
+            knee_found = knee_found or bool(crossed)
+            reports.append(stats)
+        return reports
+
+    def _new_streaming_summary(self) -> StreamingStats | None:
+        """內部方法：streaming_stats 模式下建立一個串流統計，否則回傳 None"""
+        if not self.config.get("streaming_stats"):
+            return None
+        return StreamingStats(self.config.get("streaming_stats_accuracy", 0.01))
+
     async def _run_continuous(self, test_instance: BaseTestAsync) -> ResponseMetrics:
         """內部方法：執行持續測試"""
         loop = asyncio.get_running_loop()
         start_time = loop.time()
         results:list[ResponseMetrics] = []
         _failed_transactions = 0
+        # streaming_stats 模式：每輪結果直接併入固定大小的直方圖，不保留逐筆的延遲列表
+        summary = self._new_streaming_summary()
+        total_transactions = 0
         
-        while loop.time() - start_time < self.config["test_duration"]:
+        while loop.time() - start_time < self.config["test_duration"] and not self.stop_event.is_set():
             r = await test_instance.run_test()
             _failed_transactions += r.failed_transactions
             if _failed_transactions>self.config['concurrency']*3:
                 self.logger.error('錯誤次數過多，提前中斷')
                 break
-            results.append(r)
+            if summary is not None:
+                summary.update(r)
+                total_transactions += r.total_transactions
+            else:
+                results.append(r)
         
-        return ResponseMetrics(
-            total_transactions=sum(r.total_transactions for r in results),
-            failed_transactions=sum(r.failed_transactions for r in results),
-            total_response_time=[t for r in results for t in r.total_response_time or []],
-            ai_response_token_count=[t for r in results for t in r.ai_response_token_count or []],
-            first_token_latency=[t for r in results for t in r.first_token_latency or []],
-            generation_time=[t for r in results for t in r.generation_time or []]
-        )
+        if summary is not None:
+            return ResponseMetrics(
+                total_transactions=total_transactions,
+                failed_transactions=_failed_transactions,
+                first_token_latency=[],
+                total_response_time=[],
+                ai_response_token_count=[],
+                generation_time=[],
+                summary=summary)
+        return ResponseMetrics.merge(results)
 
     def _calculate_statistics(self, results: list[ResponseMetrics]) -> Dict[str, Any]:
         """內部方法：計算測試統計數據"""
+        if any(r.summary is not None for r in results):
+            return self._calculate_streaming_statistics(results)
+        
         # 合併所有測試結果
         generated_time = [t for r in results for t in (r.generation_time or [])]
         ai_response_token_count = [t for r in results for t in (r.ai_response_token_count or [])]
         first_token_latency = [t for r in results for t in (r.first_token_latency or [])]
+        token_count_time = [t for r in results for t in (r.token_count_time or [])]
+        wire_first_token_latency = [t for r in results for t in (r.wire_first_token_latency or [])]
+        inter_token_latency = np.array([t for r in results for t in (r.inter_token_latency or [])], dtype=np.float64)
+        max_stall = np.array([t for r in results for t in (r.max_stall or [])], dtype=np.float64)
+        time_per_output_token = np.array([t for r in results for t in (r.time_per_output_token or [])], dtype=np.float64)
         total_transactions = sum(r.total_transactions for r in results)
         failed_transactions = sum(r.failed_transactions for r in results)
         
@@ -104,7 +483,76 @@ class BaseTestRunner:
             "tokens_per_second": tokens_per_second,
             "p95_first_token_time": np.percentile(first_token_latency, 95) if first_token_latency else None,
             "p99_first_token_time": np.percentile(first_token_latency, 99) if first_token_latency else None,
-            "median_first_token_time": statistics.median(first_token_latency) if first_token_latency else None
+            "median_first_token_time": statistics.median(first_token_latency) if first_token_latency else None,
+            # token 計算本身的耗時，獨立回報，不影響 tokens_per_second
+            "token_count_seconds": sum(token_count_time),
+            "avg_token_count_ms": (sum(token_count_time)/len(token_count_time))*1000 if token_count_time else 0.0,
+            # 線路層級的第一個位元組延遲（啟用 network_capture 時才有）
+            "p95_wire_first_token_time": np.percentile(wire_first_token_latency, 95) if wire_first_token_latency else None,
+            "median_wire_first_token_time": statistics.median(wire_first_token_latency) if wire_first_token_latency else None,
+            # 前端渲染與輪詢帶來的額外延遲 = DOM 的中位數延遲 - 線路層級的中位數延遲
+            "median_render_overhead": statistics.median(first_token_latency) - statistics.median(wire_first_token_latency) if first_token_latency and wire_first_token_latency else None,
+            # 串流平順度：token 間隔（逐段）、每個輸出 token 的時間與最長停頓
+            **self._smoothness_statistics(
+                lambda q: float(np.percentile(inter_token_latency, q)) if inter_token_latency.size else None,
+                lambda q: float(np.percentile(time_per_output_token, q)) if time_per_output_token.size else None,
+                lambda q: float(np.percentile(max_stall, q)) if max_stall.size else None,
+                float((max_stall > self.config.get("stall_threshold", 1.0)).mean()) if max_stall.size else None),
+        }
+
+    def _smoothness_statistics(self,
+                               inter_token_latency: Callable[[float], float | None],
+                               time_per_output_token: Callable[[float], float | None],
+                               max_stall: Callable[[float], float | None],
+                               stalled_fraction: float | None) -> Dict[str, Any]:
+        """內部方法：串流平順度的統計欄位（參數為計算各項分位數的函式，一般與串流統計模式共用）"""
+        return {
+            "p50_inter_token_latency": inter_token_latency(50),
+            "p95_inter_token_latency": inter_token_latency(95),
+            "p99_inter_token_latency": inter_token_latency(99),
+            "median_time_per_output_token": time_per_output_token(50),
+            "p95_time_per_output_token": time_per_output_token(95),
+            "p95_max_stall": max_stall(95),
+            "max_stall": max_stall(100),
+            "stall_rate": stalled_fraction * 100 if stalled_fraction is not None else None,
+        }
+
+    def _calculate_streaming_statistics(self, results: list[ResponseMetrics]) -> Dict[str, Any]:
+        """內部方法：以串流統計（直方圖）計算測試統計數據，分位數的相對誤差不超過 streaming_stats_accuracy"""
+        merged = ResponseMetrics.merge(results)
+        summary = merged.summary
+        # 沒有使用串流統計的結果（例如其他分片）也併入直方圖
+        summary.update(merged)
+        histograms = summary.histograms
+        ttft = histograms["first_token_latency"]
+        wire_ttft = histograms["wire_first_token_latency"]
+        total_transactions = merged.total_transactions
+        failed_transactions = merged.failed_transactions
+        
+        return {
+            "concurrency": self.config.get("concurrency", 1),
+            "total_transactions": total_transactions,
+            "failed_transactions": failed_transactions,
+            "failed_rate": (failed_transactions/total_transactions)*100 if total_transactions else 100.0,
+            "tokens_per_second": summary.total_tokens / summary.total_generation_time if summary.total_generation_time > 0 else 0.0,
+            "p95_first_token_time": ttft.percentile(95),
+            "p99_first_token_time": ttft.percentile(99),
+            "median_first_token_time": ttft.percentile(50),
+            "token_count_seconds": summary.token_count_seconds,
+            "avg_token_count_ms": (summary.token_count_seconds/summary.token_count_samples)*1000 if summary.token_count_samples else 0.0,
+            "p95_wire_first_token_time": wire_ttft.percentile(95),
+            "median_wire_first_token_time": wire_ttft.percentile(50),
+            "median_render_overhead": ttft.percentile(50) - wire_ttft.percentile(50) if ttft.count and wire_ttft.count else None,
+            **self._smoothness_statistics(
+                histograms["inter_token_latency"].percentile,
+                histograms["time_per_output_token"].percentile,
+                histograms["max_stall"].percentile,
+                histograms["max_stall"].fraction_above(self.config.get("stall_threshold", 1.0))),
+            "streaming_relative_accuracy": summary.relative_accuracy,
+            "streaming_percentiles": {
+                name: {q: histograms[name].percentile(p) for q, p in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))}
+                for name in ("first_token_latency", "total_response_time", "generation_time")
+            },
         }
 
     def _log_test_results(self, results: list[Dict], total_time: float) -> str:
@@ -119,42 +567,243 @@ class BaseTestRunner:
                      f"總交易次數：{stats['total_transactions']}\n"
 
         # 只有在有成功的測試結果時才顯示這些統計數據
-        if stats['tokens_per_second'] is not None:
+        if stats['median_first_token_time'] is not None:
             log_message += f"每秒多少token：{stats['tokens_per_second']:.2f} 個\n" \
                           f"95% 的回應時間低於：{stats['p95_first_token_time']:.2f} 秒\n" \
                           f"99% 的回應時間低於：{stats['p99_first_token_time']:.2f} 秒\n" \
-                          f"中位數第一個 token 延遲：{stats['median_first_token_time']:.2f} 秒"
+                          f"中位數第一個 token 延遲：{stats['median_first_token_time']:.2f} 秒\n" \
+                          f"Token 計算耗時：{stats['token_count_seconds']:.3f} 秒（平均每筆 {stats['avg_token_count_ms']:.2f} 毫秒，不計入回應時間）"
         else:
             log_message += "所有測試都失敗，無法計算回應時間統計數據"
 
-        self.logger.info(log_message)
+        # 串流平順度：token 間隔、TPOT 與停頓
+        if stats.get('p50_inter_token_latency') is not None:
+            log_message += f"\nToken 間隔 p50/p95/p99：" + " / ".join(f"{stats[f'p{q}_inter_token_latency']*1000:.1f}" for q in (50, 95, 99)) + " 毫秒"
+            if stats['median_time_per_output_token'] is not None:
+                log_message += f"\n每個輸出 token 時間（TPOT）中位數：{stats['median_time_per_output_token']*1000:.1f} 毫秒，" \
+                              f"95%：{stats['p95_time_per_output_token']*1000:.1f} 毫秒"
+            log_message += f"\n最長停頓：{stats['max_stall']:.2f} 秒（95% 的回應低於 {stats['p95_max_stall']:.2f} 秒），" \
+                          f"停頓超過 {self.config.get('stall_threshold', 1.0):g} 秒的回應：{stats['stall_rate']:.2f} %"
+
+        # 串流統計模式：顯示各項時間的 p50/p95/p99/max
+        if stats.get('streaming_percentiles'):
+            labels = {"first_token_latency": "第一個 token 延遲", "total_response_time": "總回應時間", "generation_time": "生成時間"}
+            log_message += f"\n串流統計（相對誤差 ≤ {stats['streaming_relative_accuracy']*100:g} %）："
+            for name, percentiles in stats['streaming_percentiles'].items():
+                if percentiles['max'] is not None:
+                    log_message += f"\n{labels[name]} p50/p95/p99/max：" + " / ".join(f"{percentiles[q]:.2f}" for q in ("p50", "p95", "p99", "max")) + " 秒"
+
+        if stats['median_wire_first_token_time'] is not None:
+            log_message += f"\n線路層級 95% 第一個位元組延遲：{stats['p95_wire_first_token_time']:.3f} 秒\n" \
+                          f"線路層級中位數第一個位元組延遲：{stats['median_wire_first_token_time']:.3f} 秒\n" \
+                          f"前端渲染額外延遲（中位數）：{stats['median_render_overhead']:.3f} 秒"
+
+        # 開放式負載模型：顯示目標與實際的到達率，以及工作階段池是否足夠
+        if self.open_loop_report is not None:
+            report = self.open_loop_report
+            log_message += f"\n目標到達率：{report['target_rate']:.2f} 次/秒（{report['distribution']}）\n" \
+                          f"實際送出率：{report['achieved_rate']:.2f} 次/秒\n" \
+                          f"95% 排程落後低於：{report['p95_schedule_delay']:.3f} 秒（最大 {report['max_schedule_delay']:.3f} 秒）\n" \
+                          f"工作階段池大小：{report['session_pool_size']}，池不足次數：{report['pool_exhausted']}，未送出：{report['dropped']}"
+            if report['pool_exhausted']:
+                log_message += "\n警告：工作階段池太小，無法維持目標到達率"
+
+        # 分階段負載：顯示每個階段的統計，並標記飽和點
+        if self.stage_reports is not None:
+            log_message += "\n=========== 階段統計 ==========="
+            for idx, stage in enumerate(self.stage_reports):
+                p95 = f"{stage['p95_first_token_time']:.2f} 秒" if stage['p95_first_token_time'] is not None else "-"
+                log_message += f"\n階段 {idx+1}（{stage['stage']}）：交易 {stage['total_transactions']} 次，" \
+                              f"錯誤率 {stage['failed_rate']:.2f} %，95% 第一個 token 延遲 {p95}，" \
+                              f"每秒 {stage['tokens_per_second']:.2f} 個 token"
+                if stage['is_knee']:
+                    log_message += f" ← 飽和點（超過門檻：{', '.join(stage['crossed'])}）"
+
+        # 資源攔截：顯示攔截次數與共用快取節省的流量
+        if self.resource_blocker is not None:
+            blocking = self.resource_blocker.report()
+            by_type = "，".join(f"{t} {n}" for t, n in sorted(blocking['blocked_by_type'].items(), key=lambda x: -x[1]))
+            log_message += f"\n攔截請求數：{blocking['blocked']}" + (f"（{by_type}）" if by_type else "")
+            if self.resource_blocker.shared_cache:
+                log_message += f"\n共用快取命中：{blocking['cache_hits']} 次，未命中：{blocking['cache_misses']} 次，" \
+                              f"節省下載：{blocking['bytes_saved']/2**20:.2f} MB"
+
+        # 依 prompt 分類的延遲
+        if self._prompt_class_stats:
+            log_message += "\n=========== Prompt 分類統計 ==========="
+            for key, class_stats in sorted(self._prompt_class_stats.items()):
+                histogram = class_stats["first_token_latency"]
+                latency = f"p50 {histogram.percentile(50):.2f} 秒，p95 {histogram.percentile(95):.2f} 秒" if histogram.count else "-"
+                log_message += f"\n{key}：交易 {class_stats['transactions']} 次，錯誤率 {class_stats['failed']/class_stats['transactions']*100:.2f} %，" \
+                              f"第一個 token 延遲 {latency}"
+
+        # 延遲與長度分析（streaming_stats 模式不保留逐筆資料，無法分析）
+        self.length_analysis = analyze_from_config(
+            self.config,
+            input_tokens=[t for r in results for t in (r.input_token_count or [])],
+            output_tokens=[t for r in results for t in (r.ai_response_token_count or [])],
+            first_token_latency=[t for r in results for t in (r.first_token_latency or [])],
+            generation_time=[t for r in results for t in (r.generation_time or [])])
+        if self.length_analysis is not None:
+            log_message += "\n" + format_length_analysis(self.length_analysis)
+
+        # 測試端資源：量測期間測試端是否已飽和
+        if self.client_monitor is not None:
+            self.client_report = self.client_monitor.report()
+            if self.client_report is not None:
+                log_message += "\n" + format_client_report(self.client_report)
+
+        # SLA 判定（分散式測試的 coordinator 沒有逐筆資料，以合併後的統計數據判定）
+        if self.sla_monitor is not None:
+            self.sla_verdict = self.sla_monitor.verdict(stats)
+            # 測試端超出能力且設定 invalidate 時，量測結果不可信，不判定為符合
+            if self.client_report is not None and not self.client_report["valid"]:
+                self.sla_verdict["verdict"] = "invalid"
+            log_message += "\n" + format_verdict(self.sla_verdict)
+
+        # 階段追蹤：抽樣交易各階段的時間
+        if self.tracer is not None:
+            trace_summary = self.tracer.summary()
+            if trace_summary is not None:
+                log_message += "\n" + format_trace_summary(trace_summary, self.trace_path)
+
+        # 啟動成本：從開始執行到送出第一個 prompt 的時間
+        if self.time_to_first_prompt is not None:
+            mode = {"warm": "（暖啟動）", "cold": "（冷啟動）"}.get(self.start_mode, "")
+            log_message += f"\n啟動到第一個 prompt：{self.time_to_first_prompt:.2f} 秒{mode}"
+
+        # 登入狀態：顯示帳號數與實際登入次數（沿用快取時為 0）
+        if self.session_bootstrap is not None:
+            log_message += f"\n登入帳號數：{len(self.session_bootstrap.accounts)}，登入次數：{self.session_bootstrap.logins}"
+
+        # 瀏覽器池模式下，顯示每個瀏覽器行程承載的使用者數
+        if self.browser_pool is not None:
+            pool_report = self.browser_pool.report()
+            log_message += f"\n瀏覽器行程數：{pool_report['browser_processes']}\n" \
+                          f"每個行程承載使用者數：{pool_report['peak_users_per_browser']}"
+
+        self.logger.info(log_message, extra={"report": True})
         self.logger.prettify_logger()
         return log_message
 
+    def _default_trace_path(self) -> str:
+        """內部方法：追蹤檔的預設路徑（分散式測試的各分片以 browser_index_offset 區分）"""
+        suffix = f"_{self.config['browser_index_offset']}" if "browser_index_offset" in self.config else ""
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        return os.path.normpath(os.path.join(base_dir, "..", "results", "traces", f"trace_{self.run_id}{suffix}.json"))
+
     async def execute_load_test(self) -> str:
         """執行負載測試，依照設定的併發數量執行多個測試"""
         try:
             concurrency = self.config.get("concurrency", 1)
             
             self.logger.info("開始執行服務測試...")
-            async with async_playwright() as playwright:
-                tasks = [
-                    asyncio.create_task(
-                        self.run_test(playwright, idx)
-                    ) for idx in range(concurrency)
-                ]
-                
-                start_time = time.time()
-                results = await asyncio.gather(*tasks)
-                total_time = time.time() - start_time
-                
-                return self._log_test_results(results, total_time)
+            self._run_started = time.time()
+            report = None
+            # 在計時開始前建立 prompt 語料的索引（大型檔案只掃描一次）
+            self.prompt_corpus = PromptCorpus.from_config(self.config)
+            if self.prompt_corpus is not None:
+                self.logger.info(f"prompt 語料共 {len(self.prompt_corpus)} 筆")
+                self.result_listeners.append(self._record_prompt_class)
+            self.results_store = ResultsStore.from_config(self.config)
+            if self.results_store is not None:
+                self.results_store.start_run(self.run_id, self.service_name, self.config)
+                self.result_listeners.append(lambda result: self.results_store.record(self.run_id, self.service_name, result))
+            if self.sla_monitor is not None:
+                self.result_listeners.append(self._check_sla)
+            live_task = None
+            if self.live_metrics is not None:
+                self.result_listeners.append(self.live_metrics.on_result)
+                live_task = asyncio.create_task(self.live_metrics.run())
+            monitor_task = None
+            if self.client_monitor is not None:
+                self.client_monitor.active_users = lambda: len(self._active_sessions)
+                if self.results_store is not None:
+                    self.client_monitor.sample_listeners.append(lambda sample: self.results_store.record_client_sample(self.run_id, sample))
+            use_browser = self.config.get("driver", "browser") != "http"
+            if not use_browser:
+                driver = contextlib.nullcontext()
+            elif self.warm_pool is not None:
+                # 沿用常駐的 Playwright driver（不在這裡關閉）
+                driver = contextlib.nullcontext(await self.warm_pool.start())
+            else:
+                driver = async_playwright()
+                self.start_mode = "cold"
+            async with driver as playwright:
+                # 設定 browser_pool_size 時，改用瀏覽器池讓多個使用者共用瀏覽器行程
+                # 有常駐瀏覽器池時一律使用瀏覽器池，預設借用 min(concurrency, 常駐池上限) 個瀏覽器
+                pool_size = self.config.get("browser_pool_size")
+                if self.warm_pool is not None:
+                    # 常駐瀏覽器池限制瀏覽器總數，借用的數量不能超過其上限
+                    if pool_size and pool_size > self.warm_pool.max_size:
+                        self.logger.warning(f"browser_pool_size {pool_size} 超過常駐瀏覽器池上限 {self.warm_pool.max_size}，改為 {self.warm_pool.max_size}")
+                    pool_size = min(pool_size or concurrency, self.warm_pool.max_size)
+                if pool_size and use_browser:
+                    self.browser_pool = BrowserPool(
+                        playwright,
+                        size=pool_size,
+                        headless=self.config.get("headless", False),
+                        logger=self.logger,
+                        source=self.warm_pool)
+                    await self.browser_pool.warm_up()
+                    if self.warm_pool is not None:
+                        self.start_mode = "warm" if self.browser_pool.warm_browsers == self.browser_pool.size else "cold"
+                try:
+                    # 在計時開始前登入（有效的快取直接沿用，不會重新登入）
+                    if self.config.get("login_method") and use_browser:
+                        self.session_bootstrap = SessionBootstrap(playwright, self.config, self.login, self.logger)
+                        await self.session_bootstrap.prepare()
+                    start_time = time.time()
+                    if self.client_monitor is not None:
+                        monitor_task = asyncio.create_task(self.client_monitor.run())
+                    if self.config.get("load_model") == "open":
+                        # 開放式負載模型：固定到達率
+                        results = await self._run_open_loop(playwright)
+                        for r in results:
+                            self._publish_metrics(r)
+                    elif self.config.get("load_profile"):
+                        # 分階段負載：依階段即時增減使用者數
+                        results = await self._run_load_profile(playwright)
+                        for r in results:
+                            self._publish_metrics(r)
+                    else:
+                        # 封閉式負載模型：固定併發數，每個使用者連續送出 prompt
+                        tasks = [
+                            asyncio.create_task(
+                                self.run_test(playwright, idx, browser_pool=self.browser_pool)
+                            ) for idx in range(concurrency)
+                        ]
+                        results = await asyncio.gather(*tasks)
+                    total_time = time.time() - start_time
+                    if monitor_task is not None:
+                        monitor_task.cancel()
+                        await asyncio.gather(monitor_task, return_exceptions=True)
+                    if self.tracer is not None:
+                        self.trace_path = await asyncio.to_thread(self.tracer.export, self.tracer.path or self._default_trace_path())
+                    
+                    report = self._log_test_results(results, total_time)
+                    return report
+                finally:
+                    if self.browser_pool is not None:
+                        await self.browser_pool.close()
+                    if self.http_client is not None:
+                        await self.http_client.close()
+                    if live_task is not None:
+                        live_task.cancel()
+                        await asyncio.gather(live_task, return_exceptions=True)
+                    if monitor_task is not None:
+                        monitor_task.cancel()
+                        await asyncio.gather(monitor_task, return_exceptions=True)
         finally:
-            # 清理資源，關閉文件句柄
+            if self.prompt_corpus is not None:
+                self.prompt_corpus.close()
+            # 在背景執行緒中寫完剩餘的交易，避免阻塞 event loop
+            if self.results_store is not None:
+                self.results_store.finish_run(self.run_id, report)
+                await asyncio.to_thread(self.results_store.close)
+            # 清理資源，寫入剩餘的日誌並關閉文件句柄
             if self.logger:
-                for handler in self.logger.handlers[:]:
-                    handler.close()
-                    self.logger.removeHandler(handler)
+                self.logger.close()
         
 if __name__ == '__main__':
     runner = BaseTestRunner("service")
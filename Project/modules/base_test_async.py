@@ -1,9 +1,16 @@
-from playwright.async_api import async_playwright, ElementHandle
+from playwright.async_api import async_playwright, ElementHandle, TimeoutError as PlaywrightTimeoutError
+from modules.browser_pool import BrowserPool
+from modules.network_capture import NetworkCapture
+from modules.resource_blocker import ResourceBlocker
+from modules.session_bootstrap import SessionBootstrap
+from modules.prompt_source import Prompt, PromptCorpus, PromptStream
+from modules.tracing import NULL_SPAN, Span, Tracer
 from utils.config_loader import load_config
 from utils.log_manager import setup_logger
-from dataclasses import dataclass
-import tiktoken
-from typing import Any
+from utils.tokenizer import TokenCounter
+from utils.streaming_stats import StreamingStats
+from dataclasses import dataclass, field, fields
+from typing import Any, Callable
 import asyncio
 import logging
 import time
@@ -16,19 +23,145 @@ class ResponseMetrics:
     total_response_time: list[float]
     ai_response_token_count: list[int]
     generation_time: list[float]
+    input_token_count: list[int] = field(default_factory=list)    # 每筆成功交易的 prompt token 數（與上面的列表順序一致）
+    inter_token_latency: list[float] = field(default_factory=list)  # 所有回應中相鄰兩次文字增加的間隔（秒），即逐段的 token 間延遲
+    max_stall: list[float] = field(default_factory=list)          # 每筆回應中最長的間隔（秒）
+    time_per_output_token: list[float] = field(default_factory=list)  # 每筆回應平均每個輸出 token 的時間（秒，TPOT）
+    token_count_time: list[float] = field(default_factory=list)   # 每筆回應計算 token 數的耗時（秒），與回應時間分開統計
+    wire_first_token_latency: list[float] = field(default_factory=list)  # 線路層級：請求送出到第一個串流位元組的延遲（秒）
+    wire_total_response_time: list[float] = field(default_factory=list)  # 線路層級：請求送出到串流結束的時間（秒）
+    schedule_delay: list[float] = field(default_factory=list)     # 開放式負載模型：實際送出時間落後預計送出時間的秒數
+    summary: StreamingStats | None = None   # 串流統計（streaming_stats 模式下取代上面的延遲列表，記憶體固定）
+
+    @classmethod
+    def from_results(cls, results: list["TestResult"]) -> "ResponseMetrics":
+        """ 將多筆 TestResult 彙整為 ResponseMetrics """
+        successful_results = [t for t in results if t.is_successful]
+        return cls(
+            total_transactions=sum(1 for t in results if t.is_sent),
+            failed_transactions=sum(1 for t in results if not t.is_successful),
+            first_token_latency=[t.first_token_latency for t in successful_results],
+            total_response_time=[t.total_response_time for t in successful_results],
+            ai_response_token_count=[t.token_count for t in successful_results],
+            generation_time=[t.generation_time for t in successful_results],
+            input_token_count=[t.input_token_count for t in successful_results],
+            inter_token_latency=[gap for t in successful_results for gap in t.inter_token_latencies],
+            max_stall=[t.max_stall for t in successful_results if t.inter_token_latencies],
+            time_per_output_token=[t.time_per_output_token for t in successful_results if t.time_per_output_token is not None],
+            token_count_time=[t.token_count_time for t in successful_results],
+            wire_first_token_latency=[t.wire_first_token_latency for t in successful_results if t.wire_first_token_latency is not None],
+            wire_total_response_time=[t.wire_total_response_time for t in successful_results if t.wire_total_response_time is not None],
+            schedule_delay=[t.schedule_delay for t in results if t.intended_send_time is not None and t.is_sent],
+        )
+
+    @classmethod
+    def merge(cls, metrics: list["ResponseMetrics"]) -> "ResponseMetrics":
+        """ 合併多個 ResponseMetrics（數值相加、列表串接） """
+        merged = {}
+        for f in fields(cls):
+            values = [getattr(m, f.name) for m in metrics]
+            if f.name in ("total_transactions", "failed_transactions"):
+                merged[f.name] = sum(values)
+            elif f.name == "summary":
+                summaries = [v for v in values if v is not None]
+                merged[f.name] = StreamingStats(summaries[0].relative_accuracy) if summaries else None
+                for summary in summaries:
+                    merged[f.name].merge(summary)
+            else:
+                merged[f.name] = [t for v in values for t in (v or [])]
+        return cls(**merged)
 
 @dataclass
 class TestResult:
     is_successful: bool = False             # 測試是否成功
+    is_sent: bool = False                   # prompt 是否已送出（計入總交易次數）
+    error: str = ""                         # 失敗時的錯誤類別
+    prompt_index: int = 0                   # prompt 的索引（使用 prompt_source 時為在語料中的位置）
+    prompt_id: str | None = None            # prompt 在語料中的識別碼（prompt_source 的 id_field）
+    prompt_class: str | None = None         # prompt 的分類（prompt_source 的 class_field）
+    input_bucket: str | None = None         # prompt 的輸入長度分組（prompt_source 的 length_buckets）
+    browser_index: int | None = None        # 送出這筆交易的瀏覽器（虛擬使用者）編號
+    send_time: float = 0.0                  # 實際按下 enter 的時間（time.time()，秒）
+    intended_send_time: float | None = None # 開放式負載模型中排程預計送出的時間（time.time()，秒）
+    schedule_delay: float = 0.0             # 實際送出時間落後預計送出時間的秒數
+    completed_time: float = 0.0             # 交易完成（成功或失敗）的時間（time.time()，秒）
     total_response_time: float = 0.0        # 按下 enter 到回應穩定的時間（秒）
     first_token_latency: float = 0.0        # 按下 enter 到第一個 token 出現的延遲（秒）
     token_count: int = 0                    # 回應 token 數
+    input_token_count: int = 0              # prompt 的 token 數
+    inter_token_latencies: list[float] = field(default_factory=list)  # 第一個 token 之後，相鄰兩次文字增加的間隔（秒）
+    max_stall: float = 0.0                  # 最長的間隔（秒），回應中途停住的時間
+    time_per_output_token: float | None = None  # 平均每個輸出 token 的時間（秒，TPOT），token 數不足 2 時為 None
     generation_time: float = 0.0            # 第一個 token 到回應穩定的生成時間（秒）
+    token_count_time: float = 0.0           # 計算回應 token 數的耗時（秒），不計入上面的任何時間
+    wire_first_token_latency: float | None = None  # 線路層級的第一個位元組延遲（秒），未啟用 network_capture 時為 None
+    wire_total_response_time: float | None = None  # 線路層級的串流總時間（秒），未啟用 network_capture 時為 None
+
+@dataclass
+class ResponseCapture:
+    text: str = ""                              # 回應穩定後的完整內容
+    first_token_time: float | None = None       # 第一個 token 出現的時間（performance.now()，毫秒）
+    final_token_time: float | None = None       # 回應穩定前最後一次變化的時間（毫秒），未穩定則為 None
+    end_time: float = 0.0                       # 擷取結束的時間（毫秒）
+    timeline: list[tuple[float, int]] = field(default_factory=list)  # 回應文字長度變化的時間軸 [(毫秒, 文字長度)]
+
+# 在頁面內等待新的回應元素出現，並安裝 MutationObserver 記錄每次文字變化的時間
+_INSTALL_OBSERVER_JS = """({selector, isXpath}) => {
+    const el = isXpath
+        ? document.evaluate(selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue
+        : document.querySelector(selector);
+    if (!el || el.dataset.counted !== undefined) return false;
+    el.dataset.counted = 'true';
+    el.style.backgroundColor = 'yellow';
+    el.scrollIntoView({block: 'nearest'});
+    const capture = {el: el, timeline: [], lastText: null};
+    const record = () => {
+        const text = el.innerText.trim();
+        if (text === capture.lastText) return;
+        capture.lastText = text;
+        capture.timeline.push([performance.now(), text.length]);
+    };
+    capture.observer = new MutationObserver(record);
+    capture.observer.observe(el, {childList: true, subtree: true, characterData: true});
+    record();
+    window.__slaCapture = capture;
+    return true;
+}"""
+
+# 回應在 stableMs 毫秒內沒有任何變化即視為完成
+_WAIT_STABLE_JS = """({stableMs}) => {
+    const capture = window.__slaCapture;
+    if (!capture) return true;
+    const last = capture.timeline[capture.timeline.length - 1];
+    return !!last && last[1] > 0 && performance.now() - last[0] >= stableMs;
+}"""
 
-def count_tokens(text: str):
-    enc = tiktoken.get_encoding("cl100k_base")
-    tokens = enc.encode(text)
-    return len(tokens)
+# 一次取回整段時間軸並移除 observer
+_COLLECT_TIMELINE_JS = """() => {
+    const capture = window.__slaCapture;
+    if (!capture) return null;
+    capture.observer.disconnect();
+    delete window.__slaCapture;
+    return {timeline: capture.timeline, text: capture.el.innerText, now: performance.now()};
+}"""
+
+def inter_token_latencies(timeline: list[tuple[float, int]]) -> list[float]:
+    """
+    由回應文字長度的時間軸 [(毫秒, 文字長度)] 計算第一個 token 之後，相鄰兩次文字增加的間隔（秒）。
+    每次增加可能包含多個 token（瀏覽器一次渲染或 SSE 一個 chunk），因此是逐段（chunk）的間隔；
+    polling 擷取模式的時間軸解析度為輪詢間隔（0.5 秒），需要精確的間隔時請使用 observer 模式或 http driver。
+    """
+    gaps = []
+    previous_time = None
+    longest = 0
+    for t, length in timeline:
+        if length <= longest:
+            continue
+        if previous_time is not None:
+            gaps.append((t - previous_time) / 1000)
+        previous_time = t
+        longest = length
+    return gaps
 
 class BaseTestAsync:
     def __init__(self,
@@ -38,6 +171,14 @@ class BaseTestAsync:
                  logger=None,
                  verbose=False,
                  headless=None,
+                 browser_pool: BrowserPool = None,
+                 config: dict = None,
+                 browser_index: int = None,
+                 resource_blocker: ResourceBlocker = None,
+                 session_bootstrap: SessionBootstrap = None,
+                 prompt_corpus: PromptCorpus = None,
+                 stop_event: asyncio.Event = None,
+                 tracer: Tracer = None,
                  ) -> None:
         """ 初始化 BaseTestAsync
 
@@ -48,14 +189,41 @@ class BaseTestAsync:
             - logger (Logger, optional): Logger管理器，預設為 None。若為 None，則會在 setup() 時初始化。
             - verbose (bool, optional): 是否顯示詳細AI的回應，預設為 False。
             - headless (bool, optional): 單獨控制 headless 模式或使用config設定，預設為None。
+            - browser_pool (BrowserPool, optional): 共用的瀏覽器池，預設為 None。若有傳入，則不會自行啟動瀏覽器，而是從瀏覽器池取得獨立的 BrowserContext。
+            - config (dict, optional): 直接指定配置內容，預設為 None。若為 None，則根據服務名稱讀取配置文件。
+            - browser_index (int, optional): 瀏覽器（虛擬使用者）編號，會記錄在每筆 TestResult 中，預設為 None。
+            - resource_blocker (ResourceBlocker, optional): 共用的請求路由，預設為 None。若有傳入，會在每個 context 上攔截不需要的資源。
+            - session_bootstrap (SessionBootstrap, optional): 共用的登入狀態，預設為 None。若有傳入，每個 context 建立時會載入已登入的 storage state。
+            - prompt_corpus (PromptCorpus, optional): 共用的 prompt 語料，預設為 None。若未傳入但配置有 prompt_source，會在 setup() 時自行建立。
+            - stop_event (asyncio.Event, optional): 提前結束的通知（例如 SLA 已判定），設定後 run_test() 不再送出新的 prompt，預設為 None。
+            - tracer (Tracer, optional): 共用的階段追蹤，預設為 None（不追蹤）。
         """
         # 根據服務名稱讀取配置
-        self.config = load_config(service_name)
+        self.config = config if config is not None else load_config(service_name)
         self.browser = None
+        self.context = None
         self.page = None
+        self.network_capture: NetworkCapture = None
+        self.browser_pool = browser_pool
+        self._pool_browser_idx = None
+        self.browser_index = browser_index
+        self.resource_blocker = resource_blocker
+        self.session_bootstrap = session_bootstrap
+        self._account_idx = session_bootstrap.account_for(browser_index or 1) if session_bootstrap is not None else None
+        self._state_generation = None
+        self.prompt_corpus = prompt_corpus
+        # 設定 prompt_source 時，每個使用者有自己的 prompt 串流（取代依序使用 test_prompts）
+        self.prompt_stream: PromptStream = None
+        self._prompt_counter = 0
+        self.stop_event = stop_event
+        # 設定 tracing 時，抽樣的交易會記錄各階段的 span（目前交易的 span 保存在 _trace）
+        self.tracer = tracer
+        self._trace: Span = NULL_SPAN
         # LoggerAdapter 包裝
-        self.logger = logging.LoggerAdapter(logger if logger else setup_logger(service_name), {'browser_name': browser_name})
-        self.logger.process = lambda msg, kwargs: (f"{browser_name} {msg}".strip(), kwargs)
+        extra = {'browser_name': browser_name, 'browser_index': browser_index}
+        self.logger = logging.LoggerAdapter(logger if logger else setup_logger(service_name), extra)
+        # 文字日誌在訊息前加上瀏覽器名稱，結構化日誌另外保留 browser_name / browser_index 欄位
+        self.logger.process = lambda msg, kwargs: (f"{browser_name} {msg}".strip(), {**kwargs, 'extra': {**extra, **kwargs.get('extra', {})}})
         
         if playwright_instance is not None:
             self.playwright = playwright_instance
@@ -65,47 +233,383 @@ class BaseTestAsync:
         
         self.verbose = verbose
         self._headless = headless
+        # token 計算服務（依配置的 tokenizer 欄位選擇 encoding，相同設定的實例共用）
+        self.token_counter = TokenCounter.from_config(self.config)
+        # 每筆交易完成時會以 TestResult 呼叫這些 listener（例如即時指標）
+        self.result_listeners: list[Callable[[TestResult], None]] = []
         
     
     async def setup(self,**kargs) -> None:
         """ 初始化 Playwright 
         1. 啟動Async Playwright
-        2. 創建新的瀏覽器實例，並設定是否 headless
+        2. 創建新的瀏覽器實例，並設定是否 headless（使用瀏覽器池時改為從池中取得新的 context）
         3. 創建新的頁面實例
         
         kwargs:
         - test_prompts (List[str], optional): 測試的 prompt 列表，預設使用配置文件中的 test_prompts。
         """
-        # 如果已經有 Playwright 實例，就不需要再初始化
-        if not self.playwright:
-            self.playwright = await async_playwright().start()
+        if self.browser_pool is None:
+            # 如果已經有 Playwright 實例，就不需要再初始化
+            if not self.playwright:
+                self.playwright = await async_playwright().start()
+            
+            # 是否 headless 模式
+            headless = self._headless if self._headless is not None else self.config.get("headless",False)
+            self.browser = await self.playwright.chromium.launch(headless=headless)
+        await self._new_context()
         
-        # 是否 headless 模式
-        headless = self._headless if self._headless is not None else self.config.get("headless",False)
-        self.browser = await self.playwright.chromium.launch(headless=headless)
-        context = await self.browser.new_context(user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36")
-        self.page = await context.new_page()
-        await self.page.evaluate("() => { Object.defineProperty(navigator, 'webdriver', {get: () => undefined}) }")
+        # 設定 network_capture 時，另外在線路層級記錄串流 endpoint 的時間
+        network_config = self.config.get("network_capture")
+        if network_config:
+            self.network_capture = NetworkCapture(self.page, **network_config)
+            await self.network_capture.attach()
         
-        # 如果有傳入 test_prompts，就使用傳入的，否則使用配置文件中的 test_prompts
+        self._load_prompts(kargs)
+
+    def _load_prompts(self, kargs: dict) -> None:
+        """ 如果有傳入 test_prompts，就使用傳入的，否則使用配置文件中的 test_prompts 或 prompt_source """
         if "test_prompts" in kargs:
             self.prompts = kargs["test_prompts"]
             assert isinstance(self.prompts, list), "test_prompts 必須是一個列表"
+            return
+        self.prompts = self.config.get("test_prompts")
+        if self.config.get("prompt_source"):
+            if self.prompt_corpus is None:
+                self.prompt_corpus = PromptCorpus.from_config(self.config)
+            self.prompt_stream = self.prompt_corpus.stream(self.browser_index or 1)
+
+    def next_prompt(self) -> tuple[int, str | Prompt]:
+        """ 取得這個使用者的下一個 prompt：有 prompt_source 時由 prompt 串流抽樣，否則依序循環 test_prompts """
+        if self.prompt_stream is not None:
+            prompt = self.prompt_stream.next()
+            return prompt.index, prompt
+        index = self._prompt_counter % len(self.prompts)
+        self._prompt_counter += 1
+        return index, self.prompts[index]
+
+
+    async def _new_context(self) -> None:
+        """ 建立 context 與頁面（使用瀏覽器池時從池中取得新的 context；有 session bootstrap 時載入登入狀態） """
+        context_options = {
+            "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
+        }
+        if self.session_bootstrap is not None:
+            context_options["storage_state"], self._state_generation = self.session_bootstrap.state_for(self._account_idx)
+        if self.browser_pool is not None:
+            # 使用瀏覽器池：每個使用者擁有獨立的 context，共用瀏覽器行程
+            self.context, self._pool_browser_idx = await self.browser_pool.new_context(**context_options)
         else:
-            self.prompts = self.config.get("test_prompts")
+            self.context = await self.browser.new_context(**context_options)
+        # 設定 resource_blocking 時，在開啟頁面前安裝請求路由
+        if self.resource_blocker is not None:
+            await self.resource_blocker.attach(self.context)
+        self.page = await self.context.new_page()
+        await self.page.evaluate("() => { Object.defineProperty(navigator, 'webdriver', {get: () => undefined}) }")
 
+    async def _close_context(self) -> None:
+        # 使用瀏覽器池時交還 context，否則直接關閉
+        if self.browser_pool is not None:
+            await self.browser_pool.release_context(self.context, self._pool_browser_idx)
+        else:
+            await self.context.close()
+        self.context = None
 
     async def teardown(self) -> None:
         """ 關閉 Playwright """
+        # 使用瀏覽器池時只關閉自己的 context，瀏覽器行程交由瀏覽器池管理
+        if self.browser_pool is not None and self.context is not None:
+            await self.browser_pool.release_context(self.context, self._pool_browser_idx)
+            self.context = None
         if self.browser:
             await self.browser.close()
         # 注意：如果 Playwright 是由外部傳入，就不要關閉它，否則會影響其他測試
         if self.playwright and not getattr(self, '_external_playwright', False):
             await self.playwright.stop()
         
+    async def open_page(self) -> None:
+        """ 前往測試 URL（若頁面尚未開啟）；工作階段過期時重新登入並以新的登入狀態重建 context """
+        if self.page.url == "about:blank":
+            await self.page.goto(self.config["url"])
+        if self.session_bootstrap is not None and self.session_bootstrap.is_expired(self.page.url):
+            self.logger.warning("工作階段已過期，重新登入")
+            await self.session_bootstrap.refresh(self._account_idx, self._state_generation)
+            await self._close_context()
+            await self._new_context()
+            if self.network_capture is not None:
+                self.network_capture = NetworkCapture(self.page, **self.config["network_capture"])
+                await self.network_capture.attach()
+            await self.page.goto(self.config["url"])
+
+    async def _capture_by_polling(self) -> ResponseCapture:
+        """ 每 0.5 秒輪詢回應區域，直到內容連續穩定 stable_window 秒（預設 2 秒） """
+        # FIX 如果AI回應太快，可能會跳過一些回應
+        ai_output=None
+        found_new_response = False
+        with self._trace.span("find_response") as span:
+            for polls in range(1, 31): # 最多等待 15 秒
+                ai_output = await self.page.query_selector(self.config['response_selector'])
+                is_counted = await ai_output.get_attribute('data-counted')
+                if is_counted is None:
+                    await ai_output.evaluate("""(el) => {
+                        el.dataset.counted = 'true';
+                        el.style.backgroundColor = 'yellow';
+                    }""")
+                    await ai_output.scroll_into_view_if_needed()
+                    found_new_response = True
+                    break
+                await asyncio.sleep(0.5)
+            span.set(polls=polls)
+        if not found_new_response:
+            raise TimeoutError("找不到新回應")
+        
+        # 等待輸出區域穩定（避免回應還在逐步輸出）
+        stable_duration = 0      # 穩定持續時間
+        poll_interval = 0.5      # 每隔 0.5 秒檢查一次
+        required_stable_time = self.config.get("stable_window", 2) # 需要連續穩定 2 秒
+        prev_text = ""
+        timeline = []            # 文字長度變化的時間軸（只在內容改變時記錄）
+        first_token_time = None
+        final_token_time = None  # 記錄真正的回應完成時間
+
+        with self._trace.span("wait_stable"):
+            for _ in range(60):
+                current_text = await ai_output.inner_text()
+                current_time = await self.page.evaluate("performance.now()")
+
+                if current_text != prev_text or not timeline:
+                    timeline.append((current_time, len(current_text.strip())))
+
+                # 記錄第一個 token 出現的時間
+                if (first_token_time is None) and current_text.strip():
+                    first_token_time = current_time
+
+                if current_text == prev_text and current_text.strip():  # 確保有內容且穩定
+                    stable_duration += poll_interval
+                    if final_token_time is None:  # 第一次達到穩定狀態
+                        final_token_time = current_time
+                else:
+                    stable_duration = 0
+                    prev_text = current_text
+                    final_token_time = None  # 重新等待新的穩定狀態
+
+                if stable_duration >= required_stable_time:
+                    break
+                await asyncio.sleep(poll_interval)
+        return ResponseCapture(
+            text=current_text,
+            first_token_time=first_token_time,
+            final_token_time=final_token_time,
+            end_time=current_time,
+            timeline=timeline,
+        )
+
+    async def _capture_by_observer(self) -> ResponseCapture:
+        """
+        以頁面內的 MutationObserver 擷取回應：
+        1. 在頁面內等待新的回應元素出現並安裝 observer（不需要 Python 端輪詢）
+        2. observer 在頁面內記錄每次文字變化的 performance.now()
+        3. 回應穩定後以一次 evaluate 取回完整時間軸
+        """
+        selector = self.config['response_selector']
+        is_xpath = selector.startswith("xpath=") or selector.startswith("//") or selector.startswith("(//")
+        if selector.startswith("xpath="):
+            selector = selector[len("xpath="):]
+        stable_ms = self.config.get("stable_window", 2) * 1000
+
+        try:
+            with self._trace.span("find_response"):
+                await self.page.wait_for_function(
+                    _INSTALL_OBSERVER_JS, arg={"selector": selector, "isXpath": is_xpath}, polling="raf", timeout=15000)
+        except PlaywrightTimeoutError:
+            raise TimeoutError("找不到新回應")
+
+        completed = True
+        try:
+            with self._trace.span("wait_stable"):
+                await self.page.wait_for_function(
+                    _WAIT_STABLE_JS, arg={"stableMs": stable_ms}, polling=100, timeout=30000 + stable_ms)
+        except PlaywrightTimeoutError:
+            completed = False
+
+        with self._trace.span("collect_timeline"):
+            collected = await self.page.evaluate(_COLLECT_TIMELINE_JS)
+        if collected is None:
+            raise RuntimeError("回應擷取狀態遺失")
+        timeline = [(t, length) for t, length in collected["timeline"]]
+        first_token_time = next((t for t, length in timeline if length > 0), None)
+        final_token_time = timeline[-1][0] if completed and timeline else None
+        return ResponseCapture(
+            text=collected["text"],
+            first_token_time=first_token_time,
+            final_token_time=final_token_time,
+            end_time=collected["now"],
+            timeline=timeline,
+        )
+
+    async def run_prompt(self, index: int, prompt: str | Prompt, intended_send_time: float = None) -> TestResult:
+        """
+        執行單次交易：送出一個 prompt 並等待回應穩定。
+
+        參數：
+        - index: prompt 的索引（用於日誌）
+        - prompt: 要送出的 prompt（字串，或由 prompt 串流取得的 Prompt）
+        - intended_send_time: 排程預計送出的時間（time.time()，秒），開放式負載模型使用。
+          若有設定，延遲會從預計送出時間開始計算，以修正 coordinated omission。
+
+        回傳：
+        - TestResult: 單次交易的結果，失敗時 is_successful 為 False
+        """
+        current_result, prompt = self._new_result(index, prompt, intended_send_time)
+        trace = self._start_trace(current_result)
+        try:
+            with trace.span("open_page"):
+                await self.open_page()
+            
+            self.logger.info(f"測試 Prompt{index+1}")
+            
+            # --------------以下為 UI 交互邏輯--------------
+            
+            # TODO 若有需要這裡可能需要處理input_selector不是唯一的情況
+            # 先等待至少有一個匹配的輸入框出現
+            # await self.page.wait_for_selector(input_selector, timeout=10000)
+            # # 取得所有匹配的元素
+            # textareas = await self.page.query_selector_all(input_selector)
+            # # 過濾出所有可見的輸入框
+            # visible_textareas:list[ElementHandle] = []
+            # for ta in textareas:
+            #     if await ta.is_visible():
+            #         visible_textareas.append(ta)
+            # if not visible_textareas:
+            #     raise Exception("No visible input element found")
+            # # 根據需求選擇目標：例如選取第一個或最後一個
+            # input_area = visible_textareas[-1]  # 或 visible_textareas[-1]
+            
+            with trace.span("wait_input"):
+                input_area = await self.page.wait_for_selector(self.config['input_selector'],timeout=10000)
+                await input_area.scroll_into_view_if_needed()
+                # 高亮輸入框
+                await input_area.evaluate("(el)=>el.style.backgroundColor='yellow'")
+            
+            # 輸入 prompt
+            with trace.span("fill"):
+                await input_area.fill(prompt)
+            if self.network_capture:
+                self.network_capture.begin()
+            with trace.span("submit"):
+                await input_area.press("Enter")
+            
+            # 記錄送出時間
+            self._mark_sent(current_result)
+            start_time = await self.page.evaluate("performance.now()")
+            current_result.is_sent = True
+            
+            # --------------以上為 UI 交互邏輯--------------
+            
+            # --------------以下為計時器--------------
+            # 依照 capture_mode 擷取回應：polling（預設，每 0.5 秒輪詢）或 observer（頁面內 MutationObserver）
+            with trace.span("capture"):
+                if self.config.get("capture_mode", "polling") == "observer":
+                    capture = await self._capture_by_observer()
+                else:
+                    capture = await self._capture_by_polling()
+            wire_timing = await self.network_capture.collect() if self.network_capture else None
+            # --------------以上為計時器--------------
+            
+            # --------------以下為結果儲存--------------
+            await self._record_capture(index, current_result, capture, start_time, prompt)
+            
+            if wire_timing is not None and not wire_timing.failed:
+                current_result.wire_first_token_latency = wire_timing.first_byte_latency
+                current_result.wire_total_response_time = wire_timing.total_time
+            # --------------以上為結果儲存--------------
+        except Exception as e:
+            self.logger.error(f"測試 Prompt{index+1} 發生錯誤：{e}")
+            current_result.is_successful = False
+            current_result.error = type(e).__name__
+        with trace.span("publish"):
+            self._publish_result(current_result)
+        self._finish_trace(current_result)
+        return current_result
+
+    def _start_trace(self, result: TestResult) -> Span:
+        """ 開始這筆交易的追蹤（未設定 tracing 或未抽中時為 NULL_SPAN） """
+        if self.tracer is None:
+            self._trace = NULL_SPAN
+        else:
+            self._trace = self.tracer.transaction(
+                user=self.browser_index, prompt_index=result.prompt_index, prompt_id=result.prompt_id, prompt_class=result.prompt_class)
+        return self._trace
+
+    def _finish_trace(self, result: TestResult) -> None:
+        self._trace.finish(result.error if not result.is_successful else None,
+                           successful=result.is_successful, token_count=result.token_count, input_token_count=result.input_token_count)
+        self._trace = NULL_SPAN
+
+    def _new_result(self, index: int, prompt: str | Prompt, intended_send_time: float = None) -> tuple[TestResult, str]:
+        """ 建立這筆交易的 TestResult（記錄 prompt 的識別資訊），並回傳要送出的文字 """
+        result = TestResult(intended_send_time=intended_send_time, prompt_index=index, browser_index=self.browser_index)
+        if isinstance(prompt, Prompt):
+            result.prompt_id, result.prompt_class, result.input_bucket = prompt.prompt_id, prompt.prompt_class, prompt.input_bucket
+            return result, prompt.text
+        return result, prompt
+
+    def _mark_sent(self, result: TestResult) -> None:
+        """ 記錄送出時間；開放式負載模型同時計算落後預計送出時間的秒數（之後失敗的交易也計入排程落後） """
+        result.send_time = time.time()
+        if result.intended_send_time is not None:
+            result.schedule_delay = max(0.0, result.send_time - result.intended_send_time)
+
+    async def _record_capture(self, index: int, result: TestResult, capture: ResponseCapture, start_time: float, prompt: str = "") -> None:
+        """
+        由擷取到的回應計算各項時間並寫入 TestResult。
+
+        參數：
+        - index: prompt 的索引（用於日誌）
+        - result: 要寫入的 TestResult（send_time 與 schedule_delay 已設定）
+        - capture: 擷取到的回應，時間單位為毫秒
+        - start_time: 送出 prompt 的時間，與 capture 使用相同的時鐘（毫秒）
+        - prompt: 送出的 prompt（計算輸入 token 數，用於延遲與長度分析）
+        """
+        result.is_successful = True
+        result.total_response_time = (capture.final_token_time - start_time)/1000 if capture.final_token_time is not None else (capture.end_time - start_time)/1000
+        result.first_token_latency = (capture.first_token_time - start_time)/1000 if capture.first_token_time is not None else 0
+        # token 計算在執行器中進行，不阻塞其他使用者的計時
+        with self._trace.span("count_tokens"):
+            (result.token_count, result.token_count_time), result.input_token_count = await asyncio.gather(
+                self.token_counter.count_timed(capture.text), self.token_counter.count(prompt))
+        result.generation_time = (capture.final_token_time - capture.first_token_time)/1000 if capture.final_token_time is not None and capture.first_token_time is not None else 0
+        # 串流平順度：由擷取時記錄的時間軸計算（不需要額外與瀏覽器往返）
+        result.inter_token_latencies = inter_token_latencies(capture.timeline)
+        result.max_stall = max(result.inter_token_latencies, default=0.0)
+        if result.token_count > 1 and result.generation_time > 0:
+            result.time_per_output_token = result.generation_time / (result.token_count - 1)
+        
+        # 開放式負載模型：延遲從預計送出時間開始計算（schedule_delay 已在送出時計算）
+        if result.intended_send_time is not None:
+            result.total_response_time += result.schedule_delay
+            if capture.first_token_time is not None:
+                result.first_token_latency += result.schedule_delay
+        
+        # 紀錄回應內容
+        with self._trace.span("log"):
+            if self.verbose:
+                self.logger.info(f"Prompt{index+1} 回應內容：{capture.text}")
+            
+            self.logger.info(
+                f"Prompt{index+1} 測試完成，總回應時間: {result.total_response_time:.2f} 秒，第一個 token 延遲: {result.first_token_latency:.2f} 秒，回應token數: {result.token_count}，生成時間: {result.generation_time:.2f} 秒")
+
+    def _publish_result(self, result: TestResult) -> None:
+        """ 記錄交易完成時間，並將結果送給所有 result listener """
+        result.completed_time = time.time()
+        for listener in self.result_listeners:
+            try:
+                listener(result)
+            except Exception as e:
+                self.logger.error(f"result listener 發生錯誤：{e}")
+
     async def run_test(self) -> ResponseMetrics:
         """
-        執行基礎測試：
+        執行基礎測試，依序送出所有 prompt（每個 prompt 的流程見 run_prompt）：
         1. 記錄開始時間 (performance.now())
         2. 送出 prompt
         3. 等待 AI 回應區域的內容變化並穩定
@@ -123,140 +627,27 @@ class BaseTestAsync:
         - total_response_time: list[float]
         - ai_response_token_count: list[int]
         - generation_time: list[float]
+        - token_count_time: list[float]
+        - wire_first_token_latency: list[float]
+        - wire_total_response_time: list[float]
         """
-        
-        
         # 紀錄每次測試結果的list，一次結果為一個TestResult
-        _test_results:list[TestResult] = [TestResult() for _ in range(len(self.prompts))]
-        total_transactions = 0
+        _test_results:list[TestResult] = []
         failed_transactions = 0
         
-        # 前往測試 URL
-        if self.page.url == "about:blank":
-            await self.page.goto(self.config["url"])
-        
-        for index,prompt in enumerate(self.prompts):
-            try:
-                self.logger.info(f"測試 Prompt{index+1}")
-                
-                # --------------以下為 UI 交互邏輯--------------
-                
-                # TODO 若有需要這裡可能需要處理input_selector不是唯一的情況
-                # 先等待至少有一個匹配的輸入框出現
-                # await self.page.wait_for_selector(input_selector, timeout=10000)
-                # # 取得所有匹配的元素
-                # textareas = await self.page.query_selector_all(input_selector)
-                # # 過濾出所有可見的輸入框
-                # visible_textareas:list[ElementHandle] = []
-                # for ta in textareas:
-                #     if await ta.is_visible():
-                #         visible_textareas.append(ta)
-                # if not visible_textareas:
-                #     raise Exception("No visible input element found")
-                # # 根據需求選擇目標：例如選取第一個或最後一個
-                # input_area = visible_textareas[-1]  # 或 visible_textareas[-1]
-                
-                input_area = await self.page.wait_for_selector(self.config['input_selector'],timeout=10000)
-                await input_area.scroll_into_view_if_needed()
-                # 高亮輸入框
-                await input_area.evaluate("(el)=>el.style.backgroundColor='yellow'")
-                
-                # 輸入 prompt
-                await input_area.fill(prompt)
-                await input_area.press("Enter")
-                
-                # 記錄送出時間
-                start_time = await self.page.evaluate("performance.now()")
-                total_transactions += 1
-                
-                # FIX 如果AI回應太快，可能會跳過一些回應
-                ai_output=None
-                found_new_response = False
-                for _ in range(30): # 最多等待 15 秒
-                    ai_output = await self.page.query_selector(self.config['response_selector'])
-                    is_counted = await ai_output.get_attribute('data-counted')
-                    if is_counted is None:
-                        await ai_output.evaluate("""(el) => {
-                            el.dataset.counted = 'true';
-                            el.style.backgroundColor = 'yellow';
-                        }""")
-                        await ai_output.scroll_into_view_if_needed()
-                        found_new_response = True
-                        break
-                    await asyncio.sleep(0.5)
-                if not found_new_response:
-                    raise TimeoutError("找不到新回應")
-                
-                # --------------以上為 UI 交互邏輯--------------
-                
-                
-
-                # --------------以下為計時器--------------
-                # 等待輸出區域穩定（避免回應還在逐步輸出）
-                stable_duration = 0      # 穩定持續時間
-                poll_interval = 0.5      # 每隔 0.5 秒檢查一次
-                required_stable_time = 2 # 需要連續穩定 2 秒
-                prev_text = ""
-                first_token_time = None
-                final_token_time = None  # 記錄真正的回應完成時間
-
-                for _ in range(60):
-                    current_text = await ai_output.inner_text()
-                    current_time = await self.page.evaluate("performance.now()")
-
-                    # 記錄第一個 token 出現的時間
-                    if (first_token_time is None) and current_text.strip():
-                        first_token_time = current_time
-
-                    if current_text == prev_text and current_text.strip():  # 確保有內容且穩定
-                        stable_duration += poll_interval
-                        if final_token_time is None:  # 第一次達到穩定狀態
-                            final_token_time = current_time
-                    else:
-                        stable_duration = 0
-                        prev_text = current_text
-                        final_token_time = None  # 重新等待新的穩定狀態
-
-                    if stable_duration >= required_stable_time:
-                        break
-                    await asyncio.sleep(poll_interval)
-                # --------------以上為計時器--------------
-                
-                
-                
-                # --------------以下為結果儲存--------------
-                current_result = _test_results[index]
-                current_result.is_successful = True
-                current_result.total_response_time = (final_token_time - start_time)/1000 if final_token_time is not None else (current_time - start_time)/1000
-                current_result.first_token_latency = (first_token_time - start_time)/1000 if first_token_time is not None else 0
-                current_result.token_count = count_tokens(await ai_output.inner_text())
-                current_result.generation_time = (final_token_time - first_token_time)/1000 if final_token_time is not None else 0
-                
-                # 紀錄回應內容
-                if self.verbose:
-                    self.logger.info(f"Prompt{index+1} 回應內容：{await ai_output.inner_text()}")
-                
-                self.logger.info(
-                    f"Prompt{index+1} 測試完成，總回應時間: {current_result.total_response_time:.2f} 秒，第一個 token 延遲: {current_result.first_token_latency:.2f} 秒，回應token數: {current_result.token_count}，生成時間: {current_result.generation_time:.2f} 秒")
-                
-                # --------------以上為結果儲存--------------
-            except Exception as e:
-                self.logger.error(f"測試 Prompt{index+1} 發生錯誤：{e}")
+        # 使用 prompt_source 時每一輪送出 round_size 個 prompt（預設為 1）
+        if self.prompt_stream is not None:
+            rounds = [self.next_prompt() for _ in range(self.config["prompt_source"].get("round_size", 1))]
+        else:
+            rounds = enumerate(self.prompts)
+        for index,prompt in rounds:
+            if self.stop_event is not None and self.stop_event.is_set():
+                break
+            result = await self.run_prompt(index, prompt)
+            _test_results.append(result)
+            if not result.is_successful:
                 failed_transactions+=1
             if failed_transactions>=5:
                 break
-                
-
-        successful_results = [t for t in _test_results if t.is_successful]
-
-        return ResponseMetrics(
-            total_transactions=total_transactions,
-            failed_transactions=failed_transactions,
-            first_token_latency=[t.first_token_latency for t in successful_results],
-            total_response_time=[t.total_response_time for t in successful_results],
-            ai_response_token_count=[t.token_count for t in successful_results],
-            generation_time=[t.generation_time for t in successful_results],
-        )
-
 
-        
\ No newline at end of file
+        return ResponseMetrics.from_results(_test_results)
@@ -0,0 +1,268 @@
+from playwright.async_api import Playwright, Browser, BrowserContext, async_playwright
+import asyncio
+import logging
+import time
+
+
+class BrowserPool:
+    """
+    瀏覽器池：以少量的 Chromium 行程承載大量虛擬使用者。
+
+    每個虛擬使用者拿到的是獨立的 BrowserContext（cookies、storage 互不影響），
+    使用者依 round-robin 分配到各個瀏覽器行程。
+    瀏覽器池的暖機 (warm_up) 與關閉 (close) 和每個使用者的 setup/teardown 分開管理。
+    """
+    def __init__(self,
+                 playwright: Playwright,
+                 size: int = 1,
+                 headless: bool = False,
+                 logger: logging.Logger = None,
+                 source: "WarmBrowserPool" = None,
+                 **launch_options) -> None:
+        """ 初始化 BrowserPool
+
+        參數:
+            - playwright (Playwright): 已啟動的 playwright 實例
+            - size (int, optional): 瀏覽器行程數量，預設為 1
+            - headless (bool, optional): 是否以 headless 模式啟動，預設為 False
+            - logger (Logger, optional): Logger，預設為 None
+            - source (WarmBrowserPool, optional): 常駐的瀏覽器池，預設為 None。若有傳入，瀏覽器從中借用並在 close() 時歸還，不會重新啟動
+            - **launch_options: 傳給 chromium.launch() 的其他參數
+        """
+        self.playwright = playwright
+        self.size = max(1, int(size))
+        self.headless = headless
+        self.logger = logger or logging.getLogger(__name__)
+        self.launch_options = launch_options
+        self.source = source
+        self.browsers: list[Browser] = []
+        self.warm_browsers = 0               # 從常駐瀏覽器池借到的已啟動瀏覽器數
+        self._active_users: list[int] = []   # 每個行程目前承載的使用者數
+        self._peak_users: list[int] = []     # 每個行程曾同時承載的最大使用者數
+        self._total_users: list[int] = []    # 每個行程累計分配過的使用者數
+        self._next_index = 0
+        self._lock = asyncio.Lock()
+
+    async def warm_up(self) -> None:
+        """ 一次啟動所有瀏覽器行程 """
+        if self.browsers:
+            return
+        if self.source is not None:
+            borrowed = await asyncio.gather(*[self.source.acquire(self.headless) for _ in range(self.size)], return_exceptions=True)
+            errors = [b for b in borrowed if isinstance(b, BaseException)]
+            if errors:
+                # 部分借用失敗（例如常駐池已滿）時歸還已借到的瀏覽器
+                await asyncio.gather(*[self.source.release(b[0]) for b in borrowed if not isinstance(b, BaseException)])
+                raise errors[0]
+            self.browsers = [browser for browser, _ in borrowed]
+            self.warm_browsers = sum(1 for _, is_warm in borrowed if is_warm)
+        else:
+            self.browsers = list(await asyncio.gather(*[
+                self.playwright.chromium.launch(headless=self.headless, **self.launch_options)
+                for _ in range(self.size)
+            ]))
+        self._active_users = [0] * self.size
+        self._peak_users = [0] * self.size
+        self._total_users = [0] * self.size
+        self.logger.info(f"瀏覽器池暖機完成，共 {self.size} 個瀏覽器行程")
+
+    async def new_context(self, **context_options) -> tuple[BrowserContext, int]:
+        """
+        以 round-robin 的方式挑選瀏覽器行程，並建立新的 BrowserContext。
+
+        回傳：
+        - tuple[BrowserContext, int]: 新的 context 與其所屬的瀏覽器索引
+        """
+        if not self.browsers:
+            await self.warm_up()
+        async with self._lock:
+            browser_idx = self._next_index % self.size
+            self._next_index += 1
+            self._active_users[browser_idx] += 1
+            self._total_users[browser_idx] += 1
+            self._peak_users[browser_idx] = max(self._peak_users[browser_idx], self._active_users[browser_idx])
+        try:
+            context = await self.browsers[browser_idx].new_context(**context_options)
+        except Exception:
+            self._active_users[browser_idx] -= 1
+            raise
+        return context, browser_idx
+
+    async def release_context(self, context: BrowserContext, browser_idx: int) -> None:
+        """ 關閉使用者的 context，瀏覽器行程保持運作 """
+        try:
+            await context.close()
+        finally:
+            self._active_users[browser_idx] = max(0, self._active_users[browser_idx] - 1)
+
+    def report(self) -> dict:
+        """ 回傳每個瀏覽器行程承載的使用者數 """
+        return {
+            "browser_processes": len(self.browsers),
+            "active_users_per_browser": list(self._active_users),
+            "peak_users_per_browser": list(self._peak_users),
+            "total_users_per_browser": list(self._total_users),
+        }
+
+    async def close(self) -> None:
+        """ 關閉瀏覽器池中的所有瀏覽器行程（借用的瀏覽器則歸還給常駐瀏覽器池） """
+        browsers, self.browsers = self.browsers, []
+        if self.source is not None:
+            await asyncio.gather(*[self.source.release(b) for b in browsers], return_exceptions=True)
+        else:
+            await asyncio.gather(*[b.close() for b in browsers], return_exceptions=True)
+
+
+class WarmBrowserPool:
+    """
+    常駐的瀏覽器池：在長時間執行的行程（例如 Flask 服務）中保留一個 Playwright driver 與已啟動的瀏覽器，
+    讓每次測試與選擇器偵測直接借用，省去啟動 driver 與瀏覽器的時間。
+
+    - 借出與閒置的瀏覽器合計不超過 max_size；池滿時 acquire() 等待其他借用者歸還，超過 acquire_timeout 秒則拋出 TimeoutError
+    - acquire() 優先借出閒置且健康（仍連線）的瀏覽器，沒有時才啟動新的瀏覽器（必要時先關閉一個 headless 設定不同的閒置瀏覽器）
+    - release() 關閉瀏覽器中殘留的 context 後放回池中
+    - 閒置超過 idle_timeout 秒的瀏覽器會被關閉，釋放記憶體
+    所有方法都必須在同一個 event loop 中呼叫（Playwright 的物件綁定在建立它的 event loop）。
+    """
+    def __init__(self, max_size: int = 4, idle_timeout: float = 600, acquire_timeout: float | None = 60, logger: logging.Logger = None) -> None:
+        """ 初始化 WarmBrowserPool
+
+        參數:
+            - max_size (int, optional): 瀏覽器數量上限（借出與閒置合計），預設為 4
+            - idle_timeout (float, optional): 閒置瀏覽器的保留時間（秒），預設為 600
+            - acquire_timeout (float, optional): 池滿時 acquire() 最多等待的秒數，None 表示一直等待，預設為 60
+            - logger (Logger, optional): Logger，預設為 None
+        """
+        self.max_size = max(1, int(max_size))
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.logger = logger or logging.getLogger(__name__)
+        self.playwright: Playwright = None
+        self._driver = None
+        self._idle: list[tuple[Browser, bool, float]] = []   # (瀏覽器, headless, 開始閒置的時間)
+        self._borrowed: dict[Browser, bool] = {}
+        # 每個借用（包含啟動中的瀏覽器）佔用一個名額，_in_use 為目前佔用的名額數
+        self._slots = asyncio.Semaphore(self.max_size)
+        self._in_use = 0
+        self._evictor: asyncio.Task = None
+        self.launched = 0
+        self.reused = 0
+        self.evicted = 0
+
+    async def start(self) -> Playwright:
+        """ 啟動（或沿用）常駐的 Playwright driver """
+        if self.playwright is None:
+            self._driver = async_playwright()
+            self.playwright = await self._driver.start()
+            self._evictor = asyncio.create_task(self._evict_idle())
+        return self.playwright
+
+    async def prewarm(self, count: int, headless: bool = True) -> None:
+        """ 預先啟動瀏覽器放入池中（最多 max_size 個） """
+        count = min(count, self.max_size)
+        try:
+            browsers = await asyncio.gather(*[self.acquire(headless) for _ in range(count)])
+            await asyncio.gather(*[self.release(browser) for browser, _ in browsers])
+            self.logger.info(f"常駐瀏覽器池暖機完成，共 {count} 個瀏覽器")
+        except Exception as e:
+            self.logger.warning(f"常駐瀏覽器池暖機失敗：{e}")
+
+    async def acquire(self, headless: bool = True) -> tuple[Browser, bool]:
+        """
+        借用一個瀏覽器。
+
+        回傳：
+        - tuple[Browser, bool]: 瀏覽器與是否為已啟動的瀏覽器（暖啟動）
+        """
+        await self.start()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"常駐瀏覽器池已滿（{self.max_size} 個瀏覽器都在使用中），等待 {self.acquire_timeout:g} 秒後仍無法借用")
+        self._in_use += 1
+        try:
+            while True:
+                entry = next((e for e in self._idle if e[1] == headless), None)
+                if entry is None:
+                    break
+                self._idle.remove(entry)
+                browser = entry[0]
+                # 健康檢查：瀏覽器可能已經當機或被關閉
+                if browser.is_connected():
+                    self._borrowed[browser] = headless
+                    self.reused += 1
+                    return browser, True
+            # 沒有可用的閒置瀏覽器：總數已達上限時先關閉一個閒置的瀏覽器（headless 設定不同）
+            if self._idle and self._in_use + len(self._idle) > self.max_size:
+                browser, _, _ = self._idle.pop(0)
+                self.evicted += 1
+                await self._close_browser(browser)
+            browser = await self.playwright.chromium.launch(headless=headless)
+        except BaseException:
+            self._release_slot()
+            raise
+        self._borrowed[browser] = headless
+        self.launched += 1
+        return browser, False
+
+    async def release(self, browser: Browser) -> None:
+        """ 歸還瀏覽器 """
+        headless = self._borrowed.pop(browser, None)
+        if headless is None:
+            return
+        try:
+            if browser.is_connected():
+                # 關閉借用者沒有關閉的 context，避免狀態殘留到下一次測試
+                await asyncio.gather(*[c.close() for c in browser.contexts], return_exceptions=True)
+                self._idle.append((browser, headless, time.monotonic()))
+                return
+            await self._close_browser(browser)
+        finally:
+            self._release_slot()
+
+    def report(self) -> dict:
+        """ 回傳瀏覽器的借用與重複使用次數 """
+        return {
+            "max_size": self.max_size,
+            "idle_browsers": len(self._idle),
+            "borrowed_browsers": len(self._borrowed),
+            "launched": self.launched,
+            "reused": self.reused,
+            "evicted": self.evicted,
+        }
+
+    async def close(self) -> None:
+        """ 關閉所有瀏覽器與 Playwright driver """
+        if self._evictor is not None:
+            self._evictor.cancel()
+            await asyncio.gather(self._evictor, return_exceptions=True)
+            self._evictor = None
+        browsers = [e[0] for e in self._idle] + list(self._borrowed)
+        self._idle, self._borrowed = [], {}
+        self._slots, self._in_use = asyncio.Semaphore(self.max_size), 0
+        await asyncio.gather(*[b.close() for b in browsers], return_exceptions=True)
+        if self._driver is not None:
+            await self._driver.__aexit__(None, None, None)
+            self._driver = self.playwright = None
+
+    async def _evict_idle(self) -> None:
+        """ 定期關閉閒置過久或已斷線的瀏覽器 """
+        interval = max(1.0, self.idle_timeout / 4)
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            expired = [e for e in self._idle if now - e[2] > self.idle_timeout or not e[0].is_connected()]
+            for entry in expired:
+                self._idle.remove(entry)
+                self.evicted += 1
+                await self._close_browser(entry[0])
+
+    def _release_slot(self) -> None:
+        self._in_use -= 1
+        self._slots.release()
+
+    async def _close_browser(self, browser: Browser) -> None:
+        try:
+            await browser.close()
+        except Exception as e:
+            self.logger.debug(f"關閉瀏覽器失敗：{e}")
@@ -0,0 +1,239 @@
+"""
+容量搜尋：自動找出在 SLA 目標內可以承受的最大併發數。
+
+以短時間的探測（probe）測試不同的併發數：先以倍數成長找到第一個不符合目標的併發數，
+再以二分搜尋縮小「最後一個符合」與「第一個不符合」之間的範圍，直到差距不超過 tolerance。
+每次探測都是一次一般的 BaseTestRunner 測試，以 SlaMonitor 判定是否符合目標（已有統計定論時提前結束探測）；
+所有探測共用同一個常駐瀏覽器池與 Playwright driver，瀏覽器不會在探測之間重新啟動。
+"""
+from modules.base_runner import DEFAULT_KNEE_THRESHOLDS, BaseTestRunner
+from modules.base_test_async import TestResult
+from modules.browser_pool import WarmBrowserPool
+from modules.runner_loader import get_runner_class
+from modules.sla import parse_objective
+from utils.config_loader import load_config
+from typing import Any, Callable, Dict
+import logging
+import math
+import time
+import uuid
+import numpy as np
+
+
+class CapacitySearch:
+    """
+    配置範例（capacity_search 欄位）：
+    "capacity_search": {
+        "start": 1,
+        "max": 256,
+        "growth": 2,
+        "tolerance": 1,
+        "probe_duration": 60,
+        "objectives": ["p95_first_token_time < 3", "failed_rate < 1"],
+        "warm_browsers": 4
+    }
+    - objectives 未設定時沿用 sla 的目標，兩者都未設定時使用 knee_thresholds（預設 p95 第一個 token 延遲 < 5 秒、錯誤率 < 5 %）
+    - 判定的 confidence、indifference、min_transactions 沿用 sla 的設定，也可以寫在 capacity_search 中覆寫
+    - tolerance 為搜尋結束時「符合」與「不符合」併發數的最大差距（使用者數）
+    """
+    def __init__(self,
+                 service_name: str,
+                 log_level: int = logging.INFO,
+                 config: Dict[str, Any] = None,
+                 runner_class: type[BaseTestRunner] = None) -> None:
+        """ 初始化 CapacitySearch
+
+        參數:
+            - service_name (str): 服務名稱
+            - log_level (int, optional): 日誌級別
+            - config (dict, optional): 直接指定配置內容，預設為 None，即讀取 configs/ 下的配置文件
+            - runner_class (type, optional): 探測使用的執行器，預設依服務名稱載入（get_runner_class）
+        """
+        self.service_name = service_name
+        self.log_level = log_level
+        self.runner_class = runner_class or get_runner_class(service_name)
+        self.config = config if config is not None else load_config(service_name)
+        self.settings = dict(self.config.get("capacity_search", {}))
+        self.search_id = uuid.uuid4().hex[:8]
+        self.objectives = self._objectives()
+        self.confidence = self.settings.get("confidence", self._sla_settings().get("confidence", 0.95))
+        self.warm_pool: WarmBrowserPool = None
+        self.probes: list[Dict[str, Any]] = []
+        self.logger = logging.getLogger(__name__)
+        # 每次探測完成時會以探測結果呼叫這些 listener（例如 capacity.py 即時顯示進度）
+        self.probe_listeners: list[Callable[[Dict[str, Any]], None]] = []
+
+    def _sla_settings(self) -> Dict[str, Any]:
+        sla = self.config.get("sla") or {}
+        return {"objectives": sla} if isinstance(sla, list) else dict(sla)
+
+    def _objectives(self) -> list:
+        if self.settings.get("objectives"):
+            return list(self.settings["objectives"])
+        if self._sla_settings().get("objectives"):
+            return list(self._sla_settings()["objectives"])
+        # 未設定 objectives 與 sla 時，以 knee_thresholds（與分階段負載的飽和點相同）作為目標
+        thresholds = dict(DEFAULT_KNEE_THRESHOLDS, **self.config.get("knee_thresholds", {}))
+        return [f"{metric} < {limit}" for metric, limit in thresholds.items()]
+
+    def _probe_config(self, concurrency: int) -> Dict[str, Any]:
+        """ 探測的配置：固定併發數的封閉式負載，並以 SLA 判定（已有定論時提前結束） """
+        sla = self._sla_settings()
+        sla.update({key: self.settings[key] for key in ("confidence", "indifference", "min_transactions") if key in self.settings})
+        sla.update(objectives=self.objectives, early_stop=self.settings.get("early_stop", True))
+        config = dict(self.config,
+                      concurrency=concurrency,
+                      test_duration=self.settings.get("probe_duration", 60),
+                      sla=sla,
+                      run_id=f"{self.search_id}-c{concurrency}")
+        for key in ("load_profile", "load_model", "arrival_rate", "capacity_search"):
+            config.pop(key, None)
+        return config
+
+    async def probe(self, concurrency: int) -> Dict[str, Any]:
+        """ 以指定的併發數執行一次探測，回傳量測值與 SLA 判定 """
+        runner = self.runner_class(self.service_name, log_level=self.log_level, config=self._probe_config(concurrency))
+        runner.warm_pool = self.warm_pool
+        # 只保留計算曲線需要的欄位
+        samples: list[tuple[bool, float, int, float]] = []
+
+        def collect(result: TestResult) -> None:
+            samples.append((result.is_successful, result.first_token_latency, result.token_count, result.generation_time))
+
+        runner.result_listeners.append(collect)
+        start_time = time.time()
+        await runner.execute_load_test()
+        duration = time.time() - start_time
+        verdict = runner.sla_verdict
+
+        successful = [s for s in samples if s[0]]
+        ttft = np.array([s[1] for s in successful if s[1] > 0])
+        generation_time = sum(s[3] for s in successful)
+        probe = {
+            "concurrency": concurrency,
+            "passed": verdict["verdict"] == "pass",
+            "settled": all(o["settled"] for o in verdict["objectives"]),
+            "early_stopped": verdict["early_stopped"],
+            "transactions": len(samples),
+            "duration": duration,
+            "throughput": len(successful) / duration if duration > 0 else 0.0,
+            "failed_rate": (len(samples) - len(successful)) / len(samples) * 100 if samples else None,
+            "p50_first_token_time": float(np.percentile(ttft, 50)) if ttft.size else None,
+            "p95_first_token_time": float(np.percentile(ttft, 95)) if ttft.size else None,
+            "tokens_per_second": sum(s[2] for s in successful) / generation_time if generation_time > 0 else None,
+            "objectives": verdict["objectives"],
+        }
+        self.probes.append(probe)
+        self.logger.info(format_probe(probe))
+        for listener in self.probe_listeners:
+            listener(probe)
+        return probe
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        執行容量搜尋。
+
+        回傳：
+        - dict: capacity（符合目標的最大併發數，0 表示最小的併發數也不符合）、
+          first_failure（第一個不符合的併發數，搜尋到 max 都符合時為 None）、
+          confident_lower / confident_upper（有統計定論的最大符合 / 最小不符合併發數）、curve（依併發數排序的探測結果）
+        """
+        start = max(1, int(self.settings.get("start", 1)))
+        maximum = max(start, int(self.settings.get("max", 256)))
+        growth = max(1.1, float(self.settings.get("growth", 2)))
+        tolerance = max(1, int(self.settings.get("tolerance", 1)))
+        use_browser = self.config.get("driver", "browser") != "http"
+        if use_browser:
+            self.warm_pool = WarmBrowserPool(max_size=self.settings.get("warm_browsers", 4), logger=self.logger)
+        try:
+            if use_browser:
+                await self.warm_pool.start()
+                await self.warm_pool.prewarm(min(self.warm_pool.max_size, start), headless=self.config.get("headless", False))
+            passed, failed = 0, None
+            # 倍數成長：找出第一個不符合目標的併發數
+            concurrency = start
+            while True:
+                if (await self.probe(concurrency))["passed"]:
+                    passed = concurrency
+                    if concurrency >= maximum:
+                        break
+                    concurrency = min(maximum, max(concurrency + 1, math.ceil(concurrency * growth)))
+                else:
+                    failed = concurrency
+                    break
+            # 二分搜尋：縮小最後一個符合與第一個不符合之間的範圍
+            while failed is not None and failed - passed > tolerance:
+                concurrency = (passed + failed) // 2
+                if concurrency <= passed:
+                    break
+                if (await self.probe(concurrency))["passed"]:
+                    passed = concurrency
+                else:
+                    failed = concurrency
+        finally:
+            if self.warm_pool is not None:
+                await self.warm_pool.close()
+
+        curve = sorted(self.probes, key=lambda p: p["concurrency"])
+        settled_pass = [p["concurrency"] for p in curve if p["passed"] and p["settled"] and p["concurrency"] <= passed]
+        settled_fail = [p["concurrency"] for p in curve if not p["passed"] and p["settled"] and p["concurrency"] > passed]
+        return {
+            "service": self.service_name,
+            "objectives": [str(parse_objective(o)) for o in self.objectives],
+            "confidence": self.confidence,
+            "capacity": passed,
+            "first_failure": failed,
+            "confident_lower": max(settled_pass) if settled_pass else None,
+            "confident_upper": min(settled_fail) if settled_fail else None,
+            "reached_max": failed is None,
+            "probes": len(self.probes),
+            "curve": curve,
+        }
+
+
+def format_probe(probe: Dict[str, Any]) -> str:
+    """ 將單次探測的結果格式化為一行進度文字 """
+    return (f"併發數 {probe['concurrency']}：{'符合' if probe['passed'] else '不符合'}目標"
+            f"（{'已判定' if probe['settled'] else '未達統計定論'}，{probe['transactions']} 筆交易，{probe['duration']:.1f} 秒）")
+
+
+def format_capacity_report(result: Dict[str, Any]) -> str:
+    """ 將容量搜尋結果格式化為報告文字 """
+    columns = [
+        ("concurrency", "使用者數", "{:d}"),
+        ("transactions", "交易數", "{:d}"),
+        ("duration", "秒", "{:.1f}"),
+        ("throughput", "成功次/秒", "{:.2f}"),
+        ("failed_rate", "錯誤率 %", "{:.2f}"),
+        ("p50_first_token_time", "p50 TTFT", "{:.3f}"),
+        ("p95_first_token_time", "p95 TTFT", "{:.3f}"),
+        ("tokens_per_second", "token/秒", "{:.1f}"),
+    ]
+    rows = [[label for _, label, _ in columns] + ["判定"]]
+    for probe in result["curve"]:
+        verdict = ("符合" if probe["passed"] else "不符合") + ("" if probe["settled"] else "（未定論）")
+        rows.append([fmt.format(probe[key]) if probe[key] is not None else "-" for key, _, fmt in columns] + [verdict])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    lines = ["=========== 容量搜尋 ===========",
+             f"目標：{'，'.join(result['objectives'])}"]
+    lines += ["  ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in rows]
+    if result["reached_max"]:
+        lines.append(f"最大併發數：{result['capacity']}（搜尋上限內皆符合目標）")
+    elif result["capacity"] == 0:
+        lines.append(f"最大併發數：0（併發數 {result['first_failure']} 即不符合目標）")
+    else:
+        lines.append(f"最大併發數：{result['capacity']}（{result['first_failure']} 不符合目標）")
+    confidence = f"{result['confidence']:.0%}"
+    lower = result["confident_lower"] if result["confident_lower"] is not None else "-"
+    upper = result["confident_upper"] if result["confident_upper"] is not None else "-"
+    lines.append(f"{confidence} 信賴下有定論的範圍：至少 {lower}，低於 {upper}")
+    # 邊界上的兩次探測：各目標的觀察值與信賴區間
+    for concurrency in (result["capacity"], result["first_failure"]):
+        probe = next((p for p in result["curve"] if p["concurrency"] == concurrency), None)
+        if probe is None:
+            continue
+        for objective in probe["objectives"]:
+            observed = f"{objective['observed']:.3f}" if objective["observed"] is not None else "-"
+            interval = f" [{objective['interval'][0]:.3f}, {objective['interval'][1]:.3f}]" if objective["interval"] else ""
+            lines.append(f"併發數 {concurrency}，{objective['objective']}：觀察值 {observed}{interval}")
+    return "\n".join(lines)
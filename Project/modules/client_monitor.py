@@ -0,0 +1,266 @@
+"""
+測試端（負載產生器）的自我監控：測試期間定期取樣本機的 CPU 與記憶體、每個瀏覽器行程的 CPU 與 RSS、
+asyncio event loop 的延遲與待執行的 task 數，用來分辨「服務變慢」還是「測試機本身已經飽和」。
+
+- 安裝 psutil 時可取得每個瀏覽器行程（含其子行程）的用量；否則在 Linux 上改讀 /proc，只有整機與本行程的數據
+- 超過門檻的取樣比例高於 violation_ratio 時，報告會顯示警告（invalidate 為 true 時將測試標記為無效）
+- 依測得的用量推估每台主機可安全驅動的使用者數
+"""
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict
+import asyncio
+import os
+import re
+import time
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 瀏覽器主行程的名稱（Chromium / Chrome / headless shell）
+_BROWSER_NAME = re.compile(r"chrom|headless_shell", re.IGNORECASE)
+
+
+@dataclass
+class ClientSample:
+    timestamp: float                            # 取樣時間（time.time()，秒）
+    loop_lag: float                             # event loop 的延遲（秒）：預計喚醒時間與實際喚醒時間的差
+    pending_tasks: int                          # 尚未完成的 asyncio task 數
+    active_users: int = 0                       # 取樣時活躍的虛擬使用者數
+    host_cpu_percent: float | None = None       # 整機 CPU 使用率（%，所有核心平均）
+    host_memory_percent: float | None = None    # 整機記憶體使用率（%）
+    process_cpu_percent: float | None = None    # 執行 event loop 的 Python 行程 CPU 使用率（%，100 表示佔滿一個核心）
+    process_rss: int | None = None              # Python 行程的 RSS（bytes）
+    browsers: list[Dict[str, Any]] = field(default_factory=list)  # 每個瀏覽器的 pid、cpu_percent、rss、processes（需要 psutil）
+
+
+class ClientMonitor:
+    """
+    配置範例（client_monitor 欄位，設定為 false 時停用）：
+    "client_monitor": {
+        "interval": 1.0,
+        "max_cpu_percent": 85,
+        "max_memory_percent": 90,
+        "max_process_cpu_percent": 90,
+        "max_loop_lag": 0.2,
+        "violation_ratio": 0.1,
+        "invalidate": false
+    }
+    """
+    def __init__(self,
+                 interval: float = 1.0,
+                 max_cpu_percent: float = 85,
+                 max_memory_percent: float = 90,
+                 max_process_cpu_percent: float = 90,
+                 max_loop_lag: float = 0.2,
+                 violation_ratio: float = 0.1,
+                 invalidate: bool = False) -> None:
+        """ 初始化 ClientMonitor
+
+        參數:
+            - interval (float, optional): 取樣間隔（秒），預設為 1 秒
+            - max_cpu_percent (float, optional): 整機 CPU 使用率上限（%）
+            - max_memory_percent (float, optional): 整機記憶體使用率上限（%）
+            - max_process_cpu_percent (float, optional): Python 行程的 CPU 使用率上限（%，event loop 只能使用一個核心）
+            - max_loop_lag (float, optional): event loop 延遲上限（秒），超過時計時本身已不準確
+            - violation_ratio (float, optional): 超過上限的取樣比例高於此值時視為超出測試端的能力
+            - invalidate (bool, optional): 超出時是否將測試標記為無效（預設只顯示警告）
+        """
+        self.interval = interval
+        self.limits = {
+            "host_cpu_percent": max_cpu_percent,
+            "host_memory_percent": max_memory_percent,
+            "process_cpu_percent": max_process_cpu_percent,
+            "loop_lag": max_loop_lag,
+        }
+        self.violation_ratio = violation_ratio
+        self.invalidate = invalidate
+        self.samples: list[ClientSample] = []
+        # 回傳目前活躍的虛擬使用者數（由執行器設定）
+        self.active_users: Callable[[], int] = lambda: 0
+        # 每次取樣時會以 ClientSample 呼叫這些 listener（例如寫入結果資料庫）
+        self.sample_listeners: list[Callable[[ClientSample], None]] = []
+        # 沿用同一個 Process 物件，cpu_percent 才會以上次取樣為基準（新物件第一次呼叫一律回傳 0）
+        self._process = psutil.Process() if psutil is not None else None
+        self._processes: Dict[int, Any] = {}
+        self._last_cpu: tuple[float, float] = None
+        self._last_host_cpu: tuple[int, int] = None
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "ClientMonitor | None":
+        """ 依配置的 client_monitor 欄位建立 ClientMonitor（預設啟用），設定為 false 時回傳 None """
+        settings = config.get("client_monitor", {})
+        if settings is False:
+            return None
+        return cls(**(settings if isinstance(settings, dict) else {}))
+
+    async def run(self) -> None:
+        """ 每 interval 秒取樣一次，直到被取消 """
+        loop = asyncio.get_running_loop()
+        # 第一次呼叫只建立 CPU 使用率的基準
+        await asyncio.to_thread(self._collect)
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            pending, users = len(asyncio.all_tasks()), self.active_users()
+            sample = ClientSample(timestamp=time.time(), loop_lag=lag, pending_tasks=pending, active_users=users,
+                                  **await asyncio.to_thread(self._collect))
+            self.samples.append(sample)
+            for listener in self.sample_listeners:
+                listener(sample)
+
+    def _collect(self) -> Dict[str, Any]:
+        """ 取得整機、本行程與瀏覽器行程的用量（在背景執行緒執行，不阻塞 event loop） """
+        if self._process is not None:
+            process = self._process
+            return {
+                "host_cpu_percent": psutil.cpu_percent(None),
+                "host_memory_percent": psutil.virtual_memory().percent,
+                "process_cpu_percent": process.cpu_percent(None),
+                "process_rss": process.memory_info().rss,
+                "browsers": self._browser_usage(process),
+            }
+        now, cpu = time.monotonic(), time.process_time()
+        process_cpu = None
+        if self._last_cpu is not None and now > self._last_cpu[0]:
+            process_cpu = (cpu - self._last_cpu[1]) / (now - self._last_cpu[0]) * 100
+        self._last_cpu = (now, cpu)
+        return {
+            "host_cpu_percent": self._proc_host_cpu(),
+            "host_memory_percent": self._proc_memory(),
+            "process_cpu_percent": process_cpu,
+            "process_rss": self._proc_rss(),
+        }
+
+    def _browser_usage(self, process) -> list[Dict[str, Any]]:
+        """ 依瀏覽器主行程分組加總 CPU 與 RSS（子行程如 renderer、GPU 行程歸到所屬的瀏覽器） """
+        browsers: Dict[int, Dict[str, Any]] = {}
+        seen = set()
+        for child in process.children(recursive=True):
+            try:
+                pid = child.pid
+                seen.add(pid)
+                # 沿用同一個 Process 物件，cpu_percent 才會以上次取樣為基準
+                tracked = self._processes.setdefault(pid, child)
+                root = None
+                for ancestor in [tracked] + tracked.parents():
+                    if ancestor.pid == process.pid:
+                        break
+                    if _BROWSER_NAME.search(ancestor.name()):
+                        root = ancestor.pid
+                if root is None:
+                    continue
+                usage = browsers.setdefault(root, {"pid": root, "cpu_percent": 0.0, "rss": 0, "processes": 0})
+                usage["cpu_percent"] += tracked.cpu_percent(None)
+                usage["rss"] += tracked.memory_info().rss
+                usage["processes"] += 1
+            except psutil.Error:
+                continue
+        for pid in set(self._processes) - seen:
+            del self._processes[pid]
+        return list(browsers.values())
+
+    def _proc_host_cpu(self) -> float | None:
+        """ 沒有 psutil 時由 /proc/stat 計算兩次取樣之間的整機 CPU 使用率 """
+        try:
+            with open("/proc/stat") as f:
+                values = [int(v) for v in f.readline().split()[1:]]
+        except (OSError, ValueError):
+            return None
+        idle, total = values[3] + (values[4] if len(values) > 4 else 0), sum(values)
+        previous, self._last_host_cpu = self._last_host_cpu, (idle, total)
+        if previous is None or total == previous[1]:
+            return None
+        return (1 - (idle - previous[0]) / (total - previous[1])) * 100
+
+    @staticmethod
+    def _proc_memory() -> float | None:
+        try:
+            with open("/proc/meminfo") as f:
+                info = {line.split(":")[0]: int(line.split()[1]) for line in f}
+            return (1 - info["MemAvailable"] / info["MemTotal"]) * 100
+        except (OSError, KeyError, ValueError, IndexError):
+            return None
+
+    @staticmethod
+    def _proc_rss() -> int | None:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def report(self) -> Dict[str, Any] | None:
+        """
+        彙整取樣結果，並以測試期間的最大活躍使用者數推估每台主機的安全使用者數。
+
+        回傳：
+        - dict: 各項用量的 p95 與最大值、瀏覽器用量、超出的上限（exceeded）、valid、safe_max_users；沒有取樣時回傳 None
+        """
+        if not self.samples:
+            return None
+        summary: Dict[str, Any] = {"samples": len(self.samples), "interval": self.interval, "precise": psutil is not None}
+        exceeded = []
+        headroom = []
+        for name, limit in self.limits.items():
+            values = np.array([getattr(s, name) for s in self.samples if getattr(s, name) is not None], dtype=np.float64)
+            if not values.size:
+                summary[f"p95_{name}"] = summary[f"max_{name}"] = None
+                continue
+            p95 = float(np.percentile(values, 95))
+            summary[f"p95_{name}"], summary[f"max_{name}"] = p95, float(values.max())
+            ratio = float((values > limit).mean())
+            if ratio > self.violation_ratio:
+                exceeded.append({"metric": name, "limit": limit, "ratio": ratio})
+            # 用量大致與使用者數成正比（event loop 延遲不是，僅用來判斷是否超出）
+            if name != "loop_lag" and p95 > 0:
+                headroom.append(limit / p95)
+        users = max(s.active_users for s in self.samples)
+        summary["max_active_users"] = users
+        summary["max_pending_tasks"] = max(s.pending_tasks for s in self.samples)
+        summary["max_process_rss"] = max((s.process_rss or 0) for s in self.samples)
+        browser_samples = [b for s in self.samples for b in s.browsers]
+        summary["browsers"] = max((len(s.browsers) for s in self.samples), default=0)
+        summary["max_browser_cpu_percent"] = max((b["cpu_percent"] for b in browser_samples), default=None)
+        summary["max_browser_rss"] = max((b["rss"] for b in browser_samples), default=None)
+        summary["exceeded"] = exceeded
+        summary["valid"] = not (exceeded and self.invalidate)
+        summary["safe_max_users"] = int(users * min(headroom)) if headroom and users else None
+        return summary
+
+    def to_dicts(self) -> list[Dict[str, Any]]:
+        return [asdict(s) for s in self.samples]
+
+
+_LABELS = {
+    "host_cpu_percent": "整機 CPU",
+    "host_memory_percent": "整機記憶體",
+    "process_cpu_percent": "event loop 行程 CPU",
+    "loop_lag": "event loop 延遲",
+}
+
+
+def format_client_report(report: Dict[str, Any]) -> str:
+    """ 將測試端資源的彙整結果格式化為報告文字 """
+    lines = ["=========== 測試端資源 ==========="]
+    for name in ("host_cpu_percent", "host_memory_percent", "process_cpu_percent"):
+        if report[f"p95_{name}"] is not None:
+            lines.append(f"{_LABELS[name]}：p95 {report[f'p95_{name}']:.0f} %，最大 {report[f'max_{name}']:.0f} %")
+    lines.append(f"event loop 延遲：p95 {report['p95_loop_lag']*1000:.1f} 毫秒，最大 {report['max_loop_lag']*1000:.1f} 毫秒，"
+                 f"最多 {report['max_pending_tasks']} 個待執行的 task")
+    if report["max_browser_cpu_percent"] is not None:
+        lines.append(f"瀏覽器行程：{report['browsers']} 個，單一瀏覽器最高 CPU {report['max_browser_cpu_percent']:.0f} %，"
+                     f"最高 RSS {report['max_browser_rss']/2**20:.0f} MB")
+    elif not report["precise"]:
+        lines.append("注意：未安裝 psutil，無法取得各瀏覽器行程的用量")
+    for item in report["exceeded"]:
+        lines.append(f"警告：{_LABELS[item['metric']]} 有 {item['ratio']:.0%} 的取樣超過上限 {item['limit']:g}"
+                     f"{' 秒' if item['metric'] == 'loop_lag' else ' %'}，測試端可能已飽和，量測結果包含測試端的延遲")
+    if not report["valid"]:
+        lines.append("測試結果無效：量測期間超出測試端的能力")
+    if report["safe_max_users"] is not None:
+        lines.append(f"建議每台主機最多 {report['safe_max_users']} 個使用者（依本次最多 {report['max_active_users']} 個活躍使用者的用量推估）")
+    return "\n".join(lines)
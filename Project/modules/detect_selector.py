@@ -1,52 +1,239 @@
-from playwright.sync_api import sync_playwright
-
-def get_unique_selector(element):
-    """根據 Playwright ElementHandle 產生唯一的 CSS 選擇器"""
-    selectors = []
-    
-    while element:
-        tag = element.evaluate("el => el.tagName.toLowerCase()")
-        parent = element.query_selector("xpath=..")
-
-        if parent:
-            # 取得所有相同標籤的兄弟元素
-            siblings = parent.query_selector_all(f"{tag}")
-            siblings = list(siblings)  
-
-            # 轉換為 outerHTML，避免 JSHandle 比較失敗
-            element_html = element.evaluate("el => el.outerHTML")
-            siblings_html = [s.evaluate("el => el.outerHTML") for s in siblings]
-
-            if element_html in siblings_html:
-                index = siblings_html.index(element_html) + 1
-                # 只有當兄弟數量 > 1 才加 nth-of-type(n)
-                if len(siblings_html) > 1:
-                    selectors.insert(0, f"{tag}:nth-of-type({index})")
-                else:
-                    selectors.insert(0, tag)
-            else:
-                selectors.insert(0, tag)
-        
-        element = parent  # 繼續向上尋找父元素
-
-    return " > ".join(selectors)
-
-
-def detect_input_selector(url):
-    """自動偵測輸入框選擇器"""
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.goto(url)
-        page.wait_for_selector('textarea')
-        input_selector = None
-        possible_inputs = page.query_selector_all("textarea, input[type='text'], [contenteditable='true']")
-        for input_el in possible_inputs:
-            if input_el.is_visible():
-                input_selector = get_unique_selector(input_el)
-        if not input_selector:
-            raise Exception("No visible input element found")
-        page.close()
-        browser.close()
-        return input_selector
-        
\ No newline at end of file
+"""
+自動偵測輸入框與回應區域的選擇器。
+
+每個步驟都在頁面內以一次 evaluate 完成（不需要逐層向上查詢 DOM 的往返）：
+1. 找出所有可見的輸入元素，依「像不像聊天輸入框」評分並計算唯一的選擇器
+2. 在分數最高的輸入框送出一個探測 prompt，以 MutationObserver 等待頁面停止變化
+3. 比較送出前後每個元素的文字長度，找出因回應而成長的元素，產生「第一個符合即為最新回應」的選擇器並評分
+"""
+from playwright.async_api import Page, TimeoutError as PlaywrightTimeoutError
+from modules.browser_pool import WarmBrowserPool
+from dataclasses import dataclass, field
+import time
+
+DEFAULT_PROBE_PROMPT = "Hello! Please introduce yourself in one sentence."
+INPUT_CANDIDATES = "textarea, input:not([type]), input[type='text'], input[type='search'], [contenteditable='true'], [contenteditable=''], [role='textbox']"
+
+# 頁面內共用的函式：計算元素的唯一選擇器（優先使用 id 與穩定的屬性，否則由下往上組合 nth-of-type 路徑）
+_UNIQUE_SELECTOR_JS = """
+const uniqueSelector = (el) => {
+    const isUnique = (s) => { try { const m = document.querySelectorAll(s); return m.length === 1 && m[0] === el; } catch (e) { return false; } };
+    const tag = el.tagName.toLowerCase();
+    if (el.id && isUnique('#' + CSS.escape(el.id))) return '#' + CSS.escape(el.id);
+    for (const attr of ['data-testid', 'name', 'placeholder', 'aria-label']) {
+        const value = el.getAttribute(attr);
+        if (value && isUnique(`${tag}[${attr}=${JSON.stringify(value)}]`)) return `${tag}[${attr}=${JSON.stringify(value)}]`;
+    }
+    const parts = [];
+    for (let node = el; node && node.nodeType === 1 && node !== document.documentElement; node = node.parentElement) {
+        if (node !== el && node.id && document.querySelectorAll('#' + CSS.escape(node.id)).length === 1) {
+            parts.unshift('#' + CSS.escape(node.id));
+            break;
+        }
+        let part = node.tagName.toLowerCase();
+        const parent = node.parentElement;
+        if (parent) {
+            const same = [...parent.children].filter(c => c.tagName === node.tagName);
+            if (same.length > 1) part += `:nth-of-type(${same.indexOf(node) + 1})`;
+        }
+        parts.unshift(part);
+        if (isUnique(parts.join(' > '))) break;
+    }
+    return parts.join(' > ');
+};
+"""
+
+# 找出可見的輸入元素並評分（分數由高到低）
+_FIND_INPUTS_JS = "(candidates) => {" + _UNIQUE_SELECTOR_JS + """
+    const hint = /message|prompt|chat|ask|question|send|talk|輸入|訊息|問|傳送|聊天/i;
+    const results = [];
+    for (const el of document.querySelectorAll(candidates)) {
+        const rect = el.getBoundingClientRect();
+        const style = getComputedStyle(el);
+        if (!rect.width || !rect.height || style.visibility === 'hidden' || style.display === 'none' || el.disabled || el.readOnly) continue;
+        // 巢狀的輸入元素只保留最內層（例如 role=textbox 內的 textarea）
+        if (el.querySelector(candidates)) continue;
+        const reasons = [];
+        let score = 0;
+        const tag = el.tagName.toLowerCase();
+        if (tag === 'textarea') { score += 3; reasons.push('textarea'); }
+        else if (el.isContentEditable || el.getAttribute('role') === 'textbox') { score += 2.5; reasons.push('contenteditable'); }
+        else { score += 1; reasons.push('input'); }
+        const label = ['placeholder', 'aria-label', 'name', 'id', 'data-testid'].map(a => el.getAttribute(a) || '').join(' ');
+        if (hint.test(label)) { score += 2; reasons.push('聊天相關的標籤'); }
+        if (el.getAttribute('type') === 'search') { score -= 1; reasons.push('搜尋欄'); }
+        if (rect.top > window.innerHeight / 2) { score += 1; reasons.push('位於畫面下半部'); }
+        if (rect.width >= window.innerWidth * 0.4) { score += 1; reasons.push('寬度足夠'); }
+        if (document.activeElement === el) { score += 0.5; reasons.push('已取得焦點'); }
+        results.push({selector: uniqueSelector(el), score: score, reason: reasons.join('、')});
+    }
+    return results.sort((a, b) => b.score - a.score);
+}"""
+
+# 送出探測 prompt 前：記錄每個元素的文字長度，並以 MutationObserver 記錄最後一次變化的時間（忽略輸入框本身）
+# 只有不含 prompt 的文字變化才算是回應（使用者訊息的顯示不算）
+_WATCH_JS = """({selector, prompt}) => {
+    const input = document.querySelector(selector);
+    const before = new WeakMap();
+    for (const el of document.body.querySelectorAll('*')) before.set(el, (el.textContent || '').length);
+    const state = {input: input, before: before, responses: 0, last: performance.now()};
+    const isResponse = (r, target) => r.type === 'childList'
+        ? [...r.addedNodes].some(n => (n.textContent || '').trim() && !n.textContent.includes(prompt))
+        : !(target.textContent || '').includes(prompt);
+    state.observer = new MutationObserver((records) => {
+        for (const r of records) {
+            const target = r.target.nodeType === 1 ? r.target : r.target.parentElement;
+            if (!target || (input && (input === target || input.contains(target)))) continue;
+            state.last = performance.now();
+            if (isResponse(r, target)) state.responses += 1;
+        }
+    });
+    state.observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+    window.__selectorDetect = state;
+}"""
+
+# 已出現回應，且頁面連續 stableMs 毫秒沒有新的變化
+_SETTLED_JS = """(stableMs) => {
+    const state = window.__selectorDetect;
+    return state.responses > 0 && performance.now() - state.last > stableMs;
+}"""
+
+# 找出因回應而成長的元素，產生「第一個符合的元素就是這個回應」的選擇器並評分（分數由高到低）
+_RANK_RESPONSES_JS = "(prompt) => {" + _UNIQUE_SELECTOR_JS + """
+    const state = window.__selectorDetect;
+    state.observer.disconnect();
+    const input = state.input;
+    const grown = [];
+    for (const el of document.body.querySelectorAll('*')) {
+        if (['SCRIPT', 'STYLE', 'NOSCRIPT'].includes(el.tagName)) continue;
+        if (input && (el === input || el.contains(input) || input.contains(el))) continue;
+        const text = el.textContent || '';
+        const growth = text.length - (state.before.get(el) || 0);
+        // 包含 prompt 的元素是使用者訊息或整個對話紀錄，不是回應本身
+        if (growth > 0 && !text.includes(prompt)) grown.push({el: el, growth: growth, added: !state.before.has(el)});
+    }
+    if (!grown.length) return [];
+    const maxGrowth = Math.max(...grown.map(g => g.growth));
+    const stableClass = (c) => /^[A-Za-z_-][\\w-]*$/.test(c) && !/\\d{3,}|^(css|sc|jsx|svelte)-/.test(c);
+    const xpathLiteral = (v) => v.includes("'") ? `"${v}"` : `'${v}'`;
+    // 以類別或 data-* 屬性產生一般化的選擇器（CSS 與對應的 XPath）
+    const generalSelectors = (el) => {
+        const tag = el.tagName.toLowerCase();
+        const classes = [...el.classList].filter(stableClass);
+        const options = [];
+        if (classes.length) {
+            options.push({css: tag + classes.map(c => '.' + CSS.escape(c)).join(''),
+                          xpath: `//${tag}` + classes.map(c => `[contains(concat(' ', normalize-space(@class), ' '), ' ${c} ')]`).join('')});
+            for (const c of classes) options.push({css: '.' + CSS.escape(c), xpath: `//*[contains(concat(' ', normalize-space(@class), ' '), ' ${c} ')]`});
+        }
+        for (const attr of el.getAttributeNames()) {
+            const value = el.getAttribute(attr);
+            if ((attr.startsWith('data-') || attr === 'role') && attr !== 'data-counted' && value && value.length < 40 && !/\\d{3,}/.test(value)) {
+                options.push({css: `${tag}[${attr}=${JSON.stringify(value)}]`, xpath: `//${tag}[@${attr}=${xpathLiteral(value)}]`});
+            }
+        }
+        return options;
+    };
+    const results = [];
+    const seen = new Set();
+    const add = (selector, score, reason) => {
+        if (seen.has(selector)) return;
+        seen.add(selector);
+        results.push({selector: selector, score: score, reason: reason});
+    };
+    for (const g of grown) {
+        if (g.growth < maxGrowth * 0.5) continue;
+        const el = g.el;
+        // 新加入的元素中最外層的一個通常就是整則回應
+        const newRoot = g.added && (!el.parentElement || state.before.has(el.parentElement));
+        let base = g.growth / maxGrowth * 2;
+        const reasons = [`文字增加 ${g.growth} 字`];
+        if (newRoot) { base += 2; reasons.push('新加入的訊息元素'); }
+        for (const option of generalSelectors(el)) {
+            const matches = document.querySelectorAll(option.css);
+            if (matches[0] === el) {
+                add(option.css, base + 1.5 - (matches.length === 1 ? 0.5 : 0), reasons.concat('第一個符合的元素（最新在上）').join('、'));
+            } else if (matches[matches.length - 1] === el) {
+                add(`(${option.xpath})[last()]`, base + 1.5, reasons.concat('最後一個符合的元素（最新在下）').join('、'));
+            }
+        }
+        add(uniqueSelector(el), base - 1, reasons.concat('只符合這一則回應').join('、'));
+    }
+    return results.sort((a, b) => b.score - a.score).slice(0, 10);
+}"""
+
+
+@dataclass
+class SelectorCandidate:
+    selector: str           # CSS 選擇器，或以 "(//" 開頭的 XPath
+    score: float            # 分數越高越可能是正確的元素
+    reason: str             # 評分依據
+
+
+@dataclass
+class DetectionResult:
+    input_selector: str | None          # 分數最高的輸入框選擇器
+    response_selector: str | None       # 分數最高的回應選擇器（未偵測或沒有回應時為 None）
+    input_candidates: list[SelectorCandidate] = field(default_factory=list)
+    response_candidates: list[SelectorCandidate] = field(default_factory=list)
+    elapsed: float = 0.0                # 偵測耗時（秒）
+
+
+async def get_unique_selector_async(element) -> str:
+    """ 在頁面內以一次 evaluate 計算 ElementHandle 的唯一 CSS 選擇器 """
+    return await element.evaluate("(el) => {" + _UNIQUE_SELECTOR_JS + " return uniqueSelector(el); }")
+
+
+async def detect_selectors(page: Page,
+                           probe_prompt: str = DEFAULT_PROBE_PROMPT,
+                           detect_response: bool = True,
+                           timeout: float = 30,
+                           stable_window: float = 2) -> DetectionResult:
+    """
+    在已開啟的頁面上偵測輸入框與回應選擇器。
+
+    參數:
+        - page (Page): 已導向 AI 服務的頁面
+        - probe_prompt (str, optional): 偵測回應選擇器時送出的 prompt
+        - detect_response (bool, optional): 是否送出探測 prompt 偵測回應選擇器，預設為 True
+        - timeout (float, optional): 等待輸入框與回應的時間上限（秒）
+        - stable_window (float, optional): 頁面連續多少秒沒有變化視為回應完成
+    """
+    start_time = time.time()
+    await page.wait_for_selector(INPUT_CANDIDATES, state="visible", timeout=timeout * 1000)
+    inputs = [SelectorCandidate(**c) for c in await page.evaluate(_FIND_INPUTS_JS, INPUT_CANDIDATES)]
+    if not inputs:
+        raise Exception("No visible input element found")
+    responses = []
+    if detect_response:
+        input_selector = inputs[0].selector
+        await page.fill(input_selector, probe_prompt)
+        await page.evaluate(_WATCH_JS, {"selector": input_selector, "prompt": probe_prompt})
+        await page.press(input_selector, "Enter")
+        try:
+            await page.wait_for_function(_SETTLED_JS, arg=stable_window * 1000, polling=200, timeout=timeout * 1000)
+        except PlaywrightTimeoutError:
+            # 頁面持續變化（例如動畫）時，以目前的狀態評分
+            pass
+        responses = [SelectorCandidate(**c) for c in await page.evaluate(_RANK_RESPONSES_JS, probe_prompt)]
+    return DetectionResult(
+        input_selector=inputs[0].selector,
+        response_selector=responses[0].selector if responses else None,
+        input_candidates=inputs,
+        response_candidates=responses,
+        elapsed=time.time() - start_time)
+
+
+async def detect_selectors_async(url: str, browser_pool: WarmBrowserPool, **kwargs) -> DetectionResult:
+    """ 借用常駐瀏覽器池的瀏覽器開啟 url 並偵測選擇器（其他參數見 detect_selectors） """
+    browser, _ = await browser_pool.acquire(headless=True)
+    try:
+        context = await browser.new_context()
+        try:
+            page = await context.new_page()
+            await page.goto(url)
+            return await detect_selectors(page, **kwargs)
+        finally:
+            await context.close()
+    finally:
+        await browser_pool.release(browser)
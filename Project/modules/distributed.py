@@ -0,0 +1,243 @@
+"""
+分散式負載測試：coordinator 將 concurrency 拆成多個分片，交給多個 worker 執行。
+
+- 本機模式：每個分片在獨立的 Python 行程中執行（各自擁有自己的 event loop 與 Playwright）
+- 遠端模式：每個分片送到其他主機上的 worker 伺服器（python worker.py --port 8765）
+
+worker 在每個工作階段結束時，以 JSON lines 串流回傳序列化的 ResponseMetrics，
+coordinator 合併後產生單一報告。
+
+HTTP 協定：
+    POST /run  body: {"runner": "<runner 名稱>", "config": {<分片配置>}}
+    回應為逐行的 JSON：
+        {"type": "metrics", "metrics": {...}}   每個工作階段的結果
+        {"type": "done", "report": "..."}        分片完成，附上分片報告
+        {"type": "error", "message": "..."}      分片失敗
+"""
+from modules.base_test_async import ResponseMetrics
+from modules.base_runner import BaseTestRunner
+from modules.results_store import ResultsStore
+from modules.runner_loader import get_runner_class
+from utils.config_loader import load_config
+from utils.streaming_stats import StreamingStats
+from dataclasses import asdict, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict
+import asyncio
+import json
+import logging
+import multiprocessing
+import queue
+import time
+import uuid
+
+
+def split_concurrency(concurrency: int, shards: int) -> list[int]:
+    """ 將 concurrency 平均拆成 shards 份（不會產生 0 個使用者的分片） """
+    shards = max(1, min(shards, concurrency))
+    base, extra = divmod(concurrency, shards)
+    return [base + (1 if i < extra else 0) for i in range(shards)]
+
+
+def shard_configs(config: Dict[str, Any], shards: int) -> list[Dict[str, Any]]:
+    """ 依分片數量產生每個 worker 的配置，並以 browser_index_offset 讓瀏覽器編號不重複 """
+    configs = []
+    offset = config.get("browser_index_offset", 0)
+    for size in split_concurrency(config.get("concurrency", 1), shards):
+        shard = dict(config, concurrency=size, browser_index_offset=offset)
+        if shard.get("session_pool_size"):
+            shard["session_pool_size"] = max(1, round(config["session_pool_size"] * size / config.get("concurrency", 1)))
+        if shard.get("arrival_rate"):
+            shard["arrival_rate"] = config["arrival_rate"] * size / config.get("concurrency", 1)
+        # SLA 由 coordinator 以合併後的結果判定，分片只看到部分流量，不可自行提前結束
+        if isinstance(shard.get("sla"), dict):
+            shard["sla"] = dict(shard["sla"], early_stop=False)
+        elif shard.get("sla"):
+            shard["sla"] = {"objectives": shard["sla"], "early_stop": False}
+        configs.append(shard)
+        offset += size
+    return configs
+
+
+def serialize_metrics(metrics: ResponseMetrics) -> Dict[str, Any]:
+    summary = metrics.summary
+    data = asdict(replace(metrics, summary=None))
+    data["summary"] = summary.to_dict() if summary is not None else None
+    return data
+
+
+def deserialize_metrics(data: Dict[str, Any]) -> ResponseMetrics:
+    data = dict(data)
+    if data.get("summary") is not None:
+        data["summary"] = StreamingStats.from_dict(data["summary"])
+    return ResponseMetrics(**data)
+
+
+def run_shard(runner_name: str, config: Dict[str, Any], emit: Callable[[Dict[str, Any]], None], log_level: int = logging.INFO) -> None:
+    """ 在目前的行程中執行一個分片，並以 emit 回傳每個工作階段的結果 """
+    try:
+        runner_class = get_runner_class(runner_name)
+        runner = runner_class(config["name"], log_level=log_level, config=config)
+        runner.metrics_listeners.append(lambda m: emit({"type": "metrics", "metrics": serialize_metrics(m)}))
+        report = asyncio.run(runner.execute_load_test())
+        emit({"type": "done", "report": report})
+    except Exception as e:
+        emit({"type": "error", "message": f"{type(e).__name__}: {e}"})
+
+
+def _process_worker(runner_name: str, config: Dict[str, Any], output: multiprocessing.Queue, log_level: int) -> None:
+    run_shard(runner_name, config, output.put, log_level)
+
+
+class WorkerRequestHandler(BaseHTTPRequestHandler):
+    """ worker 伺服器：接收分片並以 JSON lines 串流回傳結果 """
+    protocol_version = "HTTP/1.0"
+    log_level = logging.INFO
+
+    def do_POST(self) -> None:
+        if self.path != "/run":
+            self.send_error(404)
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except json.JSONDecodeError:
+            self.send_error(400, "invalid json")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+
+        def emit(message: Dict[str, Any]) -> None:
+            self.wfile.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+        run_shard(body.get("runner", body["config"]["name"]), body["config"], emit, self.log_level)
+
+
+def serve_worker(host: str = "0.0.0.0", port: int = 8765, log_level: int = logging.INFO) -> None:
+    """ 啟動 worker 伺服器，每個請求在獨立的執行緒中以自己的 event loop 執行分片 """
+    WorkerRequestHandler.log_level = log_level
+    server = ThreadingHTTPServer((host, port), WorkerRequestHandler)
+    print(f"worker 已啟動：http://{host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+class Coordinator:
+    """
+    分散式測試的 coordinator：拆分 concurrency、收集各 worker 串流回傳的 ResponseMetrics，合併成一份報告。
+    """
+    def __init__(self,
+                 service_name: str,
+                 workers: int = None,
+                 hosts: list[str] = None,
+                 runner_name: str = None,
+                 log_level: int = logging.INFO,
+                 config: Dict[str, Any] = None) -> None:
+        """ 初始化 Coordinator
+
+        參數:
+            - service_name (str): 服務名稱
+            - workers (int, optional): 本機 worker 行程數量
+            - hosts (list[str], optional): 遠端 worker 位址，例如 ["10.0.0.2:8765", "10.0.0.3:8765"]，設定時忽略 workers
+            - runner_name (str, optional): 執行器名稱，預設為服務名稱
+            - log_level (int, optional): 日誌級別
+            - config (dict, optional): 直接指定配置內容，預設為 None，即讀取 configs/ 下的配置文件
+        """
+        self.service_name = service_name
+        self.config = config if config is not None else load_config(service_name)
+        self.hosts = hosts or []
+        self.workers = len(self.hosts) if self.hosts else max(1, workers or 1)
+        self.runner_name = runner_name or service_name
+        self.log_level = log_level
+        self.shard_reports: list[str] = []
+        # 設定 sla 時，合併後的 SLA 判定結果
+        self.sla_verdict: Dict[str, Any] = None
+
+    async def execute_load_test(self) -> str:
+        """ 執行分散式負載測試，回傳合併後的報告 """
+        # 所有分片使用相同的 run_id，逐筆交易會記錄在同一次測試下
+        run_id = self.config.get("run_id") or uuid.uuid4().hex
+        configs = shard_configs(dict(self.config, run_id=run_id), self.workers)
+        results: list[ResponseMetrics] = []
+
+        def collect(message: Dict[str, Any]) -> None:
+            if message["type"] == "metrics":
+                results.append(deserialize_metrics(message["metrics"]))
+            elif message["type"] == "done":
+                self.shard_reports.append(message["report"])
+            elif message["type"] == "error":
+                print(f"worker 執行失敗：{message['message']}")
+
+        start_time = time.time()
+        if self.hosts:
+            await asyncio.gather(*(self._stream_remote(host, config, collect) for host, config in zip(self.hosts, configs)))
+        else:
+            await asyncio.gather(*(self._stream_local(config, collect) for config in configs))
+        total_time = time.time() - start_time
+
+        # 以一般的 runner 產生合併後的報告
+        runner = BaseTestRunner(self.service_name, log_level=self.log_level, config=self.config)
+        try:
+            report = runner._log_test_results(results, total_time)
+            self.sla_verdict = runner.sla_verdict
+            report += f"\nworker 數量：{len(configs)}，各 worker 使用者數：{[c['concurrency'] for c in configs]}"
+            # 以合併後的報告取代分片報告（遠端 worker 的交易記錄在各自主機的資料庫中）
+            store = ResultsStore.from_config(self.config)
+            if store is not None:
+                store.start_run(run_id, self.service_name, self.config)
+                store.finish_run(run_id, report)
+                store.close()
+            return report
+        finally:
+            runner.logger.close()
+
+    async def _stream_local(self, config: Dict[str, Any], collect: Callable[[Dict[str, Any]], None]) -> None:
+        """ 在本機的獨立行程中執行分片 """
+        ctx = multiprocessing.get_context("spawn")
+        output = ctx.Queue()
+        process = ctx.Process(target=_process_worker, args=(self.runner_name, config, output, self.log_level))
+        process.start()
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    message = await loop.run_in_executor(None, output.get, True, 1.0)
+                except queue.Empty:
+                    if not process.is_alive():
+                        collect({"type": "error", "message": f"worker 行程意外結束（exit code {process.exitcode}）"})
+                        return
+                    continue
+                collect(message)
+                if message["type"] in ("done", "error"):
+                    return
+        finally:
+            await loop.run_in_executor(None, process.join, 10)
+
+    async def _stream_remote(self, host: str, config: Dict[str, Any], collect: Callable[[Dict[str, Any]], None]) -> None:
+        """ 將分片送到遠端 worker，並逐行讀取串流回傳的結果 """
+        address, _, port = host.rpartition(":")
+        body = json.dumps({"runner": self.runner_name, "config": config}, ensure_ascii=False).encode("utf-8")
+        reader, writer = await asyncio.open_connection(address, int(port))
+        try:
+            writer.write(
+                f"POST /run HTTP/1.0\r\nHost: {host}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("ascii") + body)
+            await writer.drain()
+            status_line = await reader.readline()
+            if b" 200 " not in status_line:
+                collect({"type": "error", "message": f"{host} 回應 {status_line.decode(errors='replace').strip()}"})
+                return
+            # 略過回應標頭
+            while (await reader.readline()).strip():
+                pass
+            while line := await reader.readline():
+                if line.strip():
+                    message = json.loads(line)
+                    collect(message)
+                    if message["type"] in ("done", "error"):
+                        return
+            collect({"type": "error", "message": f"{host} 在分片完成前中斷連線"})
+        finally:
+            writer.close()
@@ -0,0 +1,224 @@
+"""
+測試工具本身的效能基準：以 BaseTestRunner 在不同併發數下測試本機的模擬聊天服務，
+比較量測到的延遲與伺服器端的真實延遲，並記錄每個虛擬使用者耗用的 CPU 與記憶體，
+找出單台機器能驅動的最大使用者數。熱點路徑（擷取、計時、token 計算）的修改都應以此檢查是否退化。
+"""
+from modules.base_runner import BaseTestRunner
+from modules.base_test_async import TestResult
+from modules.mock_chat import MockChatService, MockSettings, create_mock_app
+from typing import Any, Dict
+from werkzeug.serving import make_server
+import asyncio
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class ResourceSampler:
+    """
+    記錄測試期間本行程（含瀏覽器等子行程）的 CPU 時間與記憶體。
+    安裝 psutil 時會統計整個行程樹；否則只能取得本行程與已結束子行程的 CPU 時間，以及本行程的最大 RSS。
+    """
+    def __init__(self, interval: float = 0.5) -> None:
+        self.interval = interval
+        self.peak_rss = 0
+        self._cpu_start = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread = None
+
+    def __enter__(self) -> "ResourceSampler":
+        self._cpu_start = self._cpu_seconds()
+        self._wall_start = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.cpu_seconds = self._cpu_seconds() - self._cpu_start
+        self.wall_seconds = time.perf_counter() - self._wall_start
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self._rss())
+
+    @staticmethod
+    def _processes() -> list:
+        process = psutil.Process()
+        return [process] + process.children(recursive=True)
+
+    def _cpu_seconds(self) -> float:
+        if psutil is not None:
+            total = 0.0
+            for p in self._processes():
+                try:
+                    times = p.cpu_times()
+                    total += times.user + times.system
+                except psutil.Error:
+                    pass
+            return total
+        if resource is not None:
+            usage = [resource.getrusage(who) for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+            return sum(u.ru_utime + u.ru_stime for u in usage)
+        return time.process_time()
+
+    def _rss(self) -> int:
+        """ 目前的記憶體用量（bytes） """
+        if psutil is not None:
+            total = 0
+            for p in self._processes():
+                try:
+                    total += p.memory_info().rss
+                except psutil.Error:
+                    pass
+            return total
+        if resource is not None:
+            # Linux 的 ru_maxrss 單位為 KB
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return 0
+
+
+def start_mock_server(settings: MockSettings, host: str = "127.0.0.1", port: int = 0):
+    """ 在背景執行緒啟動模擬聊天服務，回傳 (server, service, base_url) """
+    service = MockChatService(settings)
+    # 不輸出每個請求的存取日誌
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server(host, port, create_mock_app(service), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, service, f"http://{host}:{server.server_port}"
+
+
+def _percentile(values: list[float], q: float) -> float | None:
+    return float(np.percentile(values, q)) if values else None
+
+
+def _difference(a: float | None, b: float | None) -> float | None:
+    return a - b if a is not None and b is not None else None
+
+
+def run_level(base_url: str, service: MockChatService, concurrency: int, duration: float, config: Dict[str, Any] = None) -> Dict[str, Any]:
+    """ 以指定的併發數執行一次測試，回傳量測值、真實值與資源用量 """
+    service.reset()
+    run_config = {
+        "name": "mock_benchmark",
+        "url": base_url,
+        "api_url": f"{base_url}/api/chat",
+        "input_selector": "textarea[placeholder='Talk to Bot']",
+        "response_selector": ".bot-message",
+        "test_prompts": ["what is LLM?", "explain latency", "write a haiku"],
+        "headless": True,
+        "concurrency": concurrency,
+        "test_duration": duration,
+        "results_store": False,
+        **(config or {}),
+    }
+    runner = BaseTestRunner(run_config["name"], log_level=logging.ERROR, config=run_config)
+    results: list[TestResult] = []
+    runner.result_listeners.append(results.append)
+    with ResourceSampler() as sampler:
+        asyncio.run(runner.execute_load_test())
+
+    successful = [r for r in results if r.is_successful]
+    truth = service.stats()
+    measured_ttft = [r.first_token_latency for r in successful]
+    measured_total = [r.total_response_time for r in successful]
+    level = {
+        "concurrency": concurrency,
+        "transactions": len(results),
+        "error_rate": 1 - len(successful) / len(results) if results else None,
+        "true_error_rate": truth["errors"] / truth["requests"] if truth["requests"] else None,
+        "p50_ttft": _percentile(measured_ttft, 50),
+        "p95_ttft": _percentile(measured_ttft, 95),
+        "true_p50_ttft": truth["p50_ttft"],
+        "true_p95_ttft": truth["p95_ttft"],
+        "p50_total": _percentile(measured_total, 50),
+        "true_p50_total": truth["p50_total_time"],
+        "token_count_ms": float(np.mean([r.token_count_time for r in successful]) * 1000) if successful else None,
+        "cpu_percent": sampler.cpu_seconds / sampler.wall_seconds * 100 if sampler.wall_seconds else None,
+        "cpu_seconds_per_user": sampler.cpu_seconds / concurrency,
+        "peak_rss_mb_per_user": sampler.peak_rss / concurrency / 2**20 if sampler.peak_rss else None,
+    }
+    level["ttft_overhead"] = _difference(level["p50_ttft"], level["true_p50_ttft"])
+    level["total_overhead"] = _difference(level["p50_total"], level["true_p50_total"])
+    return level
+
+
+def run_benchmark(levels: list[int],
+                  duration: float = 30,
+                  settings: MockSettings = None,
+                  config: Dict[str, Any] = None,
+                  max_error_rate: float = 0.01,
+                  max_ttft_overhead: float = 0.5) -> Dict[str, Any]:
+    """
+    依序以每個併發數執行基準測試。
+
+    參數:
+        - levels (list[int]): 要測試的併發數
+        - duration (float): 每個併發數的測試時間（秒）
+        - settings (MockSettings, optional): 模擬服務的設定
+        - config (dict, optional): 覆寫測試配置，例如 {"driver": "http"} 或 {"capture_mode": "observer"}
+        - max_error_rate (float): 判斷「可驅動」的錯誤率上限（超過模擬服務本身的錯誤率的部分）
+        - max_ttft_overhead (float): 判斷「可驅動」的第一個 token 額外延遲上限（秒）
+
+    回傳:
+        - dict: levels（每個併發數的結果）與 max_users（符合門檻的最大併發數）
+    """
+    settings = settings or MockSettings()
+    server, service, base_url = start_mock_server(settings)
+    try:
+        results = []
+        max_users = 0
+        for concurrency in levels:
+            level = run_level(base_url, service, concurrency, duration, config)
+            results.append(level)
+            extra_errors = (level["error_rate"] or 0) - (level["true_error_rate"] or 0)
+            cpu_saturated = level["cpu_percent"] is not None and level["cpu_percent"] > 90 * (os.cpu_count() or 1)
+            if level["ttft_overhead"] is not None and level["ttft_overhead"] <= max_ttft_overhead \
+                    and extra_errors <= max_error_rate and not cpu_saturated:
+                max_users = concurrency
+        return {"levels": results, "max_users": max_users, "settings": settings, "precise_resources": psutil is not None}
+    finally:
+        server.shutdown()
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """ 將基準測試結果格式化為表格 """
+    columns = [
+        ("concurrency", "使用者數", "{:d}"),
+        ("transactions", "交易數", "{:d}"),
+        ("error_rate", "錯誤率", "{:.2%}"),
+        ("p50_ttft", "p50 TTFT", "{:.3f}"),
+        ("true_p50_ttft", "真實 p50 TTFT", "{:.3f}"),
+        ("ttft_overhead", "TTFT 額外延遲", "{:+.3f}"),
+        ("p50_total", "p50 總時間", "{:.3f}"),
+        ("total_overhead", "總時間額外延遲", "{:+.3f}"),
+        ("token_count_ms", "token 計算 ms", "{:.2f}"),
+        ("cpu_percent", "CPU %", "{:.0f}"),
+        ("cpu_seconds_per_user", "CPU 秒/使用者", "{:.2f}"),
+        ("peak_rss_mb_per_user", "MB/使用者", "{:.1f}"),
+    ]
+    rows = [[label for _, label, _ in columns]]
+    for level in report["levels"]:
+        rows.append([fmt.format(level[key]) if level[key] is not None else "-" for key, _, fmt in columns])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    lines = ["  ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in rows]
+    settings = report["settings"]
+    lines.insert(0, f"模擬服務：TTFT {settings.ttft} 秒，{settings.tokens_per_second} token/秒，{settings.tokens} token/回應，"
+                    f"抖動 ±{settings.jitter:.0%}，錯誤率 {settings.error_rate:.0%}")
+    lines.append(f"單機可驅動的最大使用者數：{report['max_users']}")
+    if not report["precise_resources"]:
+        lines.append("注意：未安裝 psutil，CPU 與記憶體只包含本行程（不含執行中的瀏覽器）")
+    return "\n".join(lines)
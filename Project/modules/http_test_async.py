@@ -0,0 +1,145 @@
+from modules.base_test_async import BaseTestAsync, ResponseCapture, TestResult
+from modules.prompt_source import Prompt
+from utils.http_stream import HttpStatusError, HttpStreamClient
+from typing import Any
+import json
+import time
+
+
+class HttpTestAsync(BaseTestAsync):
+    """
+    直接呼叫串流 API 的測試器（不啟動瀏覽器），適用於 OpenAI 相容或類似的串流聊天 endpoint。
+
+    以共用的 HttpStreamClient（keep-alive 連線池）送出 test_prompts，解析 SSE 的每個 chunk，
+    記錄第一個 token、每個 token 與串流結束的時間，結果與 BaseTestAsync 相同，
+    因此 BaseTestRunner、客製化執行器與報告都不需要修改。
+
+    相關配置：
+    - driver: 設為 "http" 時使用此測試器
+    - api_url: 串流 endpoint，預設為 url
+    - api_headers: 額外的請求標頭，例如 {"Authorization": "Bearer ..."}
+    - api_model: 請求中的 model 欄位
+    - api_body: 合併到請求中的其他欄位，例如 {"temperature": 0, "max_tokens": 256}
+    - api_text_path: 每個 SSE 事件中文字片段的位置，預設為 "choices.0.delta.content"
+    - api_keep_history: 是否像瀏覽器一樣在同一段對話中連續送出 prompt，預設為 false
+    - api_timeout: 串流中兩段資料間隔的逾時（秒），預設為 60
+    - api_max_connections: 同時連線數上限，預設為 concurrency
+    """
+    def __init__(self, service_name: str, http_client: HttpStreamClient = None, **kwargs) -> None:
+        """ 初始化 HttpTestAsync
+
+        參數:
+            - service_name (str): 測試的服務名稱
+            - http_client (HttpStreamClient, optional): 共用的 HTTP 客戶端，預設為 None（setup 時自行建立）
+            - 其他參數與 BaseTestAsync 相同（瀏覽器相關的參數會被忽略）
+        """
+        super().__init__(service_name, **kwargs)
+        self.http_client = http_client
+        self._own_client = http_client is None
+        self.history: list[dict[str, str]] = []
+
+    async def setup(self, **kargs) -> None:
+        """ 建立 HTTP 客戶端（未由外部傳入時）並載入 prompt """
+        if self.http_client is None:
+            self.http_client = HttpStreamClient.from_config(self.config)
+        self._load_prompts(kargs)
+
+    async def teardown(self) -> None:
+        """ 關閉自行建立的 HTTP 客戶端（共用的客戶端由執行器關閉） """
+        if self._own_client and self.http_client is not None:
+            await self.http_client.close()
+            self.http_client = None
+
+    async def open_page(self) -> None:
+        """ 不需要開啟頁面 """
+        pass
+
+    async def run_prompt(self, index: int, prompt: str | Prompt, intended_send_time: float = None) -> TestResult:
+        """
+        執行單次交易：以串流 API 送出一個 prompt 並讀取到串流結束。
+        參數與回傳值與 BaseTestAsync.run_prompt 相同。
+        """
+        current_result, prompt = self._new_result(index, prompt, intended_send_time)
+        trace = self._start_trace(current_result)
+        try:
+            self.logger.info(f"測試 Prompt{index+1}")
+            with trace.span("build_request"):
+                messages = self.history + [{"role": "user", "content": prompt}]
+                body = json.dumps(self._build_body(messages), ensure_ascii=False).encode("utf-8")
+                headers = {"Content-Type": "application/json", "Accept": "text/event-stream", **self.config.get("api_headers", {})}
+
+            # 記錄送出時間（時間軸使用 perf_counter，單位為毫秒，與 ResponseCapture 相同）
+            self._mark_sent(current_result)
+            start_time = time.perf_counter() * 1000
+            capture = ResponseCapture()
+            parts: list[str] = []
+            length = 0
+            # 送出到收到回應標頭（連線與伺服器排隊）、收到回應標頭到第一個 token、第一個 token 到串流結束
+            phase = trace.span("wait_headers")
+            error = None
+            try:
+                async with self.http_client.request("POST", self.config.get("api_url", self.config.get("url")), headers, body) as response:
+                    current_result.is_sent = True
+                    phase.finish(status=response.status)
+                    phase = trace.span("wait_first_token")
+                    if not 200 <= response.status < 300:
+                        raise HttpStatusError(response.status, (await response.read()).decode("utf-8", errors="replace"))
+                    async for data in response.iter_sse():
+                        # [DONE] 之後繼續讀到 body 結束，連線才能回到連線池
+                        if data.strip() == "[DONE]":
+                            continue
+                        delta = self._extract_text(data)
+                        if not delta:
+                            continue
+                        now = time.perf_counter() * 1000
+                        if capture.first_token_time is None:
+                            capture.first_token_time = now
+                            phase.finish()
+                            phase = trace.span("stream")
+                        parts.append(delta)
+                        length += len(delta)
+                        capture.timeline.append((now, length))
+                # 串流結束即為回應完成
+                capture.end_time = capture.final_token_time = time.perf_counter() * 1000
+                phase.set(chunks=len(parts))
+            except BaseException as e:
+                error = type(e).__name__
+                raise
+            finally:
+                # 出錯時也結束目前的階段，並在 span 上記錄錯誤類別
+                phase.finish(error)
+            capture.text = "".join(parts)
+
+            await self._record_capture(index, current_result, capture, start_time, prompt)
+            if self.config.get("api_keep_history"):
+                self.history = messages + [{"role": "assistant", "content": capture.text}]
+        except Exception as e:
+            self.logger.error(f"測試 Prompt{index+1} 發生錯誤：{e}")
+            current_result.is_successful = False
+            current_result.error = type(e).__name__
+        with trace.span("publish"):
+            self._publish_result(current_result)
+        self._finish_trace(current_result)
+        return current_result
+
+    def _build_body(self, messages: list[dict[str, str]]) -> dict[str, Any]:
+        body = {"messages": messages, "stream": True}
+        if self.config.get("api_model"):
+            body["model"] = self.config["api_model"]
+        body.update(self.config.get("api_body", {}))
+        return body
+
+    def _extract_text(self, data: str) -> str:
+        """ 依 api_text_path 取出 SSE 事件中的文字片段，非 JSON 的事件直接視為文字 """
+        try:
+            value: Any = json.loads(data)
+        except json.JSONDecodeError:
+            return data
+        for key in self.config.get("api_text_path", "choices.0.delta.content").split("."):
+            if isinstance(value, list) and key.isdigit() and int(key) < len(value):
+                value = value[int(key)]
+            elif isinstance(value, dict) and key in value:
+                value = value[key]
+            else:
+                return ""
+        return value if isinstance(value, str) else ""
@@ -0,0 +1,219 @@
+from modules.base_runner import BaseTestRunner
+from modules.base_test_async import TestResult
+from modules.browser_pool import WarmBrowserPool
+from modules.live_metrics import LiveMetrics, register_live_metrics, unregister_live_metrics
+from modules.load_profile import LoadProfile
+from modules.runner_loader import get_runner_class
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict
+import asyncio
+import concurrent.futures
+import threading
+import time
+import uuid
+
+
+# 工作狀態
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+@dataclass
+class Job:
+    job_id: str                                        # 工作識別碼（同時作為即時指標的 run_id）
+    service_name: str                                  # 服務名稱
+    runner_name: str                                   # 執行器名稱
+    state: str = QUEUED                                # queued / running / done / failed / cancelled
+    created_time: float = field(default_factory=time.time)
+    started_time: float | None = None
+    finished_time: float | None = None
+    expected_duration: float | None = None             # 預計測試時間（秒），無法預估時為 None
+    completed_transactions: int = 0                    # 已完成的交易數
+    failed_transactions: int = 0                       # 失敗的交易數
+    result: str | None = None                          # 測試報告
+    error: str | None = None                           # 失敗原因
+    live_metrics: LiveMetrics | None = field(default=None, repr=False)
+    runner: BaseTestRunner | None = field(default=None, repr=False)
+    _task: asyncio.Task | None = field(default=None, repr=False)
+    _cancel_requested: bool = field(default=False, repr=False)
+
+    def on_result(self, result: TestResult) -> None:
+        self.completed_transactions += 1
+        if not result.is_successful:
+            self.failed_transactions += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """ 供 API 回傳的工作狀態與進度 """
+        now = self.finished_time or time.time()
+        elapsed = now - self.started_time if self.started_time else 0.0
+        progress = None
+        if self.state == DONE:
+            progress = 1.0
+        elif self.expected_duration:
+            progress = min(elapsed / self.expected_duration, 1.0)
+        return {
+            "job_id": self.job_id,
+            "service": self.service_name,
+            "state": self.state,
+            "created_time": self.created_time,
+            "started_time": self.started_time,
+            "finished_time": self.finished_time,
+            "elapsed": elapsed,
+            "expected_duration": self.expected_duration,
+            "progress": progress,
+            "active_sessions": len(self.runner._active_sessions) if self.runner is not None and self.state == RUNNING else 0,
+            "completed_transactions": self.completed_transactions,
+            "failed_transactions": self.failed_transactions,
+            "time_to_first_prompt": self.runner.time_to_first_prompt if self.runner is not None else None,
+            "start_mode": self.runner.start_mode if self.runner is not None else None,
+            "length_analysis": self.runner.length_analysis if self.runner is not None else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    在背景執行負載測試的工作管理器。
+
+    所有測試都在同一個專用的 event loop 執行緒中執行，Flask 的請求只負責送出工作與查詢狀態，
+    不會因為測試時間長而被卡住；同時執行的測試數量以 max_concurrent_runs 限制，其餘的工作排隊等待。
+    取消工作時會取消對應的 asyncio task，各工作階段在 finally 中關閉瀏覽器。
+    傳入常駐瀏覽器池時，每個測試借用其中已啟動的瀏覽器（瀏覽器池同樣在這個 event loop 中執行）。
+    """
+    def __init__(self, max_concurrent_runs: int = 1, history_size: int = 100, browser_pool: WarmBrowserPool = None) -> None:
+        """ 初始化 JobManager
+
+        參數:
+            - max_concurrent_runs (int, optional): 同時執行的測試數量上限，預設為 1
+            - history_size (int, optional): 保留的已結束工作數量，超過時移除最舊的工作
+            - browser_pool (WarmBrowserPool, optional): 常駐瀏覽器池，預設為 None（每個測試自行啟動瀏覽器）
+        """
+        self.max_concurrent_runs = max(1, max_concurrent_runs)
+        self.history_size = history_size
+        self.browser_pool = browser_pool
+        self.jobs: OrderedDict[str, Job] = OrderedDict()
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._semaphore: asyncio.Semaphore = None
+        self._thread = threading.Thread(target=self._run_loop, name="job-manager", daemon=True)
+        self._thread.start()
+
+    def submit(self, service_name: str, runner_name: str = None, job_id: str = None) -> Job:
+        """ 送出一個測試工作，立即回傳（測試在背景執行） """
+        job = Job(job_id or uuid.uuid4().hex, service_name, runner_name or service_name)
+        job.live_metrics = LiveMetrics(job.job_id)
+        with self._lock:
+            if job.job_id in self.jobs:
+                raise ValueError(f"工作 {job.job_id} 已存在")
+            self.jobs[job.job_id] = job
+            self._prune()
+            # 確認工作被接受後才註冊即時指標（排隊時就註冊，前端可以先連線等待），重複的 job_id 不會覆蓋執行中工作的指標
+            register_live_metrics(job.live_metrics)
+        asyncio.run_coroutine_threadsafe(self._run(job), self._loop)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self) -> list[Job]:
+        with self._lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id: str) -> bool:
+        """ 取消工作，回傳是否成功送出取消要求（已結束的工作無法取消） """
+        job = self.get(job_id)
+        if job is None or job.state in FINISHED_STATES:
+            return False
+        job._cancel_requested = True
+        self._loop.call_soon_threadsafe(self._cancel_task, job)
+        return True
+
+    def run_sync(self, coro, timeout: float = None) -> Any:
+        """ 在工作管理器的 event loop 中執行 coroutine 並等待結果（例如借用常駐瀏覽器池的選擇器偵測） """
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def schedule(self, coro) -> concurrent.futures.Future:
+        """ 在工作管理器的 event loop 中執行 coroutine，不等待結果 """
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def wait(self, job_id: str, timeout: float = None) -> Job:
+        """ 阻塞等待工作結束（供 CLI 或測試程式使用） """
+        job = self.get(job_id)
+        deadline = time.time() + timeout if timeout is not None else None
+        while job.state not in FINISHED_STATES:
+            if deadline is not None and time.time() >= deadline:
+                raise concurrent.futures.TimeoutError(f"等待工作 {job_id} 逾時")
+            time.sleep(0.2)
+        return job
+
+    def shutdown(self) -> None:
+        """ 取消所有未結束的工作並停止 event loop 執行緒 """
+        for job in self.list_jobs():
+            self.cancel(job.job_id)
+        if self.browser_pool is not None:
+            try:
+                self.run_sync(self.browser_pool.close(), timeout=30)
+            except Exception as e:
+                print(f"關閉常駐瀏覽器池失敗：{e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=30)
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self.max_concurrent_runs)
+        self._loop.run_forever()
+
+    def _cancel_task(self, job: Job) -> None:
+        if job._task is not None:
+            job._task.cancel()
+
+    async def _run(self, job: Job) -> None:
+        # 排隊中的工作也可以直接取消
+        job._task = asyncio.current_task()
+        try:
+            async with self._semaphore:
+                if job._cancel_requested:
+                    job.state = CANCELLED
+                    return
+                job.state = RUNNING
+                job.started_time = time.time()
+                runner_class = get_runner_class(job.runner_name)
+                job.runner = runner_class(job.service_name)
+                job.runner.run_id = job.job_id
+                job.runner.live_metrics = job.live_metrics
+                job.runner.warm_pool = self.browser_pool
+                job.runner.result_listeners.append(job.on_result)
+                job.expected_duration = self._expected_duration(job.runner.config)
+                job.result = await job.runner.execute_load_test()
+                job.state = DONE
+        except asyncio.CancelledError:
+            job.state = CANCELLED
+        except Exception as e:
+            job.state = FAILED
+            job.error = f"{type(e).__name__}: {e}"
+            print(f"工作 {job.job_id} 執行失敗：{job.error}")
+        finally:
+            job.finished_time = time.time()
+            job._task = None
+            job.live_metrics.close()
+            unregister_live_metrics(job.job_id)
+
+    @staticmethod
+    def _expected_duration(config: Dict[str, Any]) -> float | None:
+        """ 依配置預估測試時間（只有定時測試或分階段負載才能預估） """
+        if config.get("load_profile"):
+            return LoadProfile.from_config(config["load_profile"]).total_duration
+        return config.get("test_duration") or None
+
+    def _prune(self) -> None:
+        """ 只保留最近 history_size 個已結束的工作 """
+        finished = [job_id for job_id, job in self.jobs.items() if job.state in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.history_size)]:
+            del self.jobs[job_id]
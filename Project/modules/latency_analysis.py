@@ -0,0 +1,182 @@
+"""
+延遲與長度的關係分析：以逐筆交易的輸入 / 輸出 token 數與延遲，回答「延遲如何隨 prompt 長度與回應長度增加」。
+
+- 依輸入 token 數分組的第一個 token 延遲（TTFT）分位數，依輸出 token 數分組的生成時間分位數
+- 以最小平方法擬合 TTFT = 固定成本 + 每個輸入 token 的 prefill 成本 × 輸入 token 數，
+  以及 生成時間 = 固定成本 + 每個輸出 token 的 decode 成本 × 輸出 token 數
+- 以 bootstrap 估計分位數與斜率的信賴區間
+
+所有計算都以 numpy 陣列進行，bootstrap 的重抽樣以矩陣一次計算（依資料量分批，限制記憶體用量）。
+"""
+from typing import Any, Callable, Dict, Iterable
+import numpy as np
+
+
+# 預設的 token 數分組邊界（最後一組沒有上限）
+DEFAULT_INPUT_EDGES = (0, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+DEFAULT_OUTPUT_EDGES = (0, 32, 64, 128, 256, 512, 1024, 2048)
+# bootstrap 每一批最多使用的元素數（約 16 MB 的 float64）
+_BOOTSTRAP_BATCH_ELEMENTS = 2_000_000
+
+
+def _bootstrap(rng: np.random.Generator, n: int, samples: int, statistic: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+    """ 產生 samples 組重抽樣的索引（每組 n 筆），以 statistic 對每一列計算統計量 """
+    batch = max(1, _BOOTSTRAP_BATCH_ELEMENTS // max(n, 1))
+    values = []
+    for start in range(0, samples, batch):
+        indices = rng.integers(0, n, size=(min(batch, samples - start), n))
+        values.append(statistic(indices))
+    return np.concatenate(values)
+
+
+def _interval(values: np.ndarray, confidence: float) -> tuple[float, float] | None:
+    values = values[np.isfinite(values)]
+    if values.size == 0:
+        return None
+    alpha = (1 - confidence) / 2 * 100
+    low, high = np.percentile(values, [alpha, 100 - alpha])
+    return float(low), float(high)
+
+
+def _slopes(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """ 每一列各自以最小平方法擬合 y = a + b·x，回傳斜率 b（x 沒有變化時為 nan） """
+    dx = x - x.mean(axis=-1, keepdims=True)
+    dy = y - y.mean(axis=-1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (dx * dy).sum(axis=-1) / (dx * dx).sum(axis=-1)
+
+
+def fit_linear(x: np.ndarray, y: np.ndarray, rng: np.random.Generator, samples: int = 200, confidence: float = 0.95) -> Dict[str, Any] | None:
+    """
+    擬合 y = intercept + slope·x。
+
+    回傳：
+    - dict: intercept、slope、slope_ci（bootstrap 信賴區間）、r2、transactions；資料不足或 x 沒有變化時回傳 None
+    """
+    if x.size < 3 or np.ptp(x) == 0:
+        return None
+    slope = float(_slopes(x, y))
+    intercept = float(y.mean() - slope * x.mean())
+    residual = y - (intercept + slope * x)
+    total = ((y - y.mean()) ** 2).sum()
+    r2 = float(1 - (residual ** 2).sum() / total) if total > 0 else None
+    slope_ci = _interval(_bootstrap(rng, x.size, samples, lambda idx: _slopes(x[idx], y[idx])), confidence) if samples else None
+    return {"intercept": intercept, "slope": slope, "slope_ci": slope_ci, "r2": r2, "transactions": int(x.size)}
+
+
+def bucket_percentiles(tokens: np.ndarray,
+                       values: np.ndarray,
+                       edges: Iterable[int],
+                       rng: np.random.Generator,
+                       percentiles: Iterable[float] = (50, 95),
+                       samples: int = 200,
+                       confidence: float = 0.95) -> list[Dict[str, Any]]:
+    """ 依 token 數分組計算 values 的分位數與 bootstrap 信賴區間（略過沒有資料的分組） """
+    edges = list(edges)
+    percentiles = list(percentiles)
+    groups = np.digitize(tokens, edges[1:])
+    buckets = []
+    for group in np.unique(groups):
+        group_values = values[groups == group]
+        bucket = {
+            "min_tokens": edges[group],
+            "max_tokens": edges[group + 1] if group + 1 < len(edges) else None,
+            "transactions": int(group_values.size),
+        }
+        computed = np.percentile(group_values, percentiles)
+        intervals = _bootstrap(rng, group_values.size, samples, lambda idx: np.percentile(group_values[idx], percentiles, axis=1).T) \
+            if samples and group_values.size > 1 else None
+        for i, q in enumerate(percentiles):
+            bucket[f"p{q:g}"] = float(computed[i])
+            bucket[f"p{q:g}_ci"] = _interval(intervals[:, i], confidence) if intervals is not None else None
+        buckets.append(bucket)
+    return buckets
+
+
+def analyze_lengths(input_tokens: Iterable[int],
+                    output_tokens: Iterable[int],
+                    first_token_latency: Iterable[float],
+                    generation_time: Iterable[float],
+                    input_edges: Iterable[int] = DEFAULT_INPUT_EDGES,
+                    output_edges: Iterable[int] = DEFAULT_OUTPUT_EDGES,
+                    percentiles: Iterable[float] = (50, 95),
+                    bootstrap: int = 200,
+                    confidence: float = 0.95,
+                    seed: int = 0) -> Dict[str, Any] | None:
+    """
+    分析延遲與輸入 / 輸出長度的關係（四個序列為同一組成功交易，順序一致）。
+
+    參數:
+        - input_tokens / output_tokens: 每筆交易的輸入 / 輸出 token 數
+        - first_token_latency / generation_time: 每筆交易的第一個 token 延遲與生成時間（秒）
+        - input_edges / output_edges: 分組邊界（由小到大，最後一組沒有上限）
+        - percentiles: 每個分組要計算的百分位數
+        - bootstrap: bootstrap 重抽樣次數，0 表示不計算信賴區間
+        - confidence: 信賴水準
+        - seed: bootstrap 的亂數種子
+
+    回傳：
+    - dict: input_buckets、output_buckets、prefill、decode；沒有資料時回傳 None
+    """
+    input_tokens = np.asarray(list(input_tokens), dtype=np.float64)
+    output_tokens = np.asarray(list(output_tokens), dtype=np.float64)
+    ttft = np.asarray(list(first_token_latency), dtype=np.float64)
+    generation = np.asarray(list(generation_time), dtype=np.float64)
+    if not input_tokens.size or not (input_tokens.size == output_tokens.size == ttft.size == generation.size):
+        return None
+    rng = np.random.default_rng(seed)
+    # 沒有擷取到第一個 token（延遲為 0）或沒有生成時間的交易不列入對應的分析
+    has_ttft = ttft > 0
+    has_generation = (generation > 0) & (output_tokens > 0)
+    return {
+        "transactions": int(input_tokens.size),
+        "confidence": confidence,
+        "input_buckets": bucket_percentiles(input_tokens[has_ttft], ttft[has_ttft], input_edges, rng, percentiles, bootstrap, confidence),
+        "output_buckets": bucket_percentiles(output_tokens[has_generation], generation[has_generation], output_edges, rng, percentiles, bootstrap, confidence),
+        "prefill": fit_linear(input_tokens[has_ttft], ttft[has_ttft], rng, bootstrap, confidence),
+        "decode": fit_linear(output_tokens[has_generation], generation[has_generation], rng, bootstrap, confidence),
+    }
+
+
+def analyze_from_config(config: Dict[str, Any], **data: Iterable) -> Dict[str, Any] | None:
+    """ 依配置的 length_analysis 欄位執行 analyze_lengths，設定為 false 時回傳 None """
+    settings = config.get("length_analysis", {})
+    if settings is False:
+        return None
+    return analyze_lengths(**data, **(settings if isinstance(settings, dict) else {}))
+
+
+def _format_range(bucket: Dict[str, Any]) -> str:
+    if bucket["max_tokens"] is None:
+        return f"{bucket['min_tokens']}+"
+    return f"{bucket['min_tokens']}-{bucket['max_tokens'] - 1}"
+
+
+def _format_ci(interval: tuple[float, float] | None, scale: float = 1.0, digits: int = 2) -> str:
+    return f"[{interval[0]*scale:.{digits}f}, {interval[1]*scale:.{digits}f}]" if interval else "-"
+
+
+def format_length_analysis(analysis: Dict[str, Any]) -> str:
+    """ 將分析結果格式化為報告文字 """
+    confidence = f"{analysis['confidence']:.0%}"
+    lines = ["=========== 延遲與長度分析 ==========="]
+    for key, title, metric in (("input_buckets", "輸入 token", "第一個 token 延遲"), ("output_buckets", "輸出 token", "生成時間")):
+        buckets = analysis[key]
+        if not buckets:
+            continue
+        quantiles = [k for k in buckets[0] if k.startswith("p") and not k.endswith("_ci")]
+        rows = [[title, "交易數"] + [f"{q} {metric}（{confidence} CI）" for q in quantiles]]
+        for bucket in buckets:
+            rows.append([_format_range(bucket), str(bucket["transactions"])] +
+                        [f"{bucket[q]:.2f} 秒 {_format_ci(bucket[f'{q}_ci'])}" for q in quantiles])
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        lines += ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows]
+    for key, title, unit in (("prefill", "prefill（輸入）", "輸入"), ("decode", "decode（輸出）", "輸出")):
+        fit = analysis[key]
+        if fit is None:
+            lines.append(f"{title}：資料不足，無法擬合")
+            continue
+        r2 = f"，R² {fit['r2']:.2f}" if fit["r2"] is not None else ""
+        lines.append(f"{title}：每個{unit} token {fit['slope']*1000:.3f} 毫秒 {_format_ci(fit['slope_ci'], 1000, 3)}，"
+                     f"固定成本 {fit['intercept']:.3f} 秒{r2}")
+    return "\n".join(lines)
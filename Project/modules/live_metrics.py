@@ -0,0 +1,124 @@
+from modules.base_test_async import TestResult
+from collections import deque
+from typing import Any, Dict
+import asyncio
+import math
+import queue
+import threading
+import time
+import numpy as np
+
+
+class LiveMetrics:
+    """
+    測試執行期間的即時指標：每 interval 秒彙整一次滾動視窗，並推送給所有訂閱者（例如 Flask 的 SSE 連線）。
+
+    所有時間戳記都使用 Python 端的 time.time()（交易送出與完成時記錄），
+    而不是各頁面自己的 performance.now()，因此不同瀏覽器的視窗可以對齊。
+    """
+    def __init__(self, run_id: str, interval: float = 1.0, history_size: int = 3600) -> None:
+        """ 初始化 LiveMetrics
+
+        參數:
+            - run_id (str): 這次測試的識別碼
+            - interval (float, optional): 視窗長度（秒），預設為 1 秒
+            - history_size (int, optional): 保留的視窗數量，供晚加入的訂閱者補齊歷史資料
+        """
+        self.run_id = run_id
+        self.interval = interval
+        self.history: deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self.active_sessions = 0
+        self.finished = False
+        self._pending: list[TestResult] = []
+        self._subscribers: list[queue.Queue] = []
+        self._lock = threading.Lock()
+
+    def on_result(self, result: TestResult) -> None:
+        """ 收到一筆交易結果（由 BaseTestAsync 在交易完成時呼叫） """
+        self._pending.append(result)
+
+    def session_started(self) -> None:
+        self.active_sessions += 1
+
+    def session_ended(self) -> None:
+        self.active_sessions = max(0, self.active_sessions - 1)
+
+    def subscribe(self) -> queue.Queue:
+        """
+        訂閱即時指標，回傳執行緒安全的 queue（可由 Flask 的執行緒讀取）。
+        會先補上已產生的歷史視窗；測試結束時會放入 None。
+        """
+        q = queue.Queue()
+        with self._lock:
+            for snapshot in self.history:
+                q.put(snapshot)
+            if self.finished:
+                q.put(None)
+            else:
+                self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue) -> None:
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    async def run(self) -> None:
+        """ 每個視窗結束時發布一次指標，直到被取消 """
+        try:
+            while True:
+                now = time.time()
+                boundary = (math.floor(now / self.interval) + 1) * self.interval
+                await asyncio.sleep(boundary - now)
+                self._publish(self._snapshot(boundary))
+        finally:
+            # 發布最後一個不完整的視窗
+            if self._pending:
+                self._publish(self._snapshot(time.time()))
+            self.close()
+
+    def close(self) -> None:
+        """ 結束即時指標，通知所有訂閱者 """
+        with self._lock:
+            self.finished = True
+            for q in self._subscribers:
+                q.put(None)
+            self._subscribers.clear()
+
+    def _snapshot(self, window_end: float) -> Dict[str, Any]:
+        window = [r for r in self._pending if (r.completed_time or window_end) < window_end]
+        self._pending = [r for r in self._pending if (r.completed_time or window_end) >= window_end]
+        successful = [r for r in window if r.is_successful]
+        first_token_latency = np.array([r.first_token_latency for r in successful], dtype=np.float64)
+        return {
+            "timestamp": window_end,
+            "active_sessions": self.active_sessions,
+            "completions_per_second": len(successful) / self.interval,
+            "tokens_per_second": sum(r.token_count for r in successful) / self.interval,
+            "p50_first_token_time": float(np.percentile(first_token_latency, 50)) if first_token_latency.size else None,
+            "p95_first_token_time": float(np.percentile(first_token_latency, 95)) if first_token_latency.size else None,
+            "errors": len(window) - len(successful),
+        }
+
+    def _publish(self, snapshot: Dict[str, Any]) -> None:
+        with self._lock:
+            self.history.append(snapshot)
+            for q in self._subscribers:
+                q.put(snapshot)
+
+
+# 執行中的即時指標，依 run_id 查詢（供 Flask 的串流 endpoint 使用）
+_registry: Dict[str, LiveMetrics] = {}
+_registry_lock = threading.Lock()
+
+def register_live_metrics(live: LiveMetrics) -> None:
+    with _registry_lock:
+        _registry[live.run_id] = live
+
+def get_live_metrics(run_id: str) -> LiveMetrics | None:
+    with _registry_lock:
+        return _registry.get(run_id)
+
+def unregister_live_metrics(run_id: str) -> None:
+    with _registry_lock:
+        _registry.pop(run_id, None)
@@ -0,0 +1,90 @@
+from dataclasses import dataclass
+from typing import Any, Dict
+import math
+
+
+@dataclass
+class Stage:
+    name: str                   # 階段名稱，例如 "ramp 1→50"
+    duration: float             # 階段持續時間（秒）
+    start_users: int            # 階段開始時的使用者數
+    end_users: int              # 階段結束時的使用者數
+    step: int = 0               # step 階段每次增加的使用者數
+    interval: float = 0.0       # step 階段每次增加的間隔（秒）
+
+    def target_users(self, elapsed: float) -> int:
+        """ 階段開始後經過 elapsed 秒時應有的使用者數 """
+        elapsed = min(max(elapsed, 0.0), self.duration)
+        if self.step:
+            return self.start_users + self.step * min(int(elapsed // self.interval), (self.end_users - self.start_users) // self.step)
+        if self.duration <= 0 or self.start_users == self.end_users:
+            return self.end_users
+        return round(self.start_users + (self.end_users - self.start_users) * elapsed / self.duration)
+
+
+class LoadProfile:
+    """
+    分階段的負載設定，配置範例：
+    "load_profile": [
+        {"type": "ramp", "from": 1, "to": 50, "duration": 300},
+        {"type": "hold", "duration": 600},
+        {"type": "step", "step": 10, "interval": 120, "duration": 600}
+    ]
+
+    - ramp: 在 duration 秒內由 from 線性增加（或減少）到 to 個使用者，from 省略時延續上一階段
+    - hold: 維持上一階段結束時的使用者數（或指定 users）
+    - step: 由上一階段的使用者數開始，每 interval 秒增加 step 個使用者
+    """
+    def __init__(self, stages: list[Stage]) -> None:
+        if not stages:
+            raise ValueError("load_profile 至少需要一個階段")
+        self.stages = stages
+
+    @classmethod
+    def from_config(cls, profile: list[Dict[str, Any]], initial_users: int = 0) -> "LoadProfile":
+        """ 依配置中的 load_profile 建立 LoadProfile """
+        stages = []
+        users = initial_users
+        for item in profile:
+            stage_type = item.get("type", "hold")
+            duration = float(item["duration"])
+            if stage_type == "ramp":
+                start = int(item.get("from", users))
+                end = int(item["to"])
+                stage = Stage(f"ramp {start}→{end}", duration, start, end)
+            elif stage_type == "hold":
+                users = int(item.get("users", users))
+                stage = Stage(f"hold {users}", duration, users, users)
+            elif stage_type == "step":
+                step = int(item["step"])
+                interval = float(item.get("interval", 0))
+                if interval <= 0:
+                    raise ValueError(f"step 階段的 interval 必須大於 0: {item}")
+                start = int(item.get("from", users))
+                # 只計入階段內（elapsed < duration）的增加，落在結束時間點的增加屬於下一個階段
+                end = start + step * max(math.ceil(duration / interval) - 1, 0)
+                stage = Stage(f"step {start}→{end} (+{step}/{interval:g}s)", duration, start, end, step, interval)
+            else:
+                raise ValueError(f"不支援的階段類型: {stage_type}")
+            stages.append(stage)
+            users = stage.end_users
+        return cls(stages)
+
+    @property
+    def total_duration(self) -> float:
+        return sum(s.duration for s in self.stages)
+
+    @property
+    def max_users(self) -> int:
+        return max(max(s.start_users, s.end_users) for s in self.stages)
+
+    def target(self, elapsed: float) -> tuple[int, int]:
+        """
+        回傳經過 elapsed 秒時所在的階段索引與目標使用者數。
+        超過總時間時回傳 (len(stages), 0)。
+        """
+        for idx, stage in enumerate(self.stages):
+            if elapsed < stage.duration:
+                return idx, stage.target_users(elapsed)
+            elapsed -= stage.duration
+        return len(self.stages), 0
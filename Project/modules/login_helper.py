@@ -6,8 +6,9 @@ import asyncio
 async def perform_login(page, config):
     await page.fill(config["username_selector"], config["username"])
     await page.fill(config["password_selector"], config["password"])
-    await page.click(config["login_button_selector"])
-    await page.wait_for_navigation()
+    # 點擊後等待導向完成（Playwright 沒有 wait_for_navigation，需以 expect_navigation 包住觸發導向的動作）
+    async with page.expect_navigation():
+        await page.click(config["login_button_selector"])
     if page.url == config["login_url"]:
         print("自動登入失敗，請檢查帳號密碼是否正確。")
         return False
@@ -37,15 +38,19 @@ async def perform_manual_login(page,config):
     # 檢查 headless 設定
     if config.get("headless", True):
         print("警告：若要進行手動登入，請將 headless 設定為 False！")
-        return
+        return False
     login_url = config.get("login_url")
     if not login_url:
         print("配置中未找到 login_url，請檢查配置文件。")
-        return
+        return False
     
     await page.goto(login_url)
     print("請在打開的瀏覽器中手動完成登入，完成後按 Enter 鍵繼續...")
     await asyncio.to_thread(input, "按 Enter 鍵繼續...")
+    if page.url.startswith(login_url):
+        print("手動登入失敗，頁面仍停留在登入頁。")
+        return False
+    return True
         
 
 # 在 load_cookies 函式中，你可以這樣處理：
@@ -0,0 +1,195 @@
+"""
+本機的模擬 LLM 聊天服務，用來量測測試工具本身造成的額外延遲。
+
+- GET  /             聊天頁面：textarea[placeholder='Talk to Bot'] 輸入、.bot-message 串流輸出（最新的回應在最上方）
+- POST /api/chat     OpenAI 相容的 SSE 串流 API（頁面本身也使用這個 API）
+- GET  /stats        伺服器端記錄的真實時間（ground truth）
+- POST /stats/reset  清除記錄
+
+每個回應的第一個 token 延遲、每秒 token 數、抖動與錯誤率都可以設定，
+伺服器會記錄每個請求實際送出第一個與最後一個 token 的時間，供基準測試比對。
+"""
+from dataclasses import asdict, dataclass
+from flask import Flask, Response, jsonify, render_template_string, request
+from typing import Any, Dict
+import json
+import random
+import threading
+import time
+import numpy as np
+
+
+@dataclass
+class MockSettings:
+    ttft: float = 0.5               # 第一個 token 延遲（秒）
+    tokens_per_second: float = 20   # 每秒輸出的 token 數
+    tokens: int = 50                # 每個回應的 token 數
+    jitter: float = 0.1             # 延遲的隨機抖動比例（0.1 表示 ±10%）
+    error_rate: float = 0.0         # 回應錯誤的機率（0~1）
+    seed: int | None = None         # 亂數種子
+
+
+@dataclass
+class MockRecord:
+    received_time: float            # 收到請求的時間（time.perf_counter()，秒）
+    first_token_time: float | None  # 送出第一個 token 的時間
+    final_token_time: float | None  # 送出最後一個 token 的時間
+    tokens: int                     # 送出的 token 數
+    is_error: bool                  # 是否為模擬的錯誤
+
+    @property
+    def ttft(self) -> float | None:
+        return self.first_token_time - self.received_time if self.first_token_time is not None else None
+
+    @property
+    def total_time(self) -> float | None:
+        return self.final_token_time - self.received_time if self.final_token_time is not None else None
+
+
+_WORDS = ("the", "model", "answer", "token", "latency", "stream", "service", "response", "quick", "test",
+          "large", "language", "system", "data", "result", "value", "request", "browser", "user", "time")
+
+_PAGE = """<!DOCTYPE html>
+<html lang="zh-TW">
+<head>
+    <meta charset="UTF-8">
+    <title>Mock Chat</title>
+    <style>
+        body { font-family: sans-serif; max-width: 800px; margin: 2rem auto; }
+        textarea { width: 100%; height: 4rem; }
+        .bot-message { border: 1px solid #ccc; border-radius: 4px; padding: .5rem; margin: .5rem 0; white-space: pre-wrap; }
+    </style>
+</head>
+<body>
+    <textarea placeholder="Talk to Bot"></textarea>
+    <div id="messages"></div>
+    <script>
+        const input = document.querySelector('textarea');
+        const messages = document.getElementById('messages');
+        input.addEventListener('keydown', async (event) => {
+            if (event.key !== 'Enter' || event.shiftKey) return;
+            event.preventDefault();
+            const prompt = input.value;
+            input.value = '';
+            // 立即建立回應元素，並放在最上方，讓 .bot-message 選到最新的回應
+            const output = document.createElement('div');
+            output.className = 'bot-message';
+            messages.prepend(output);
+            try {
+                const response = await fetch('/api/chat', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({messages: [{role: 'user', content: prompt}], stream: true})
+                });
+                if (!response.ok) {
+                    output.textContent = `[error] HTTP ${response.status}`;
+                    return;
+                }
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                while (true) {
+                    const {done, value} = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, {stream: true});
+                    const events = buffer.split('\\n\\n');
+                    buffer = events.pop();
+                    for (const event of events) {
+                        const data = event.replace(/^data: /, '');
+                        if (data === '[DONE]') continue;
+                        output.textContent += JSON.parse(data).choices[0].delta.content;
+                    }
+                }
+            } catch (error) {
+                output.textContent = `[error] ${error}`;
+            }
+        });
+    </script>
+</body>
+</html>
+"""
+
+
+class MockChatService:
+    """ 模擬聊天服務的狀態：設定值與每個請求的真實時間記錄 """
+    def __init__(self, settings: MockSettings = None) -> None:
+        self.settings = settings or MockSettings()
+        self.records: list[MockRecord] = []
+        self._lock = threading.Lock()
+        self._random = random.Random(self.settings.seed)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.records = []
+
+    def stats(self) -> Dict[str, Any]:
+        """ 伺服器端的真實時間統計（秒） """
+        with self._lock:
+            records = list(self.records)
+        ttft = np.array([r.ttft for r in records if r.ttft is not None], dtype=np.float64)
+        total = np.array([r.total_time for r in records if r.total_time is not None], dtype=np.float64)
+        summary = {"requests": len(records), "errors": sum(1 for r in records if r.is_error), "settings": asdict(self.settings)}
+        for name, values in (("ttft", ttft), ("total_time", total)):
+            for q in (50, 95, 99):
+                summary[f"p{q}_{name}"] = float(np.percentile(values, q)) if values.size else None
+        return summary
+
+    def _jittered(self, value: float) -> float:
+        jitter = self.settings.jitter
+        with self._lock:
+            factor = self._random.uniform(1 - jitter, 1 + jitter) if jitter else 1.0
+        return max(0.0, value * factor)
+
+    def stream(self):
+        """ 產生一個回應：回傳 (是否為錯誤, SSE 產生器) """
+        record = MockRecord(time.perf_counter(), None, None, 0, False)
+        with self._lock:
+            record.is_error = self._random.random() < self.settings.error_rate
+            self.records.append(record)
+        if record.is_error:
+            return True, None
+
+        def generate():
+            deadline = record.received_time + self._jittered(self.settings.ttft)
+            interval = 1 / self.settings.tokens_per_second if self.settings.tokens_per_second > 0 else 0
+            for i in range(self.settings.tokens):
+                # 以絕對時間排程，避免 sleep 的誤差累積
+                time.sleep(max(0.0, deadline - time.perf_counter()))
+                word = self._random.choice(_WORDS)
+                chunk = {"choices": [{"index": 0, "delta": {"content": word + " "}}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                now = time.perf_counter()
+                if record.first_token_time is None:
+                    record.first_token_time = now
+                record.final_token_time = now
+                record.tokens += 1
+                deadline += self._jittered(interval)
+            yield "data: [DONE]\n\n"
+        return False, generate()
+
+
+def create_mock_app(service: MockChatService) -> Flask:
+    """ 建立模擬聊天服務的 Flask 應用程式 """
+    app = Flask(__name__)
+
+    @app.route('/')
+    def index():
+        return render_template_string(_PAGE)
+
+    @app.route('/api/chat', methods=['POST'])
+    def chat():
+        is_error, generator = service.stream()
+        if is_error:
+            return jsonify({"error": {"message": "mock error"}}), 500
+        return Response(generator, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+    @app.route('/stats')
+    def stats():
+        return jsonify(service.stats())
+
+    @app.route('/stats/reset', methods=['POST'])
+    def reset_stats():
+        service.reset()
+        return jsonify({"status": "success"})
+
+    return app
@@ -0,0 +1,144 @@
+from playwright.async_api import CDPSession, Error, Page, WebSocket
+from dataclasses import dataclass
+import asyncio
+import re
+import time
+
+
+@dataclass
+class WireTiming:
+    url: str                                # 符合 endpoint pattern 的請求網址
+    protocol: str                           # http 或 websocket
+    request_sent: float                     # 請求送出的時間（epoch 毫秒）
+    first_byte: float | None = None         # 第一個串流資料（body chunk / SSE 事件 / frame）到達的時間（epoch 毫秒），不含回應標頭
+    end: float | None = None                # 串流結束的時間（epoch 毫秒）
+    frames: int = 0                         # WebSocket 收到的 frame 數
+    failed: bool = False                    # 請求是否失敗
+
+    @property
+    def first_byte_latency(self) -> float | None:
+        """ 請求送出到第一個串流資料的延遲（秒） """
+        return (self.first_byte - self.request_sent)/1000 if self.first_byte is not None else None
+
+    @property
+    def total_time(self) -> float | None:
+        """ 請求送出到串流結束的時間（秒） """
+        return (self.end - self.request_sent)/1000 if self.end is not None else None
+
+
+class NetworkCapture:
+    """
+    線路層級的計時：監聽頁面上符合 url_pattern 的 HTTP / SSE / WebSocket 流量，
+    記錄請求送出、第一個串流資料（body 的第一個 chunk / SSE 事件，或第一個 frame）以及串流結束的時間。
+
+    HTTP / SSE 透過 CDP session 的 Network 事件計時：許多 SSE 後端會先送出 200 標頭再開始 prefill，
+    因此第一個位元組以 Network.dataReceived / Network.eventSourceMessageReceived 為準，而不是回應標頭到達的時間。
+    CDP 只支援 Chromium，無法建立 CDP session 時只記錄 WebSocket。
+
+    使用方式：
+    1. await attach() 建立 CDP session 並掛上 websocket 事件
+    2. 每次送出 prompt 前呼叫 begin()
+    3. DOM 端擷取完成後呼叫 collect() 取回這次的 WireTiming
+    """
+    def __init__(self, page: Page, url_pattern: str, timeout: float = 5.0) -> None:
+        """ 初始化 NetworkCapture
+
+        參數:
+            - page (Page): 要監聽的頁面
+            - url_pattern (str): 串流 endpoint 的正規表示式，例如 "/api/chat"
+            - timeout (float, optional): DOM 擷取完成後，最多再等待串流結束多少秒，預設為 5 秒
+        """
+        self.page = page
+        self.pattern = re.compile(url_pattern)
+        self.timeout = timeout
+        self._active = False
+        self._request_id: str = None
+        # CDP 的 timestamp 是單調時鐘（秒），以 requestWillBeSent 的 wallTime 換算成 epoch
+        self._clock_offset: float = 0.0
+        self._current: WireTiming = None
+        self._finished = asyncio.Event()
+        self.cdp_session: CDPSession = None
+
+    async def attach(self) -> None:
+        """ 建立 CDP session 監聽 HTTP / SSE 的網路事件，並掛上 Playwright 的 websocket 事件 """
+        self.page.on("websocket", self._on_websocket)
+        try:
+            self.cdp_session = await self.page.context.new_cdp_session(self.page)
+            await self.cdp_session.send("Network.enable")
+        except Error:
+            self.cdp_session = None
+            return
+        self.cdp_session.on("Network.requestWillBeSent", self._on_request)
+        self.cdp_session.on("Network.dataReceived", self._on_data)
+        self.cdp_session.on("Network.eventSourceMessageReceived", self._on_data)
+        self.cdp_session.on("Network.loadingFinished", self._on_loading_finished)
+        self.cdp_session.on("Network.loadingFailed", self._on_loading_failed)
+
+    def begin(self) -> None:
+        """ 開始記錄一次新的交易 """
+        self._active = True
+        self._request_id = None
+        self._current = None
+        self._finished.clear()
+
+    async def collect(self) -> WireTiming | None:
+        """ 結束這次交易的記錄，回傳 WireTiming（若沒有符合的流量則回傳 None） """
+        try:
+            if self._current is not None and self._current.protocol == "http" and not self._finished.is_set():
+                try:
+                    await asyncio.wait_for(self._finished.wait(), timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    pass
+            return self._current
+        finally:
+            self._active = False
+
+    def _epoch_ms(self, timestamp: float) -> float:
+        return (timestamp + self._clock_offset) * 1000
+
+    def _on_request(self, event: dict) -> None:
+        if not self._active or self._current is not None or not self.pattern.search(event["request"]["url"]):
+            return
+        self._request_id = event["requestId"]
+        self._clock_offset = event["wallTime"] - event["timestamp"]
+        self._current = WireTiming(url=event["request"]["url"], protocol="http", request_sent=self._epoch_ms(event["timestamp"]))
+
+    def _on_data(self, event: dict) -> None:
+        # 第一個 body chunk 或 SSE 事件（回應標頭不算）
+        if event["requestId"] != self._request_id or self._current.first_byte is not None:
+            return
+        if event.get("dataLength", 1) > 0:
+            self._current.first_byte = self._epoch_ms(event["timestamp"])
+
+    def _on_loading_finished(self, event: dict) -> None:
+        if event["requestId"] != self._request_id:
+            return
+        self._current.end = self._epoch_ms(event["timestamp"])
+        self._finished.set()
+
+    def _on_loading_failed(self, event: dict) -> None:
+        if event["requestId"] != self._request_id:
+            return
+        self._current.failed = True
+        self._current.end = self._epoch_ms(event["timestamp"])
+        self._finished.set()
+
+    def _on_websocket(self, websocket: WebSocket) -> None:
+        if not self.pattern.search(websocket.url):
+            return
+        websocket.on("framesent", lambda payload: self._on_ws_frame(websocket, sent=True))
+        websocket.on("framereceived", lambda payload: self._on_ws_frame(websocket, sent=False))
+
+    def _on_ws_frame(self, websocket: WebSocket, sent: bool) -> None:
+        if not self._active:
+            return
+        now = time.time()*1000
+        if sent:
+            # 這次交易第一個送出的 frame 視為請求送出
+            if self._current is None:
+                self._current = WireTiming(url=websocket.url, protocol="websocket", request_sent=now)
+        elif self._current is not None and self._current.protocol == "websocket":
+            if self._current.first_byte is None:
+                self._current.first_byte = now
+            self._current.end = now
+            self._current.frames += 1
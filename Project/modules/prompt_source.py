@@ -0,0 +1,265 @@
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from itertools import accumulate
+from string import Template
+from typing import Any, Dict, Iterator
+import csv
+import io
+import json
+import os
+import random
+
+
+@dataclass
+class Prompt:
+    text: str                           # 套用模板後要送出的內容
+    index: int                          # 在語料中的位置（由 0 開始）
+    prompt_id: str | None = None        # 語料中的識別碼（id_field），未設定時為 None
+    prompt_class: str | None = None     # 分類（class_field），未設定時為 None
+    input_bucket: str | None = None     # 輸入長度分組（length_buckets），未設定時為 None
+
+
+def _resolve_path(path: str) -> str:
+    """ 相對路徑以專案目錄（Project/）為基準 """
+    if os.path.isabs(path):
+        return path
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, "..", path)
+
+
+class PromptCorpus:
+    """
+    Prompt 語料：可從大型 JSONL / CSV 檔案串流讀取，或使用配置中的 test_prompts。
+
+    建立時只掃描檔案一次，記錄每一列的位置（byte offset）、權重與分組，不保留內容；
+    每次抽樣時再 seek 到該列讀取，因此記憶體用量只與列數成正比，與檔案大小無關。
+
+    配置範例（prompt_source 欄位）：
+    "prompt_source": {
+        "path": "prompts/corpus.jsonl",
+        "text_field": "prompt",
+        "id_field": "id",
+        "class_field": "category",
+        "weight_field": "weight",
+        "class_weights": {"chat": 3, "code": 1},
+        "length_buckets": {"short": 200, "medium": 1000, "long": null},
+        "bucket_weights": {"short": 1, "long": 1},
+        "variables": {"city": ["台北", "高雄"], "lang": "中文"},
+        "order": "random",
+        "seed": 42
+    }
+    - 未設定 path 時使用 test_prompts（每個元素可以是字串，或與檔案列相同欄位的物件）
+    - class_weights / bucket_weights 指定各分類 / 長度分組的抽樣比例，未列出的分類不會被抽到；
+      未設定時依各列的 weight_field（預設為 1）自然抽樣
+    - length_buckets 依序為各分組的字元數上限（null 表示無上限）
+    - 模板使用 ${name}：可用的變數為 variables（列表時每次隨機挑選一個）、該列的其他欄位，以及 user（使用者編號）、n（該使用者送出的第幾個 prompt）
+    - CSV 以引號包住的欄位可以包含換行（多行 prompt），索引以完整的記錄為單位
+    - order 為 random（預設，依權重抽樣）或 sequential（依檔案順序，每個使用者從不同的位置開始）
+    - 每個使用者的亂數以 seed 與使用者編號決定，相同的 seed 可以重現相同的 prompt 順序
+    """
+    def __init__(self,
+                 path: str = None,
+                 rows: list[Any] = None,
+                 text_field: str = "prompt",
+                 id_field: str = None,
+                 class_field: str = None,
+                 weight_field: str = None,
+                 class_weights: Dict[str, float] = None,
+                 length_buckets: Dict[str, int | None] = None,
+                 bucket_weights: Dict[str, float] = None,
+                 variables: Dict[str, Any] = None,
+                 order: str = "random",
+                 seed: int | str | None = None) -> None:
+        """ 初始化 PromptCorpus
+
+        參數:
+            - path (str, optional): JSONL 或 CSV（第一列為欄位名稱）檔案路徑
+            - rows (list, optional): 不使用檔案時的 prompt 列表
+            - 其他參數的說明見類別說明
+        """
+        if order not in ("random", "sequential"):
+            raise ValueError(f"不支援的 order: {order}")
+        if path is None and not rows:
+            raise ValueError("prompt_source 需要設定 path 或 test_prompts")
+        self.path = _resolve_path(path) if path else None
+        self.text_field = text_field
+        self.id_field = id_field
+        self.class_field = class_field
+        self.weight_field = weight_field
+        self.class_weights = class_weights
+        self.length_buckets = list((length_buckets or {}).items())
+        self.bucket_weights = bucket_weights
+        self.variables = variables or {}
+        self.order = order
+        self.seed = seed
+        self._rows = rows
+        self._file = None
+        self._csv_header: list[str] = None
+        self._offsets = array("q")
+        self._build_index()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "PromptCorpus | None":
+        """ 依配置的 prompt_source 欄位建立 PromptCorpus，未設定時回傳 None """
+        settings = config.get("prompt_source")
+        if not settings:
+            return None
+        settings = dict(settings)
+        settings.pop("round_size", None)
+        if "path" not in settings:
+            settings["rows"] = config.get("test_prompts")
+        return cls(**settings)
+
+    def __len__(self) -> int:
+        return len(self._rows) if self._rows is not None else len(self._offsets)
+
+    def stream(self, user: int) -> "PromptStream":
+        """ 建立某個使用者（瀏覽器編號）的 prompt 串流 """
+        return PromptStream(self, user)
+
+    def read(self, index: int) -> Dict[str, Any]:
+        """ 讀取第 index 列（回傳欄位字典） """
+        if self._rows is not None:
+            return self._normalize(self._rows[index])
+        self._file.seek(self._offsets[index])
+        return self._parse(self._read_record())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _build_index(self) -> None:
+        """ 掃描一次語料，建立每個分組（分類, 長度分組）的列索引與累積權重 """
+        # 以 array 保存索引與權重（每列 16 bytes）；未設定 weight_field 時不保存權重，組內均勻抽樣
+        groups: Dict[tuple, tuple[array, array]] = {}
+
+        def add(index: int, row: Dict[str, Any]) -> None:
+            key = (self._class_of(row), self._bucket_of(row))
+            indices, weights = groups.setdefault(key, (array("q"), array("d")))
+            indices.append(index)
+            if self.weight_field:
+                weights.append(float(row.get(self.weight_field, 1)))
+
+        if self._rows is not None:
+            for index, row in enumerate(self._rows):
+                add(index, self._normalize(row))
+        else:
+            self._file = open(self.path, "rb")
+            if self.path.lower().endswith(".csv"):
+                self._csv_header = []      # 先設定為 CSV 模式，標題列本身也可能跨行
+                self._csv_header = next(csv.reader(io.StringIO(self._read_record().decode("utf-8-sig"))))
+            offset = self._file.tell()
+            while record := self._read_record():
+                if record.strip():
+                    add(len(self._offsets), self._parse(record))
+                    self._offsets.append(offset)
+                offset += len(record)
+        if not len(self):
+            raise ValueError("prompt 語料是空的")
+
+        # 分組的抽樣權重：預設為各分組的權重總和；指定 class_weights / bucket_weights 時改為指定的比例
+        natural = {key: sum(weights) if self.weight_field else float(len(indices)) for key, (indices, weights) in groups.items()}
+        class_total: Dict[Any, float] = {}
+        bucket_total: Dict[Any, float] = {}
+        for (prompt_class, bucket), total in natural.items():
+            class_total[prompt_class] = class_total.get(prompt_class, 0) + total
+            bucket_total[bucket] = bucket_total.get(bucket, 0) + total
+        self._groups: list[tuple[tuple, array, array | None]] = []
+        group_weights = []
+        for key, (indices, weights) in groups.items():
+            weight = natural[key]
+            if self.class_weights is not None:
+                weight *= self.class_weights.get(key[0], 0) / class_total[key[0]]
+            if self.bucket_weights is not None:
+                weight *= self.bucket_weights.get(key[1], 0) / bucket_total[key[1]]
+            if weight > 0:
+                self._groups.append((key, indices, array("d", accumulate(weights)) if self.weight_field else None))
+                group_weights.append(weight)
+        if not self._groups:
+            raise ValueError("class_weights / bucket_weights 沒有對應到任何 prompt")
+        self._group_cumulative = list(accumulate(group_weights))
+
+    def _sample(self, rng: random.Random) -> int:
+        """ 先依權重抽分組，再依各列的權重抽出一列 """
+        group = self._groups[bisect_right(self._group_cumulative, rng.random() * self._group_cumulative[-1])]
+        _, indices, cumulative = group
+        if cumulative is None:
+            return indices[rng.randrange(len(indices))]
+        position = bisect_right(cumulative, rng.random() * cumulative[-1])
+        return indices[min(position, len(indices) - 1)]
+
+    def _read_record(self) -> bytes:
+        """ 從目前位置讀取一筆記錄：JSONL 為一行；CSV 以引號包住的欄位可以跨行，讀到引號成對為止 """
+        record = self._file.readline()
+        if self._csv_header is not None:
+            # 跳脫的引號（""）成對出現，不影響奇偶；UTF-8 的多位元組字元也不會含有引號的位元組
+            while record.count(b'"') % 2:
+                line = self._file.readline()
+                if not line:
+                    raise ValueError(f"CSV 的引號沒有結束: {record[:80]!r}")
+                record += line
+        return record
+
+    def _parse(self, line: bytes) -> Dict[str, Any]:
+        text = line.decode("utf-8").rstrip("\r\n")
+        if self._csv_header is not None:
+            return dict(zip(self._csv_header, next(csv.reader(io.StringIO(text)))))
+        return self._normalize(json.loads(text))
+
+    def _normalize(self, row: Any) -> Dict[str, Any]:
+        return row if isinstance(row, dict) else {self.text_field: str(row)}
+
+    def _class_of(self, row: Dict[str, Any]) -> str | None:
+        if not self.class_field or row.get(self.class_field) is None:
+            return None
+        return str(row[self.class_field])
+
+    def _bucket_of(self, row: Dict[str, Any]) -> str | None:
+        if not self.length_buckets:
+            return None
+        length = len(row.get(self.text_field, ""))
+        for name, upper in self.length_buckets:
+            if upper is None or length < upper:
+                return name
+        return self.length_buckets[-1][0]
+
+
+class PromptStream:
+    """ 單一使用者的 prompt 串流（亂數以 seed 與使用者編號決定，各使用者互不相同） """
+    def __init__(self, corpus: PromptCorpus, user: int) -> None:
+        self.corpus = corpus
+        self.user = user
+        self.count = 0
+        self._rng = random.Random(f"{corpus.seed}:{user}" if corpus.seed is not None else None)
+        self._position = self._rng.randrange(len(corpus))
+
+    def __iter__(self) -> Iterator[Prompt]:
+        return self
+
+    def __next__(self) -> Prompt:
+        return self.next()
+
+    def next(self) -> Prompt:
+        corpus = self.corpus
+        if corpus.order == "sequential":
+            index = self._position
+            self._position = (self._position + 1) % len(corpus)
+        else:
+            index = corpus._sample(self._rng)
+        row = corpus.read(index)
+        self.count += 1
+        text = str(row.get(corpus.text_field, ""))
+        if "$" in text:
+            variables = {k: v for k, v in row.items() if k != corpus.text_field}
+            for name, value in corpus.variables.items():
+                variables[name] = self._rng.choice(value) if isinstance(value, list) else value
+            variables.update(user=self.user, n=self.count)
+            text = Template(text).safe_substitute(variables)
+        return Prompt(
+            text=text,
+            index=index,
+            prompt_id=str(row[corpus.id_field]) if corpus.id_field and row.get(corpus.id_field) is not None else None,
+            prompt_class=corpus._class_of(row),
+            input_bucket=corpus._bucket_of(row))
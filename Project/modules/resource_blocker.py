@@ -0,0 +1,136 @@
+from playwright.async_api import BrowserContext, Request, Route
+from collections import Counter
+from fnmatch import fnmatch
+from typing import Any, Dict
+import asyncio
+import logging
+
+
+# 可以安全地跨使用者共用的靜態資源類型
+_STATIC_TYPES = ("script", "stylesheet", "font", "image")
+
+
+class ResourceBlocker:
+    """
+    每個 BrowserContext 的請求路由：依資源類型與 URL 樣式攔截不需要的請求（圖片、字型、影片、分析腳本…），
+    並可選擇以所有 context 共用的快取提供靜態資源，避免每個虛擬使用者重複下載相同的 bundle。
+
+    配置範例：
+    "resource_blocking": {
+        "block_types": ["image", "media", "font"],
+        "block_patterns": ["*google-analytics.com*", "*doubleclick.net*"],
+        "allow_patterns": ["*/api/*"],
+        "shared_cache": true
+    }
+    - allow_patterns 優先於所有攔截規則（聊天功能需要的請求）
+    - 樣式使用 fnmatch 語法比對完整 URL
+    """
+    def __init__(self,
+                 block_types: list[str] = None,
+                 block_patterns: list[str] = None,
+                 allow_patterns: list[str] = None,
+                 shared_cache: bool = False,
+                 cache_max_bytes: int = 200 * 1024 * 1024,
+                 logger: logging.Logger = None) -> None:
+        """ 初始化 ResourceBlocker
+
+        參數:
+            - block_types (list[str], optional): 要攔截的資源類型（Playwright 的 resource_type）
+            - block_patterns (list[str], optional): 要攔截的 URL 樣式
+            - allow_patterns (list[str], optional): 一律放行的 URL 樣式
+            - shared_cache (bool, optional): 是否以共用快取提供靜態資源
+            - cache_max_bytes (int, optional): 共用快取的容量上限（bytes），預設為 200 MB
+            - logger (Logger, optional): Logger，預設為 None
+        """
+        self.block_types = set(block_types or [])
+        self.block_patterns = list(block_patterns or [])
+        self.allow_patterns = list(allow_patterns or [])
+        self.shared_cache = shared_cache
+        self.cache_max_bytes = cache_max_bytes
+        self.logger = logger or logging.getLogger(__name__)
+        self.blocked: Counter = Counter()       # 依資源類型統計的攔截次數
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.bytes_saved = 0                    # 由共用快取提供、不需要重新下載的 bytes
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._cache_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], logger: logging.Logger = None) -> "ResourceBlocker | None":
+        """ 依配置的 resource_blocking 欄位建立 ResourceBlocker，未設定時回傳 None """
+        settings = config.get("resource_blocking")
+        if not settings:
+            return None
+        return cls(
+            block_types=settings.get("block_types"),
+            block_patterns=settings.get("block_patterns"),
+            allow_patterns=settings.get("allow_patterns"),
+            shared_cache=settings.get("shared_cache", False),
+            cache_max_bytes=settings.get("cache_max_bytes", 200 * 1024 * 1024),
+            logger=logger)
+
+    async def attach(self, context: BrowserContext) -> None:
+        """ 在 context 上安裝請求路由（需在開啟頁面之前呼叫） """
+        await context.route("**/*", self._handle)
+
+    def report(self) -> Dict[str, Any]:
+        """ 回傳攔截與快取的統計 """
+        return {
+            "blocked": sum(self.blocked.values()),
+            "blocked_by_type": dict(self.blocked),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cached_assets": len(self._cache),
+            "bytes_saved": self.bytes_saved,
+        }
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        if any(fnmatch(url, p) for p in self.allow_patterns):
+            return False
+        return resource_type in self.block_types or any(fnmatch(url, p) for p in self.block_patterns)
+
+    async def _handle(self, route: Route, request: Request) -> None:
+        try:
+            if self.should_block(request.url, request.resource_type):
+                self.blocked[request.resource_type] += 1
+                await route.abort("blockedbyclient")
+            elif self.shared_cache and request.method == "GET" and request.resource_type in _STATIC_TYPES:
+                await self._fulfill_from_cache(route, request.url)
+            else:
+                await route.continue_()
+        except Exception as e:
+            # 頁面關閉時仍在處理中的請求會失敗，不影響測試
+            self.logger.debug(f"請求路由失敗：{request.url} {e}")
+
+    async def _fulfill_from_cache(self, route: Route, url: str) -> None:
+        """ 以共用快取提供靜態資源；同一個 URL 同時有多個請求時只下載一次 """
+        entry = self._cache.get(url)
+        if entry is None and url in self._inflight:
+            entry = await asyncio.shield(self._inflight[url])
+            if entry is None:
+                # 無法快取的資源：各自下載
+                await route.continue_()
+                return
+        if entry is not None:
+            self.cache_hits += 1
+            self.bytes_saved += len(entry["body"])
+            await route.fulfill(status=entry["status"], headers=entry["headers"], body=entry["body"])
+            return
+
+        self.cache_misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        entry = None
+        try:
+            response = await route.fetch()
+            body = await response.body()
+            cache_control = response.headers.get("cache-control", "")
+            if response.status == 200 and "no-store" not in cache_control and self._cache_bytes + len(body) <= self.cache_max_bytes:
+                entry = {"status": response.status, "headers": response.headers, "body": body}
+                self._cache[url] = entry
+                self._cache_bytes += len(body)
+            await route.fulfill(response=response, body=body)
+        finally:
+            del self._inflight[url]
+            future.set_result(entry)
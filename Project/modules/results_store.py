@@ -0,0 +1,338 @@
+from modules.base_test_async import TestResult
+from modules.client_monitor import ClientSample
+from typing import Any, Dict, Iterable
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import numpy as np
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    service TEXT NOT NULL,
+    started_time REAL NOT NULL,
+    finished_time REAL,
+    config TEXT,
+    report TEXT
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    run_id TEXT NOT NULL,
+    service TEXT NOT NULL,
+    browser_index INTEGER,
+    prompt_index INTEGER,
+    prompt_id TEXT,
+    prompt_class TEXT,
+    input_bucket TEXT,
+    is_successful INTEGER NOT NULL,
+    error TEXT,
+    intended_send_time REAL,
+    send_time REAL,
+    first_token_time REAL,
+    completed_time REAL,
+    first_token_latency REAL,
+    total_response_time REAL,
+    generation_time REAL,
+    token_count INTEGER,
+    input_token_count INTEGER,
+    max_stall REAL,
+    time_per_output_token REAL
+);
+CREATE TABLE IF NOT EXISTS client_samples (
+    run_id TEXT NOT NULL,
+    sample_time REAL NOT NULL,
+    host_cpu_percent REAL,
+    host_memory_percent REAL,
+    process_cpu_percent REAL,
+    process_rss INTEGER,
+    loop_lag REAL,
+    pending_tasks INTEGER,
+    active_users INTEGER,
+    browsers TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_run ON transactions (run_id);
+CREATE INDEX IF NOT EXISTS idx_client_samples_run ON client_samples (run_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_service_time ON transactions (service, send_time);
+"""
+
+_INSERT_TRANSACTION = """
+INSERT INTO transactions (
+    run_id, service, browser_index, prompt_index, prompt_id, prompt_class, input_bucket, is_successful, error, intended_send_time,
+    send_time, first_token_time, completed_time, first_token_latency, total_response_time, generation_time, token_count,
+    input_token_count, max_stall, time_per_output_token
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# 可用來分組的欄位（對應的 SQL 表達式）
+GROUP_COLUMNS = {
+    "service": "service",
+    "run_id": "run_id",
+    "date": "date(send_time, 'unixepoch', 'localtime')",
+    "hour": "strftime('%Y-%m-%d %H:00', send_time, 'unixepoch', 'localtime')",
+    "browser_index": "browser_index",
+    "prompt_index": "prompt_index",
+    "prompt_id": "prompt_id",
+    "prompt_class": "prompt_class",
+    "input_bucket": "input_bucket",
+}
+# 舊版資料庫缺少的欄位（開啟時自動補上）
+_ADDED_COLUMNS = {"prompt_id": "TEXT", "prompt_class": "TEXT", "input_bucket": "TEXT", "input_token_count": "INTEGER",
+                  "max_stall": "REAL", "time_per_output_token": "REAL"}
+# 可計算分位數的欄位
+METRIC_COLUMNS = ("first_token_latency", "total_response_time", "generation_time", "token_count", "input_token_count",
+                  "max_stall", "time_per_output_token")
+
+
+def default_store_path() -> str:
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, "..", "results", "results.db")
+
+
+class ResultsStore:
+    """
+    逐筆交易的結果資料庫（SQLite）。
+
+    寫入由獨立的執行緒批次進行：record() 只把資料放進 queue，不會在 event loop 中做任何 I/O，
+    因此不影響計時；每 flush_interval 秒或累積 batch_size 筆時以 executemany 一次寫入。
+    查詢時將欄位一次讀成 numpy 陣列，再以向量化的方式分組計算分位數。
+    """
+    def __init__(self, path: str = None, batch_size: int = 500, flush_interval: float = 1.0) -> None:
+        """ 初始化 ResultsStore
+
+        參數:
+            - path (str, optional): 資料庫路徑，預設為 results/results.db
+            - batch_size (int, optional): 每次寫入的最大筆數
+            - flush_interval (float, optional): 最長多久寫入一次（秒）
+        """
+        self.path = path or default_store_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue()
+        self._writer: threading.Thread = None
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(transactions)")}
+            for column, column_type in _ADDED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE transactions ADD COLUMN {column} {column_type}")
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "ResultsStore | None":
+        """ 依配置的 results_store 欄位建立 ResultsStore：false 表示停用，字串表示資料庫路徑 """
+        setting = config.get("results_store", True)
+        if setting is False:
+            return None
+        return cls(setting if isinstance(setting, str) else None)
+
+    # --------------以下為寫入--------------
+
+    def start_run(self, run_id: str, service: str, config: Dict[str, Any] = None) -> None:
+        """ 記錄測試開始（分散式測試的多個分片使用相同的 run_id，只會記錄一次） """
+        self._put(("INSERT OR IGNORE INTO runs (run_id, service, started_time, config) VALUES (?, ?, ?, ?)",
+                   (run_id, service, time.time(), json.dumps(config, ensure_ascii=False) if config is not None else None)))
+
+    def finish_run(self, run_id: str, report: str = None) -> None:
+        """ 記錄測試結束時間與報告 """
+        self._put(("UPDATE runs SET finished_time = ?, report = COALESCE(?, report) WHERE run_id = ?",
+                   (time.time(), report, run_id)))
+
+    def record(self, run_id: str, service: str, result: TestResult) -> None:
+        """ 記錄一筆交易（非阻塞） """
+        first_token_time = None
+        if result.is_successful and result.first_token_latency:
+            # first_token_latency 在開放式負載模型中是從預計送出時間開始計算
+            first_token_time = (result.intended_send_time or result.send_time) + result.first_token_latency
+        self._put((_INSERT_TRANSACTION, (
+            run_id, service, result.browser_index, result.prompt_index, result.prompt_id, result.prompt_class, result.input_bucket,
+            int(result.is_successful), result.error or None,
+            result.intended_send_time, result.send_time or None, first_token_time, result.completed_time or None,
+            result.first_token_latency if result.is_successful else None,
+            result.total_response_time if result.is_successful else None,
+            result.generation_time if result.is_successful else None,
+            result.token_count if result.is_successful else None,
+            result.input_token_count if result.is_successful else None,
+            result.max_stall if result.is_successful and result.inter_token_latencies else None,
+            result.time_per_output_token if result.is_successful else None,
+        )))
+
+    def record_client_sample(self, run_id: str, sample: ClientSample) -> None:
+        """ 記錄一次測試端資源的取樣（非阻塞） """
+        self._put(("INSERT INTO client_samples VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+            run_id, sample.timestamp, sample.host_cpu_percent, sample.host_memory_percent, sample.process_cpu_percent,
+            sample.process_rss, sample.loop_lag, sample.pending_tasks, sample.active_users,
+            json.dumps(sample.browsers) if sample.browsers else None,
+        )))
+
+    def close(self) -> None:
+        """ 寫入所有尚未寫入的資料並停止寫入執行緒（阻塞） """
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def _put(self, item: tuple[str, tuple]) -> None:
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="results-store", daemon=True)
+            self._writer.start()
+        self._queue.put(item)
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        try:
+            stopped = False
+            while not stopped:
+                try:
+                    batch = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in batch:
+                    stopped = True
+                    batch = [item for item in batch if item is not None]
+                self._write_batch(conn, batch)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _write_batch(conn: sqlite3.Connection, batch: list[tuple[str, tuple]]) -> None:
+        """ 將同一種 SQL 的連續資料合併成一次 executemany，並在同一個交易中寫入 """
+        try:
+            with conn:
+                start = 0
+                while start < len(batch):
+                    sql = batch[start][0]
+                    end = start
+                    while end < len(batch) and batch[end][0] == sql:
+                        end += 1
+                    conn.executemany(sql, [params for _, params in batch[start:end]])
+                    start = end
+        except sqlite3.Error as e:
+            print(f"寫入結果資料庫失敗：{e}")
+
+    def _connect(self) -> sqlite3.Connection:
+        # 分散式測試的多個本機 worker 可能同時寫入同一個資料庫
+        return sqlite3.connect(self.path, timeout=30)
+
+    # --------------以下為查詢--------------
+
+    def list_runs(self, service: str = None, limit: int = 50) -> list[Dict[str, Any]]:
+        """ 列出最近的測試（含每次測試的交易數與失敗數） """
+        sql = """
+            SELECT r.run_id, r.service, r.started_time, r.finished_time,
+                   COUNT(t.run_id) AS transactions, COALESCE(SUM(1 - t.is_successful), 0) AS failed
+            FROM runs r LEFT JOIN transactions t ON t.run_id = r.run_id
+            {where}
+            GROUP BY r.run_id ORDER BY r.started_time DESC LIMIT ?
+        """
+        where, params = ("WHERE r.service = ?", [service]) if service else ("", [])
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(sql.format(where=where), params + [limit])]
+
+    def load_transactions(self, run_id: str) -> list[Dict[str, Any]]:
+        """ 讀取某次測試的所有交易 """
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute("SELECT * FROM transactions WHERE run_id = ? ORDER BY send_time", (run_id,))]
+
+    def load_client_samples(self, run_id: str) -> list[Dict[str, Any]]:
+        """ 讀取某次測試的測試端資源取樣（分散式測試包含所有分片的取樣） """
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = [dict(row) for row in conn.execute("SELECT * FROM client_samples WHERE run_id = ? ORDER BY sample_time", (run_id,))]
+        for row in rows:
+            row["browsers"] = json.loads(row["browsers"]) if row["browsers"] else []
+        return rows
+
+    def length_data(self, service: str = None, run_id: str = None, since: float = None, until: float = None) -> Dict[str, np.ndarray]:
+        """ 讀取成功交易的輸入 / 輸出 token 數、第一個 token 延遲與生成時間（供延遲與長度分析） """
+        conditions, params = self._filters(service, run_id, since, until)
+        conditions.append("is_successful = 1 AND input_token_count IS NOT NULL")
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT input_token_count, token_count, first_token_latency, generation_time FROM transactions "
+                f"WHERE {' AND '.join(conditions)}", params).fetchall()
+        columns = np.array(rows, dtype=np.float64).reshape(-1, 4)
+        return {
+            "input_tokens": columns[:, 0],
+            "output_tokens": columns[:, 1],
+            "first_token_latency": columns[:, 2],
+            "generation_time": columns[:, 3],
+        }
+
+    @staticmethod
+    def _filters(service: str = None, run_id: str = None, since: float = None, until: float = None) -> tuple[list[str], list[Any]]:
+        conditions, params = [], []
+        for column, value, op in (("service", service, "="), ("run_id", run_id, "="), ("send_time", since, ">="), ("send_time", until, "<")):
+            if value is not None:
+                conditions.append(f"{column} {op} ?")
+                params.append(value)
+        return conditions, params
+
+    def percentiles(self,
+                    metric: str = "first_token_latency",
+                    group_by: Iterable[str] = ("service", "date"),
+                    percentiles: Iterable[float] = (50, 90, 95, 99),
+                    service: str = None,
+                    run_id: str = None,
+                    since: float = None,
+                    until: float = None) -> list[Dict[str, Any]]:
+        """
+        依 group_by 分組計算 metric 的分位數、平均值與錯誤率，可跨多次測試查詢。
+
+        參數:
+            - metric (str): METRIC_COLUMNS 之一
+            - group_by (Iterable[str]): GROUP_COLUMNS 中的欄位，例如 ("service", "date")
+            - percentiles (Iterable[float]): 要計算的百分位數（0~100）
+            - service / run_id (str, optional): 只查詢特定服務或特定測試
+            - since / until (float, optional): 送出時間範圍（time.time()，秒）
+        """
+        if metric not in METRIC_COLUMNS:
+            raise ValueError(f"不支援的指標: {metric}，可用的指標：{', '.join(METRIC_COLUMNS)}")
+        group_by = list(group_by)
+        for column in group_by:
+            if column not in GROUP_COLUMNS:
+                raise ValueError(f"不支援的分組欄位: {column}，可用的欄位：{', '.join(GROUP_COLUMNS)}")
+        percentiles = list(percentiles)
+
+        conditions, params = self._filters(service, run_id, since, until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order_sql = ", ".join(GROUP_COLUMNS[c] for c in group_by) or "'all'"
+        # 分組在 SQL 中完成：DENSE_RANK 為每一列標上分組編號並依編號排序，分組鍵另外以 DISTINCT 查詢（排序相同）；
+        # 兩次查詢在同一個讀取交易中，寫入執行緒同時寫入也不會讓分組數不一致
+        with self._connect() as conn:
+            conn.execute("BEGIN")
+            rows = conn.execute(
+                f"SELECT DENSE_RANK() OVER (ORDER BY {order_sql}) - 1 AS grp, {metric}, is_successful "
+                f"FROM transactions {where} ORDER BY grp", params).fetchall()
+            keys = conn.execute(f"SELECT DISTINCT {order_sql} FROM transactions {where} ORDER BY {order_sql}", params).fetchall()
+        if not rows:
+            return []
+
+        # 整批轉成 numpy 陣列（NULL 轉為 nan），依分組編號切成連續的區段
+        columns = np.array(rows, dtype=np.float64)
+        values = columns[:, 1]
+        successful = columns[:, 2].astype(bool)
+        boundaries = np.flatnonzero(np.diff(columns[:, 0])) + 1
+        groups = np.split(np.arange(len(rows)), boundaries)
+
+        summary = []
+        for key, indices in zip(keys, groups):
+            group_values = values[indices][successful[indices] & ~np.isnan(values[indices])]
+            row = dict(zip(group_by or ["all_rows"], key))
+            row["transactions"] = int(indices.size)
+            row["error_rate"] = float(1 - successful[indices].mean())
+            row["mean"] = float(group_values.mean()) if group_values.size else None
+            computed = np.percentile(group_values, percentiles) if group_values.size else [None] * len(percentiles)
+            for q, value in zip(percentiles, computed):
+                row[f"p{q:g}"] = float(value) if value is not None else None
+            summary.append(row)
+        return summary
@@ -0,0 +1,28 @@
+import importlib
+import os
+from modules.base_runner import BaseTestRunner
+
+
+def get_runner_class(runner_name: str) -> type[BaseTestRunner]:
+    """
+    依 runner 名稱載入客製化的測試執行器，找不到時使用基礎執行器。
+
+    客製化執行器放在 services/{runner_name}_runner.py，
+    類別名稱為 {RunnerName}TestRunner（runner_name.title()）。
+    """
+    services_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services")
+    runner_path = os.path.join(services_dir, f"{runner_name}_runner.py")
+    if not os.path.exists(runner_path):
+        print(f"使用預設執行器")
+        return BaseTestRunner
+    try:
+        # 動態導入對應的 runner 模組
+        module = importlib.import_module(f"services.{runner_name}_runner")
+        # 獲取 runner 類別（類別名稱為 {RunnerName}TestRunner）
+        runner_class = getattr(module, f"{runner_name.title()}TestRunner")
+        print(f"使用 {runner_name} 的客製化測試執行器")
+        return runner_class
+    except (ImportError, AttributeError) as e:
+        print(f"載入 {runner_name} 的客製化執行器時發生錯誤: {e}")
+        print("使用預設執行器")
+        return BaseTestRunner
@@ -0,0 +1,123 @@
+from playwright.async_api import Page, Playwright
+from fnmatch import fnmatch
+from typing import Any, Awaitable, Callable, Dict
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+
+
+def default_state_dir() -> str:
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, "..", "storage_states")
+
+
+class SessionBootstrap:
+    """
+    登入一次、分發給所有虛擬使用者：在測試開始前（計時範圍外）為每個帳號登入一次，
+    將 Playwright 的 storage state（cookies 與 localStorage）快取在磁碟上，並在建立每個 context 時注入。
+
+    - login_accounts 設定多組帳號時，虛擬使用者以 round-robin 分配到各帳號
+    - 快取的 storage state 超過 storage_state_ttl 秒或 cookie 已過期時重新登入
+    - 測試中偵測到工作階段過期（頁面被導回登入頁）時自動重新登入，同一個帳號只會登入一次
+    """
+    def __init__(self,
+                 playwright: Playwright,
+                 config: Dict[str, Any],
+                 login: Callable[[Page, Dict[str, Any]], Awaitable[bool]],
+                 logger: logging.Logger = None,
+                 state_dir: str = None) -> None:
+        """ 初始化 SessionBootstrap
+
+        參數:
+            - playwright (Playwright): 已啟動的 playwright 實例
+            - config (dict): 測試配置
+            - login (Callable): 登入函式，參數為 (page, 帳號配置)，成功時回傳 True（通常是 BaseTestRunner.login）
+            - logger (Logger, optional): Logger，預設為 None
+            - state_dir (str, optional): storage state 的快取目錄，預設為 storage_states/
+        """
+        self.playwright = playwright
+        self.config = config
+        self.login = login
+        self.logger = logger or logging.getLogger(__name__)
+        self.state_dir = state_dir or default_state_dir()
+        self.ttl = config.get("storage_state_ttl", 3600)
+        # 每組帳號的配置（帳號密碼覆寫到測試配置上，供 login_helper 使用）
+        self.accounts = [dict(config, **account) for account in config.get("login_accounts", [])] or [dict(config)]
+        self.state_paths: list[str] = [self._state_path(idx, account) for idx, account in enumerate(self.accounts)]
+        self.logins = 0
+        self._generations = [0] * len(self.accounts)
+        self._locks = [asyncio.Lock() for _ in self.accounts]
+
+    async def prepare(self) -> None:
+        """ 為每個帳號準備有效的 storage state（有效的快取直接使用） """
+        os.makedirs(self.state_dir, exist_ok=True)
+        for idx in range(len(self.accounts)):
+            if self._is_valid(self.state_paths[idx]):
+                self.logger.info(f"使用快取的登入狀態：{os.path.basename(self.state_paths[idx])}")
+            else:
+                await self._authenticate(idx)
+
+    def account_for(self, browser_number: int) -> int:
+        """ 虛擬使用者（瀏覽器編號由 1 開始）對應的帳號索引 """
+        return (browser_number - 1) % len(self.accounts)
+
+    def state_for(self, account_idx: int) -> tuple[str, int]:
+        """ 回傳帳號目前的 storage state 路徑與版本（版本用來判斷是否已被其他使用者重新登入） """
+        return self.state_paths[account_idx], self._generations[account_idx]
+
+    def is_expired(self, url: str) -> bool:
+        """ 依目前的網址判斷工作階段是否過期（被導回登入頁） """
+        pattern = self.config.get("session_expired_pattern")
+        if pattern:
+            return fnmatch(url, pattern)
+        login_url = self.config.get("login_url")
+        return bool(login_url) and url.startswith(login_url)
+
+    async def refresh(self, account_idx: int, generation: int) -> None:
+        """
+        工作階段過期時重新登入。多個使用者同時偵測到同一個帳號過期時，只有第一個會重新登入，
+        其他使用者等待後直接使用新的 storage state。
+        """
+        async with self._locks[account_idx]:
+            if self._generations[account_idx] != generation:
+                return
+            self.logger.info(f"帳號 {account_idx+1} 的工作階段已過期，重新登入")
+            await self._authenticate(account_idx)
+
+    async def _authenticate(self, idx: int) -> None:
+        """ 以獨立的瀏覽器登入，並將 storage state 寫入快取 """
+        # 手動登入需要顯示瀏覽器視窗
+        headless = self.config.get("headless", False) and self.config.get("login_method") != "manual"
+        account = dict(self.accounts[idx], headless=headless)
+        browser = await self.playwright.chromium.launch(headless=headless)
+        try:
+            context = await browser.new_context()
+            page = await context.new_page()
+            start_time = time.time()
+            if not await self.login(page, account):
+                raise RuntimeError(f"帳號 {idx+1} 登入失敗")
+            await context.storage_state(path=self.state_paths[idx])
+            self.logins += 1
+            self._generations[idx] += 1
+            self.logger.info(f"帳號 {idx+1} 登入完成（{time.time() - start_time:.2f} 秒），已儲存登入狀態")
+        finally:
+            await browser.close()
+
+    def _is_valid(self, path: str) -> bool:
+        """ 快取存在、未超過 ttl，且沒有已過期的 cookie """
+        if not os.path.exists(path) or time.time() - os.path.getmtime(path) > self.ttl:
+            return False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return False
+        now = time.time()
+        return not any(0 < cookie.get("expires", -1) < now for cookie in state.get("cookies", []))
+
+    def _state_path(self, idx: int, account: Dict[str, Any]) -> str:
+        key = re.sub(r"[^\w.-]", "_", str(account.get("username") or idx))
+        return os.path.join(self.state_dir, f"{self.config['name']}_{key}.json")
@@ -0,0 +1,351 @@
+"""
+SLA 判定：依配置的服務目標（SLO）在測試進行中持續檢查，並在結果已有統計上的定論時提前結束測試。
+
+每個目標寫成「指標 比較運算子 門檻」，例如 "p95_first_token_time < 3"、"failed_rate < 1"、"tokens_per_second > 20"。
+
+- 分位數（pXX_、median_、max_）與比例（failed_rate、stall_rate）：每筆交易視為一次「符合 / 不符合」的試驗，
+  以 Wald 的序貫機率比檢定（SPRT）比較「符合比例 = 目標比例 + indifference」與「= 目標比例 - indifference」，
+  對數概似比越過邊界時即判定通過或失敗（兩種錯誤率皆為 1 - confidence）
+- 平均值（mean_）與 tokens_per_second：以常態近似的單邊信賴界，整個信賴界落在門檻同一側時判定
+- 至少累積 min_transactions 筆交易後才會判定；測試結束時仍未判定的目標，以觀察值與門檻比較（settled 為 false）
+"""
+from utils.streaming_stats import StreamingHistogram
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Any, Dict
+import math
+import operator
+import re
+
+
+# 指標名稱中的欄位（與報告的欄位名稱一致）對應到 TestResult 的屬性
+FIELDS = {
+    "first_token_time": "first_token_latency",
+    "total_response_time": "total_response_time",
+    "generation_time": "generation_time",
+    "time_per_output_token": "time_per_output_token",
+    "max_stall": "max_stall",
+    "wire_first_token_time": "wire_first_token_latency",
+}
+OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+_OBJECTIVE_PATTERN = re.compile(r"^\s*([\w.]+)\s*(<=|>=|<|>)\s*([-+]?[\d.]+(?:[eE][-+]?\d+)?)\s*$")
+_METRIC_PATTERN = re.compile(r"^(?:p(\d+(?:\.\d+)?)|(median)|(mean)|(max))_(\w+)$")
+
+
+@dataclass
+class Objective:
+    metric: str                 # 指標名稱，例如 p95_first_token_time
+    op: str                     # 比較運算子：< <= > >=
+    threshold: float            # 門檻（時間為秒，比例為百分比）
+    kind: str                   # percentile / rate / mean / ratio
+    field: str | None = None    # TestResult 的屬性（percentile / mean）
+    quantile: float | None = None  # 百分位數（percentile）
+
+    def __str__(self) -> str:
+        return f"{self.metric} {self.op} {self.threshold:g}"
+
+
+def parse_objective(spec: str | Dict[str, Any]) -> Objective:
+    """
+    解析單一目標，可以是字串 "p95_first_token_time < 3"，
+    或物件 {"metric": "p95_first_token_time", "op": "<", "threshold": 3}。
+    """
+    if isinstance(spec, str):
+        match = _OBJECTIVE_PATTERN.match(spec)
+        if match is None:
+            raise ValueError(f"無法解析 SLA 目標：{spec}")
+        metric, op, threshold = match.groups()
+    else:
+        metric, op, threshold = spec["metric"], spec.get("op", "<"), spec["threshold"]
+    if op not in OPERATORS:
+        raise ValueError(f"不支援的比較運算子：{op}")
+    threshold = float(threshold)
+    if metric in ("failed_rate", "stall_rate"):
+        return Objective(metric, op, threshold, "rate")
+    if metric == "tokens_per_second":
+        return Objective(metric, op, threshold, "ratio")
+    match = _METRIC_PATTERN.match(metric)
+    if match is None or match.group(5) not in FIELDS:
+        raise ValueError(f"不支援的 SLA 指標：{metric}（可用 failed_rate、stall_rate、tokens_per_second，"
+                         f"或 pXX_ / median_ / mean_ / max_ 加上 {', '.join(FIELDS)}）")
+    quantile, median, mean, maximum, name = match.groups()
+    if mean:
+        return Objective(metric, op, threshold, "mean", field=FIELDS[name])
+    quantile = 50.0 if median else 100.0 if maximum else float(quantile)
+    if not 0 < quantile <= 100:
+        raise ValueError(f"百分位數必須介於 0 與 100 之間：{metric}")
+    return Objective(metric, op, threshold, "percentile", field=FIELDS[name], quantile=quantile)
+
+
+class _ObjectiveState:
+    """ 單一目標的累計狀態（固定記憶體） """
+    def __init__(self, objective: Objective, stall_threshold: float) -> None:
+        self.objective = objective
+        self.stall_threshold = stall_threshold
+        self.compare = OPERATORS[objective.op]
+        self.good = 0
+        self.bad = 0
+        # 符合目標的交易比例至少要達到 target 才算通過（percentile / rate）
+        lower = objective.op in ("<", "<=")
+        if objective.kind == "percentile":
+            self.target = objective.quantile / 100 if lower else 1 - objective.quantile / 100
+        elif objective.kind == "rate":
+            self.target = 1 - objective.threshold / 100 if lower else objective.threshold / 100
+        self.histogram = StreamingHistogram() if objective.kind == "percentile" else None
+        # mean：Welford 累計；ratio：token 數與生成時間的累計和
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.sums = [0.0] * 5   # Σx（生成時間）、Σy（token 數）、Σx²、Σy²、Σxy
+
+    def add(self, result) -> None:
+        objective = self.objective
+        if objective.kind == "rate":
+            if objective.metric == "failed_rate":
+                event = not result.is_successful
+            else:
+                if not result.is_successful:
+                    return
+                event = result.max_stall > self.stall_threshold
+            # rate < 門檻時「沒有發生」才算符合，rate > 門檻時反之
+            if event != (objective.op in ("<", "<=")):
+                self.good += 1
+            else:
+                self.bad += 1
+            return
+        if not result.is_successful:
+            return
+        if objective.kind == "ratio":
+            x, y = result.generation_time, float(result.token_count)
+            if x <= 0:
+                return
+            self.n += 1
+            for i, value in enumerate((x, y, x * x, y * y, x * y)):
+                self.sums[i] += value
+            return
+        value = getattr(result, objective.field)
+        if value is None or (objective.field == "first_token_latency" and value <= 0):
+            return
+        if objective.kind == "mean":
+            self.n += 1
+            delta = value - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (value - self.mean)
+            return
+        self.histogram.add(value)
+        if self.compare(value, objective.threshold):
+            self.good += 1
+        else:
+            self.bad += 1
+
+    @property
+    def samples(self) -> int:
+        return self.good + self.bad if self.objective.kind in ("percentile", "rate") else self.n
+
+    def observed(self) -> float | None:
+        """ 目前的觀察值（與報告的單位相同） """
+        kind = self.objective.kind
+        if kind == "percentile":
+            return self.histogram.percentile(self.objective.quantile)
+        if kind == "rate":
+            if not self.samples:
+                return None
+            events = self.bad if self.objective.op in ("<", "<=") else self.good
+            return events / self.samples * 100
+        if kind == "mean":
+            return self.mean if self.n else None
+        return self.sums[1] / self.sums[0] if self.n else None
+
+    def decide(self, confidence: float, indifference: float) -> str | None:
+        """ 序貫檢定：回傳 "pass" / "fail"，尚無定論時回傳 None """
+        alpha = 1 - confidence
+        if self.objective.kind in ("percentile", "rate"):
+            if self.target >= 1:
+                # 要求全部符合（例如 max_ 或 failed_rate < 0）：出現一筆不符合即失敗，否則要到測試結束才能確定
+                return "fail" if self.bad else None
+            if self.target <= 0:
+                return "pass"
+            delta = min(indifference, self.target / 2, (1 - self.target) / 2)
+            p0, p1 = self.target - delta, self.target + delta
+            llr = self.good * math.log(p1 / p0) + self.bad * math.log((1 - p1) / (1 - p0))
+            if llr >= math.log((1 - alpha) / alpha):
+                return "pass"
+            if llr <= math.log(alpha / (1 - alpha)):
+                return "fail"
+            return None
+        if self.n < 2:
+            return None
+        estimate, error = self._standard_error()
+        z = NormalDist().inv_cdf(confidence)
+        low, high = estimate - z * error, estimate + z * error
+        threshold, lower = self.objective.threshold, self.objective.op in ("<", "<=")
+        if (high < threshold) if lower else (low > threshold):
+            return "pass"
+        if (low > threshold) if lower else (high < threshold):
+            return "fail"
+        return None
+
+    def interval(self, confidence: float) -> tuple[float, float] | None:
+        """ 觀察值的雙邊信賴區間（分位數以順序統計量、比例以 Wilson、平均值與 tokens/s 以常態近似），資料不足時回傳 None """
+        z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+        kind, n = self.objective.kind, self.samples
+        if kind == "percentile":
+            q = self.objective.quantile / 100
+            count = self.histogram.count
+            if count < 2 or q >= 1:
+                return None
+            spread = z * math.sqrt(count * q * (1 - q))
+            low_rank, high_rank = max(count * q - spread, 0), min(count * q + spread + 1, count)
+            return self.histogram.percentile(low_rank / count * 100), self.histogram.percentile(high_rank / count * 100)
+        if kind == "rate":
+            if not n:
+                return None
+            p = self.observed() / 100
+            center = (p + z * z / (2 * n)) / (1 + z * z / n)
+            half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+            return max(center - half, 0.0) * 100, min(center + half, 1.0) * 100
+        if self.n < 2:
+            return None
+        estimate, error = self._standard_error()
+        return estimate - z * error, estimate + z * error
+
+    def _standard_error(self) -> tuple[float, float]:
+        """ 平均值或 tokens/s 的估計值與標準誤 """
+        if self.objective.kind == "mean":
+            return self.mean, math.sqrt(self.m2 / (self.n - 1) / self.n)
+        # 比例估計量 Σy/Σx 的標準誤（delta method）
+        sx, sy, sxx, syy, sxy = self.sums
+        estimate = sy / sx
+        residual = max(syy - 2 * estimate * sxy + estimate * estimate * sxx, 0.0)
+        return estimate, math.sqrt(residual / (self.n - 1) / self.n) / (sx / self.n)
+
+
+class SlaMonitor:
+    """
+    測試進行中持續檢查 SLA 目標（由 runner 的 result listener 逐筆餵入交易結果）。
+
+    配置範例（sla 欄位，也可以直接寫成目標列表）：
+    "sla": {
+        "objectives": ["p95_first_token_time < 3", "failed_rate < 1", "tokens_per_second > 20"],
+        "confidence": 0.95,
+        "indifference": 0.02,
+        "min_transactions": 20,
+        "early_stop": true
+    }
+    - indifference 為比例檢定的無差異區間（例如 p95 時比較符合比例 97% 與 93%），越小越精確，但需要越多交易才能判定
+    - early_stop 為 true 時，任一目標判定失敗、或所有目標都判定通過，即提前結束測試
+    """
+    def __init__(self,
+                 objectives: list[str | Dict[str, Any]],
+                 confidence: float = 0.95,
+                 indifference: float = 0.02,
+                 min_transactions: int = 20,
+                 early_stop: bool = True,
+                 stall_threshold: float = 1.0) -> None:
+        """ 初始化 SlaMonitor
+
+        參數:
+            - objectives (list): 目標列表（格式見 parse_objective）
+            - confidence (float, optional): 信賴水準，預設為 0.95
+            - indifference (float, optional): 比例檢定的無差異區間，預設為 0.02
+            - min_transactions (int, optional): 開始判定前至少需要的交易數，預設為 20
+            - early_stop (bool, optional): 判定後是否提前結束測試，預設為 True
+            - stall_threshold (float, optional): stall_rate 的停頓門檻（秒），預設為 1 秒
+        """
+        if not objectives:
+            raise ValueError("sla 至少需要一個目標")
+        if not 0.5 < confidence < 1:
+            raise ValueError("confidence 必須介於 0.5 與 1 之間")
+        self.objectives = [parse_objective(spec) for spec in objectives]
+        self.confidence = confidence
+        self.indifference = indifference
+        self.min_transactions = min_transactions
+        self.early_stop = early_stop
+        self.transactions = 0
+        # 提前結束時的交易數（未提前結束時為 None）
+        self.stopped_after: int | None = None
+        self._states = [_ObjectiveState(objective, stall_threshold) for objective in self.objectives]
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "SlaMonitor | None":
+        """ 依配置的 sla 欄位建立 SlaMonitor，未設定時回傳 None """
+        settings = config.get("sla")
+        if not settings:
+            return None
+        if isinstance(settings, list):
+            settings = {"objectives": settings}
+        return cls(stall_threshold=config.get("stall_threshold", 1.0), **settings)
+
+    def on_result(self, result) -> None:
+        """ 收到一筆交易結果 """
+        self.transactions += 1
+        for state in self._states:
+            state.add(result)
+
+    def decisions(self) -> list[str | None]:
+        """ 每個目標目前的判定（"pass" / "fail" / None） """
+        if self.transactions < self.min_transactions:
+            return [None] * len(self._states)
+        return [state.decide(self.confidence, self.indifference) for state in self._states]
+
+    @property
+    def settled(self) -> bool:
+        """ 整體結果是否已有定論：任一目標判定失敗，或所有目標都判定通過 """
+        decisions = self.decisions()
+        return "fail" in decisions or all(d == "pass" for d in decisions)
+
+    def mark_stopped(self) -> None:
+        self.stopped_after = self.transactions
+
+    def verdict(self, stats: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        產生最終判定。尚未判定的目標以觀察值與門檻比較；
+        stats 為報告的統計數據，有對應欄位時以報告的數值作為觀察值（例如分散式測試合併後的結果）。
+
+        回傳：
+        - dict: verdict（"pass" / "fail"）、early_stopped、stopped_after（提前結束時的交易數）、transactions、confidence、
+          objectives（每個目標的判定、觀察值與信賴區間）
+        """
+        results = []
+        for state, decision in zip(self._states, self.decisions()):
+            objective = state.objective
+            observed = stats.get(objective.metric) if stats and stats.get(objective.metric) is not None else state.observed()
+            status = decision
+            if status is None:
+                status = "pass" if observed is not None and OPERATORS[objective.op](observed, objective.threshold) else "fail"
+            results.append({
+                "objective": str(objective),
+                "metric": objective.metric,
+                "op": objective.op,
+                "threshold": objective.threshold,
+                "observed": float(observed) if observed is not None else None,
+                "interval": state.interval(self.confidence),
+                "status": status,
+                "settled": decision is not None,
+                "samples": state.samples,
+            })
+        return {
+            "verdict": "fail" if any(r["status"] == "fail" for r in results) else "pass",
+            "early_stopped": self.stopped_after is not None,
+            "stopped_after": self.stopped_after,
+            "transactions": self.transactions,
+            "confidence": self.confidence,
+            "objectives": results,
+        }
+
+
+def format_verdict(verdict: Dict[str, Any]) -> str:
+    """ 將判定結果格式化為報告文字 """
+    lines = ["=========== SLA 判定 ==========="]
+    for objective in verdict["objectives"]:
+        observed = f"{objective['observed']:.3f}" if objective["observed"] is not None else "-"
+        if objective["interval"] is not None:
+            observed += f"（{verdict['confidence']:.0%} CI [{objective['interval'][0]:.3f}, {objective['interval'][1]:.3f}]）"
+        settled = f"已判定（{verdict['confidence']:.0%} 信賴）" if objective["settled"] else "未達統計定論，依觀察值判定"
+        lines.append(f"{objective['objective']}：{'通過' if objective['status'] == 'pass' else '失敗'}，"
+                     f"觀察值 {observed}，樣本數 {objective['samples']}，{settled}")
+    summary = f"整體結果：{ {'pass': '通過', 'invalid': '無效（測試端超出能力）'}.get(verdict['verdict'], '失敗') }"
+    if verdict["early_stopped"]:
+        summary += f"（於第 {verdict['stopped_after']} 筆交易後已有定論，提前結束）"
+    lines.append(summary)
+    return "\n".join(lines)
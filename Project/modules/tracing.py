@@ -0,0 +1,231 @@
+"""
+交易的階段追蹤（span）：把每次交易拆成等待輸入框、輸入、送出、等待新回應、等待穩定、計算 token、寫日誌等階段，
+匯出成 Chrome trace event JSON（chrome://tracing、Perfetto）或 OTLP JSON 檔，用來檢查時間花在測試端還是服務端。
+
+- 依 sample_rate 抽樣整筆交易，未抽中的交易使用 NULL_SPAN，幾乎沒有額外成本
+- span 只保存在記憶體中（最多 max_transactions 筆交易），測試結束時一次寫檔
+"""
+from typing import Any, Dict
+import json
+import os
+import random
+import time
+import numpy as np
+
+
+class Span:
+    """ 一個階段的起訖時間與屬性；交易本身是最外層的 span，各階段以 span() 建立子 span 並用 with 計時 """
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "start", "end", "attributes", "error")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: str = None, attributes: Dict[str, Any] = None) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = tracer._new_id(64)
+        self.parent_id = parent_id
+        self.start = time.time_ns()
+        self.end: int = None
+        self.attributes = attributes or {}
+        self.error: str = None
+
+    def span(self, name: str, **attributes) -> "Span":
+        """ 建立子 span（以 with 使用，離開時結束計時） """
+        return Span(self.tracer, name, self.trace_id, self.span_id, attributes)
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self, error: str = None, **attributes) -> None:
+        """ 結束 span 並交給 tracer 保存 """
+        self.end = time.time_ns()
+        self.error = error or self.error
+        self.attributes.update(attributes)
+        self.tracer._spans.append(self)
+
+    def __enter__(self) -> "Span":
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.finish(exc_type.__name__ if exc_type is not None else None)
+        return False
+
+
+class _NullSpan:
+    """ 未抽樣的交易：所有操作都不做事 """
+    __slots__ = ()
+
+    def span(self, name: str, **attributes) -> "_NullSpan":
+        return self
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def finish(self, error: str = None, **attributes) -> None:
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    配置範例（tracing 欄位，設定為 true 時使用預設值）：
+    "tracing": {
+        "sample_rate": 0.1,
+        "format": "chrome",
+        "path": "results/traces/trace.json",
+        "max_transactions": 10000
+    }
+    """
+    def __init__(self,
+                 service_name: str,
+                 path: str = None,
+                 format: str = "chrome",
+                 sample_rate: float = 0.1,
+                 max_transactions: int = 10000,
+                 seed: int = None) -> None:
+        """ 初始化 Tracer
+
+        參數:
+            - service_name (str): 服務名稱（OTLP 的 service.name）
+            - path (str, optional): 輸出檔路徑，預設為 results/traces/trace_{run_id}.json（由 export 決定）
+            - format (str, optional): "chrome"（Chrome trace event JSON）或 "otlp"（OTLP JSON），預設為 "chrome"
+            - sample_rate (float, optional): 交易的抽樣比例（0~1），預設為 0.1
+            - max_transactions (int, optional): 最多保存幾筆交易，超過後不再抽樣
+            - seed (int, optional): 抽樣與 id 的亂數種子
+        """
+        if format not in ("chrome", "otlp"):
+            raise ValueError(f"不支援的追蹤格式: {format}，可用的格式：chrome、otlp")
+        self.service_name = service_name
+        self.path = path
+        self.format = format
+        self.sample_rate = sample_rate
+        self.max_transactions = max_transactions
+        self.transactions = 0
+        self._random = random.Random(seed)
+        self._spans: list[Span] = []
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], service_name: str) -> "Tracer | None":
+        """ 依配置的 tracing 欄位建立 Tracer，未設定或為 false 時回傳 None """
+        settings = config.get("tracing")
+        if not settings:
+            return None
+        return cls(service_name, **(settings if isinstance(settings, dict) else {}))
+
+    def _new_id(self, bits: int) -> str:
+        return f"{self._random.getrandbits(bits):0{bits // 4}x}"
+
+    def transaction(self, name: str = "transaction", **attributes) -> Span | _NullSpan:
+        """ 開始一筆交易的追蹤；未抽中時回傳 NULL_SPAN（呼叫端結束時以 finish() 結束） """
+        if self.transactions >= self.max_transactions or self._random.random() >= self.sample_rate:
+            return NULL_SPAN
+        self.transactions += 1
+        return Span(self, name, self._new_id(128), attributes=attributes)
+
+    # --------------以下為匯出--------------
+
+    def export(self, path: str = None) -> str | None:
+        """ 將所有 span 寫成檔案（阻塞，可在背景執行緒呼叫），沒有 span 時不寫檔並回傳 None """
+        path = path or self.path
+        if not self._spans or not path:
+            return None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        data = self._chrome_trace() if self.format == "chrome" else self._otlp()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        return path
+
+    def _chrome_trace(self) -> Dict[str, Any]:
+        """ Chrome trace event 格式：每個虛擬使用者一條 thread，span 以 complete event（ph = X）表示，巢狀關係由時間決定 """
+        origin = min(span.start for span in self._spans)
+        # 子 span 沿用所屬交易的使用者編號
+        trace_users = {span.trace_id: span.attributes.get("user") for span in self._spans if span.parent_id is None}
+        users = {}
+        events = []
+        for span in self._spans:
+            tid = users.setdefault(trace_users.get(span.trace_id), len(users) + 1)
+            args = dict(span.attributes, span_id=span.span_id, trace_id=span.trace_id)
+            if span.error:
+                args["error"] = span.error
+            events.append({"name": span.name, "cat": "transaction" if span.parent_id is None else "phase", "ph": "X",
+                           "ts": (span.start - origin) / 1000, "dur": (span.end - span.start) / 1000,
+                           "pid": 1, "tid": tid, "args": args})
+        events.append({"name": "process_name", "ph": "M", "pid": 1, "args": {"name": self.service_name}})
+        for user, tid in users.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": f"使用者 {user}"}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def _otlp(self) -> Dict[str, Any]:
+        """ OTLP JSON 格式（ExportTraceServiceRequest），可用 OpenTelemetry collector 的 file receiver 或 Jaeger 等匯入 """
+        spans = []
+        for span in self._spans:
+            item = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start),
+                "endTimeUnixNano": str(span.end),
+                "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items() if value is not None],
+                "status": {"code": 2, "message": span.error} if span.error else {},
+            }
+            if span.parent_id is not None:
+                item["parentSpanId"] = span.parent_id
+            spans.append(item)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "ai-load-test"}, "spans": spans}],
+        }]}
+
+    def summary(self) -> Dict[str, Any] | None:
+        """
+        依階段名稱彙整 span 的時間。
+
+        回傳：
+        - dict: transactions（抽樣的交易數）、phases（每個階段的 count、mean、p95、total，單位為秒，
+          share 為佔所有抽樣交易總時間的比例）；沒有 span 時回傳 None
+        """
+        if not self._spans:
+            return None
+        durations: Dict[str, list[float]] = {}
+        for span in self._spans:
+            durations.setdefault(span.name, []).append((span.end - span.start) / 1e9)
+        total = sum((s.end - s.start) / 1e9 for s in self._spans if s.parent_id is None)
+        phases = []
+        for name, values in durations.items():
+            values = np.array(values)
+            phases.append({"name": name, "count": int(values.size), "mean": float(values.mean()),
+                           "p95": float(np.percentile(values, 95)), "total": float(values.sum()),
+                           "share": float(values.sum() / total) if total > 0 else None})
+        return {"transactions": self.transactions, "sample_rate": self.sample_rate, "phases": phases}
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def format_trace_summary(summary: Dict[str, Any], path: str = None) -> str:
+    """ 將階段追蹤的彙整結果格式化為報告文字 """
+    lines = ["=========== 階段追蹤 ===========",
+             f"抽樣交易數：{summary['transactions']}（抽樣比例 {summary['sample_rate']:.0%}）"]
+    for phase in summary["phases"]:
+        share = f"，佔 {phase['share']:.1%}" if phase["share"] is not None else ""
+        lines.append(f"{phase['name']}：{phase['count']} 次，平均 {phase['mean']*1000:.1f} 毫秒，"
+                     f"p95 {phase['p95']*1000:.1f} 毫秒{share}")
+    if path:
+        lines.append(f"追蹤檔：{path}")
+    return "\n".join(lines)
@@ -0,0 +1,88 @@
+import argparse
+from datetime import datetime
+from modules.latency_analysis import analyze_lengths, format_length_analysis
+from modules.results_store import GROUP_COLUMNS, METRIC_COLUMNS, ResultsStore
+
+def parse_date(value: str) -> float:
+    """ 將 YYYY-MM-DD 或 YYYY-MM-DDTHH:MM 轉換為 time.time() 格式 """
+    return datetime.fromisoformat(value).timestamp()
+
+def format_value(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+def print_table(rows: list[dict]) -> None:
+    """ 以對齊的表格輸出查詢結果 """
+    if not rows:
+        print("沒有符合條件的資料")
+        return
+    columns = list(rows[0].keys())
+    cells = [[format_value(row[c]) for c in columns] for row in rows]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(r, widths)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='查詢逐筆交易的結果資料庫')
+    parser.add_argument('--db', help='資料庫路徑 (預設: results/results.db)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    # 列出最近的測試
+    runs_parser = subparsers.add_parser('runs', help='列出最近的測試')
+    runs_parser.add_argument('--service', help='只列出特定服務')
+    runs_parser.add_argument('--limit', type=int, default=20, help='最多列出幾筆 (預設: 20)')
+
+    # 跨測試的分位數
+    percentiles_parser = subparsers.add_parser('percentiles', help='分組計算延遲分位數')
+    percentiles_parser.add_argument('--metric', choices=METRIC_COLUMNS, default='first_token_latency', help='指標 (預設: first_token_latency)')
+    percentiles_parser.add_argument('--by', default='service,date', help=f'分組欄位，以逗號分隔，可用：{",".join(GROUP_COLUMNS)} (預設: service,date)')
+    percentiles_parser.add_argument('--percentiles', default='50,90,95,99', help='百分位數，以逗號分隔 (預設: 50,90,95,99)')
+    percentiles_parser.add_argument('--service', help='只查詢特定服務')
+    percentiles_parser.add_argument('--run-id', help='只查詢特定測試')
+    percentiles_parser.add_argument('--since', type=parse_date, help='起始時間，例如 2024-01-01')
+    percentiles_parser.add_argument('--until', type=parse_date, help='結束時間（不含），例如 2024-02-01')
+
+    # 延遲與長度分析
+    lengths_parser = subparsers.add_parser('lengths', help='分析延遲與輸入 / 輸出 token 數的關係')
+    lengths_parser.add_argument('--service', help='只查詢特定服務')
+    lengths_parser.add_argument('--run-id', help='只查詢特定測試')
+    lengths_parser.add_argument('--since', type=parse_date, help='起始時間，例如 2024-01-01')
+    lengths_parser.add_argument('--until', type=parse_date, help='結束時間（不含），例如 2024-02-01')
+    lengths_parser.add_argument('--bootstrap', type=int, default=200, help='bootstrap 重抽樣次數，0 表示不計算信賴區間 (預設: 200)')
+
+    # 測試端資源的取樣
+    client_parser = subparsers.add_parser('client', help='列出某次測試的測試端資源取樣（CPU、記憶體、event loop 延遲）')
+    client_parser.add_argument('run_id', help='測試識別碼（可由 runs 查詢）')
+
+    args = parser.parse_args()
+    store = ResultsStore(args.db)
+    if args.command == 'runs':
+        runs = store.list_runs(args.service, args.limit)
+        for run in runs:
+            run['started_time'] = datetime.fromtimestamp(run['started_time']).strftime('%Y-%m-%d %H:%M:%S')
+            run['finished_time'] = datetime.fromtimestamp(run['finished_time']).strftime('%Y-%m-%d %H:%M:%S') if run['finished_time'] else None
+        print_table(runs)
+    elif args.command == 'client':
+        samples = store.load_client_samples(args.run_id)
+        for sample in samples:
+            sample['sample_time'] = datetime.fromtimestamp(sample['sample_time']).strftime('%H:%M:%S')
+            sample['process_rss'] = f"{sample['process_rss'] / 2**20:.0f} MB" if sample['process_rss'] else None
+            sample['browsers'] = len(sample['browsers'])
+            del sample['run_id']
+        print_table(samples)
+    elif args.command == 'lengths':
+        analysis = analyze_lengths(**store.length_data(args.service, args.run_id, args.since, args.until), bootstrap=args.bootstrap)
+        print(format_length_analysis(analysis) if analysis else "沒有符合條件的資料")
+    else:
+        print_table(store.percentiles(
+            metric=args.metric,
+            group_by=[c.strip() for c in args.by.split(',') if c.strip()],
+            percentiles=[float(q) for q in args.percentiles.split(',')],
+            service=args.service,
+            run_id=args.run_id,
+            since=args.since,
+            until=args.until))
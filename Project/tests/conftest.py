@@ -0,0 +1,48 @@
+import os
+import sys
+
+# 測試以 Project 目錄為根匯入 modules / utils（與 cli.py 等入口相同）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from modules.harness_benchmark import start_mock_server
+from modules.mock_chat import MockSettings
+
+
+@pytest.fixture
+def mock_server():
+    """ 在背景執行緒啟動模擬聊天服務，回傳 (service, base_url) """
+    server, service, url = start_mock_server(MockSettings(ttft=0.01, tokens_per_second=500, tokens=5, jitter=0, seed=1))
+    yield service, url
+    server.shutdown()
+
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs")
+
+
+@pytest.fixture
+def clean_logs():
+    """ 刪除測試期間產生的日誌檔 """
+    before = set(os.listdir(LOG_DIR)) if os.path.isdir(LOG_DIR) else set()
+    yield
+    for name in set(os.listdir(LOG_DIR)) - before if os.path.isdir(LOG_DIR) else ():
+        os.remove(os.path.join(LOG_DIR, name))
+
+
+def http_config(url: str, **overrides) -> dict:
+    """ 以 http driver 對模擬服務測試的最小配置（不寫結果資料庫、不做測試端監控） """
+    config = {
+        "name": "mock",
+        "url": url,
+        "api_url": f"{url}/api/chat",
+        "driver": "http",
+        "input_selector": "x",
+        "response_selector": "y",
+        "test_prompts": ["hi", "hello"],
+        "concurrency": 2,
+        "results_store": False,
+        "client_monitor": False,
+        "tokenizer": {"mode": "approximate"},
+    }
+    config.update(overrides)
+    return config
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+import time
+from conftest import http_config
+from modules.base_runner import BaseTestRunner
+
+
+def test_open_loop_streaming_stats_keeps_no_results(mock_server, clean_logs):
+    service, url = mock_server
+    runner = BaseTestRunner("mock", log_level=logging.ERROR, config=http_config(
+        url, load_model="open", arrival_rate=20, test_duration=1, streaming_stats=True))
+    collected = []
+    runner.metrics_listeners.append(collected.append)
+    asyncio.run(runner.execute_load_test())
+
+    metrics, = collected
+    sent = runner.open_loop_report["sent"]
+    assert sent == service.stats()["requests"] > 0
+    assert metrics.total_transactions == sent
+    assert metrics.first_token_latency == [] and metrics.schedule_delay == []
+    assert metrics.summary.histograms["first_token_latency"].count == sent
+    assert runner.open_loop_report["max_schedule_delay"] >= 0
+
+
+def test_load_profile_streaming_stats_keeps_per_stage_histograms(mock_server, clean_logs):
+    service, url = mock_server
+    runner = BaseTestRunner("mock", log_level=logging.ERROR, config=http_config(
+        url, load_profile=[{"type": "hold", "users": 1, "duration": 1}, {"type": "hold", "users": 2, "duration": 1}],
+        load_profile_tick=0.1, streaming_stats=True))
+    collected = []
+    runner.metrics_listeners.append(collected.append)
+    asyncio.run(runner.execute_load_test())
+
+    metrics, = collected
+    assert metrics.first_token_latency == []
+    assert metrics.total_transactions == sum(stage["total_transactions"] for stage in runner.stage_reports)
+    assert metrics.total_transactions == service.stats()["requests"]
+    assert all(stage["streaming_relative_accuracy"] == 0.01 and stage["total_transactions"] for stage in runner.stage_reports)
+
+
+def test_load_profile_failing_sessions_back_off_and_abort(mock_server, clean_logs):
+    service, url = mock_server
+    service.settings.error_rate = 1.0
+    runner = BaseTestRunner("mock", log_level=logging.ERROR, config=http_config(
+        url, load_profile=[{"type": "hold", "users": 2, "duration": 30}],
+        load_profile_tick=0.05, max_consecutive_failures=3, failure_backoff=0.05))
+    started = time.time()
+    asyncio.run(runner.execute_load_test())
+
+    # 每個工作階段連續失敗 3 次後退出並重新建立，累計失敗超過 2 × 3 次時提前中斷
+    assert time.time() - started < 10
+    failed = runner.stage_reports[0]["failed_transactions"]
+    assert 6 < failed <= 6 + 2
+    assert service.stats()["requests"] == failed
@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from modules.browser_pool import BrowserPool, WarmBrowserPool
+
+
+class FakeBrowser:
+    def __init__(self, headless: bool) -> None:
+        self.headless = headless
+        self.contexts = []
+        self.closed = False
+
+    def is_connected(self) -> bool:
+        return not self.closed
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class FakeChromium:
+    def __init__(self) -> None:
+        self.launched: list[FakeBrowser] = []
+
+    async def launch(self, headless: bool = True) -> FakeBrowser:
+        await asyncio.sleep(0)
+        browser = FakeBrowser(headless)
+        self.launched.append(browser)
+        return browser
+
+
+class FakePlaywright:
+    def __init__(self) -> None:
+        self.chromium = FakeChromium()
+
+
+def make_pool(max_size: int, acquire_timeout: float = 0.2) -> WarmBrowserPool:
+    pool = WarmBrowserPool(max_size=max_size, acquire_timeout=acquire_timeout)
+    # 直接設定 playwright，start() 不會啟動真正的 driver
+    pool.playwright = FakePlaywright()
+    return pool
+
+
+def live_browsers(pool: WarmBrowserPool) -> int:
+    return sum(not b.closed for b in pool.playwright.chromium.launched)
+
+
+def test_acquire_waits_when_pool_is_full():
+    async def main():
+        pool = make_pool(2)
+        first, _ = await pool.acquire()
+        await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        await pool.release(first)
+        browser, is_warm = await waiter
+        return pool, browser, first, is_warm
+
+    pool, browser, first, is_warm = asyncio.run(main())
+    assert browser is first and is_warm
+    assert len(pool.playwright.chromium.launched) == 2
+
+
+def test_acquire_times_out_when_pool_stays_full():
+    async def main():
+        pool = make_pool(1)
+        await pool.acquire()
+        with pytest.raises(TimeoutError):
+            await pool.acquire()
+        return pool
+
+    pool = asyncio.run(main())
+    assert pool.report()["borrowed_browsers"] == 1
+
+
+def test_idle_browsers_count_towards_the_limit():
+    async def main():
+        pool = make_pool(2)
+        borrowed = [browser for browser, _ in await asyncio.gather(pool.acquire(True), pool.acquire(True))]
+        for browser in borrowed:
+            await pool.release(browser)
+        # 兩個閒置的 headless 瀏覽器佔滿名額：借用非 headless 時先關閉一個閒置的瀏覽器
+        browser, is_warm = await pool.acquire(False)
+        return pool, browser, is_warm
+
+    pool, browser, is_warm = asyncio.run(main())
+    assert not is_warm and not browser.headless
+    assert live_browsers(pool) == 2
+    assert pool.report()["idle_browsers"] == 1
+
+
+def test_borrowing_more_than_the_limit_never_exceeds_it():
+    async def main():
+        pool = make_pool(3, acquire_timeout=None)
+        peak = 0
+
+        async def borrow():
+            nonlocal peak
+            browser, _ = await pool.acquire()
+            peak = max(peak, live_browsers(pool))
+            await asyncio.sleep(0.01)
+            await pool.release(browser)
+
+        await asyncio.gather(*(borrow() for _ in range(10)))
+        return pool, peak
+
+    pool, peak = asyncio.run(main())
+    assert peak <= 3
+    assert len(pool.playwright.chromium.launched) == 3
+
+
+def test_browser_pool_returns_borrowed_browsers_when_warm_up_fails():
+    async def main():
+        pool = make_pool(2)
+        browser_pool = BrowserPool(pool.playwright, size=3, source=pool)
+        with pytest.raises(TimeoutError):
+            await browser_pool.warm_up()
+        return pool
+
+    pool = asyncio.run(main())
+    assert pool.report()["borrowed_browsers"] == 0
+    assert pool.report()["idle_browsers"] == 2
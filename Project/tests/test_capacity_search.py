@@ -0,0 +1,21 @@
+import asyncio
+import logging
+from conftest import http_config
+from modules.base_runner import BaseTestRunner
+from modules.capacity_search import CapacitySearch, format_probe
+
+
+def test_probe_progress_goes_to_logger_and_listeners(mock_server, clean_logs, capsys, caplog):
+    _, url = mock_server
+    config = http_config(url, capacity_search={"start": 1, "max": 2, "probe_duration": 1,
+                                               "objectives": ["failed_rate < 50"], "min_transactions": 1000})
+    search = CapacitySearch("mock", log_level=logging.ERROR, config=config, runner_class=BaseTestRunner)
+    seen = []
+    search.probe_listeners.append(seen.append)
+    with caplog.at_level(logging.INFO, logger="modules.capacity_search"):
+        result = asyncio.run(search.run())
+
+    assert [p["concurrency"] for p in seen] == [1, 2]
+    assert result["capacity"] == 2 and result["reached_max"]
+    assert capsys.readouterr().out == ""
+    assert [r.getMessage() for r in caplog.records if r.name == "modules.capacity_search"] == [format_probe(p) for p in seen]
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+import pytest
+from modules.base_test_async import ResponseMetrics
+from modules.distributed import Coordinator, deserialize_metrics, serialize_metrics, serve_worker, shard_configs, split_concurrency
+from utils.streaming_stats import StreamingStats
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs")
+
+
+@pytest.fixture
+def clean_logs():
+    """ 刪除測試期間產生的日誌檔 """
+    before = set(os.listdir(LOG_DIR)) if os.path.isdir(LOG_DIR) else set()
+    yield
+    for name in set(os.listdir(LOG_DIR)) - before if os.path.isdir(LOG_DIR) else ():
+        os.remove(os.path.join(LOG_DIR, name))
+
+
+@pytest.mark.parametrize("concurrency, shards", [(10, 3), (7, 7), (100, 8), (2, 5), (1, 4)])
+def test_split_concurrency_keeps_every_user(concurrency, shards):
+    sizes = split_concurrency(concurrency, shards)
+    assert sum(sizes) == concurrency
+    assert len(sizes) == min(concurrency, shards)
+    assert min(sizes) >= 1
+    assert max(sizes) - min(sizes) <= 1
+
+
+def test_shard_configs_offsets_and_sla():
+    configs = shard_configs({"concurrency": 5, "arrival_rate": 10.0, "sla": ["failed_rate < 1"]}, 2)
+    assert [c["concurrency"] for c in configs] == [3, 2]
+    assert [c["browser_index_offset"] for c in configs] == [0, 3]
+    assert sum(c["arrival_rate"] for c in configs) == pytest.approx(10.0)
+    assert all(c["sla"] == {"objectives": ["failed_rate < 1"], "early_stop": False} for c in configs)
+
+
+def test_metrics_round_trip_is_lossless():
+    metrics = ResponseMetrics(
+        total_transactions=3,
+        failed_transactions=1,
+        first_token_latency=[0.1, 0.25],
+        total_response_time=[1.0, 2.5],
+        ai_response_token_count=[10, 20],
+        generation_time=[0.9, 2.25],
+        token_count_time=[0.001, 0.002],
+    )
+    summary = StreamingStats()
+    summary.update(metrics)
+    metrics.summary = summary
+
+    restored = deserialize_metrics(serialize_metrics(metrics))
+    assert serialize_metrics(restored) == serialize_metrics(metrics)
+    assert restored.first_token_latency == metrics.first_token_latency
+    assert restored.summary.to_dict() == summary.to_dict()
+    histogram = restored.summary.histograms["first_token_latency"]
+    assert histogram.count == 2
+    assert histogram.percentile(50) == pytest.approx(summary.histograms["first_token_latency"].percentile(50))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 5.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"worker 未在 {timeout} 秒內啟動")
+
+
+def test_coordinator_with_two_local_workers(mock_server, clean_logs):
+    service, url = mock_server
+    ports = [free_port(), free_port()]
+    for port in ports:
+        threading.Thread(target=serve_worker, args=("127.0.0.1", port, logging.ERROR), daemon=True).start()
+    for port in ports:
+        wait_for_port(port)
+
+    config = {
+        "name": "mock",
+        "url": url,
+        "api_url": f"{url}/api/chat",
+        "driver": "http",
+        "input_selector": "x",
+        "response_selector": "y",
+        "test_prompts": ["hi", "hello"],
+        "concurrency": 3,
+        "results_store": False,
+        "client_monitor": False,
+        "tokenizer": {"mode": "approximate"},
+    }
+    coordinator = Coordinator("mock", hosts=[f"127.0.0.1:{port}" for port in ports], log_level=logging.ERROR, config=config)
+    report = asyncio.run(coordinator.execute_load_test())
+
+    # 3 個使用者各送出 2 個 prompt，分成 2 + 1 兩個分片
+    assert len(coordinator.shard_reports) == 2
+    assert "各 worker 使用者數：[2, 1]" in report
+    assert "總交易次數：6\n" in report
+    assert "錯誤率：0.00 %" in report
+    assert service.stats()["requests"] == 6
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import logging
+import time
+import pytest
+from modules.base_test_async import ResponseMetrics
+from modules.http_test_async import HttpTestAsync
+from modules.tracing import Tracer
+from utils.http_stream import HttpStatusError, HttpStreamClient
+
+CHAT_BODY = json.dumps({"messages": [{"role": "user", "content": "hi"}], "stream": True}).encode()
+CHAT_HEADERS = {"Content-Type": "application/json"}
+
+
+def make_tester(config: dict, http_client: HttpStreamClient = None) -> HttpTestAsync:
+    config = {"name": "mock", "driver": "http", "tokenizer": {"mode": "approximate"}, **config}
+    return HttpTestAsync("mock", http_client=http_client, config=config, logger=logging.getLogger("tests"), browser_index=1)
+
+
+async def start_keep_alive_server(close_after_response: bool = False):
+    """
+    回應固定 content-length body 的 keep-alive 伺服器（werkzeug 的開發伺服器一律關閉連線，無法測試連線重複使用）。
+    close_after_response 為 True 時，伺服器在回應後關閉連線，但回應標頭仍宣告 keep-alive（模擬逾時被關閉的閒置連線）
+    """
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                headers = {}
+                if not await reader.readline():
+                    break
+                while line := (await reader.readline()).strip():
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                await reader.readexactly(int(headers.get("content-length", 0)))
+                body = b"ok"
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: keep-alive\r\n\r\n" + body)
+                await writer.drain()
+                if close_after_response:
+                    break
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/"
+
+
+def test_chunked_sse_response(mock_server):
+    _, url = mock_server
+
+    async def main():
+        client = HttpStreamClient()
+        async with client.request("POST", f"{url}/api/chat", CHAT_HEADERS, CHAT_BODY) as response:
+            assert response.status == 200
+            assert response.headers["transfer-encoding"] == "chunked"
+            events = [data async for data in response.iter_sse()]
+            assert response.complete
+        await client.close()
+        return events
+
+    events = asyncio.run(main())
+    assert events[-1] == "[DONE]"
+    assert len(events) == 6
+    assert all(json.loads(e)["choices"][0]["delta"]["content"] for e in events[:-1])
+
+
+def test_keep_alive_reuses_connection():
+    async def main():
+        server, url = await start_keep_alive_server()
+        client = HttpStreamClient()
+        try:
+            for _ in range(3):
+                async with client.request("GET", url) as response:
+                    assert await response.read() == b"ok"
+            return client.connections_opened, client.requests
+        finally:
+            await client.close()
+            server.close()
+
+    assert asyncio.run(main()) == (1, 3)
+
+
+def test_retries_stale_idle_connection():
+    async def main():
+        server, url = await start_keep_alive_server(close_after_response=True)
+        client = HttpStreamClient()
+        try:
+            async with client.request("GET", url) as response:
+                assert await response.read() == b"ok"
+            # 連線回到連線池，但伺服器已經關閉它
+            assert sum(len(idle) for idle in client._idle.values()) == 1
+            await asyncio.sleep(0.05)
+            async with client.request("GET", url) as response:
+                assert await response.read() == b"ok"
+            return client.connections_opened
+        finally:
+            await client.close()
+            server.close()
+
+    assert asyncio.run(main()) == 2
+
+
+def test_non_2xx_raises_http_status_error(mock_server):
+    service, url = mock_server
+    service.settings.error_rate = 1.0
+
+    async def main():
+        tester = make_tester({"url": url, "api_url": f"{url}/api/chat", "test_prompts": ["hi"]})
+        await tester.setup()
+        errors = []
+        tester.logger.error = errors.append
+        try:
+            return await tester.run_prompt(0, "hi"), errors
+        finally:
+            await tester.teardown()
+
+    result, errors = asyncio.run(main())
+    assert result.is_sent
+    assert not result.is_successful
+    assert result.error == "HttpStatusError"
+    assert "HTTP 500" in errors[0]
+
+
+def test_failed_transaction_keeps_schedule_delay(mock_server):
+    service, url = mock_server
+    service.settings.error_rate = 1.0
+
+    async def main():
+        tester = make_tester({"url": url, "api_url": f"{url}/api/chat", "test_prompts": ["hi"]})
+        await tester.setup()
+        try:
+            return await tester.run_prompt(0, "hi", intended_send_time=time.time() - 2.0)
+        finally:
+            await tester.teardown()
+
+    result = asyncio.run(main())
+    assert result.is_sent and not result.is_successful
+    assert 2.0 <= result.schedule_delay < 3.0
+    assert ResponseMetrics.from_results([result]).schedule_delay == [result.schedule_delay]
+
+
+def test_run_prompt_against_mock(mock_server):
+    _, url = mock_server
+
+    async def main():
+        tester = make_tester({"url": url, "api_url": f"{url}/api/chat", "test_prompts": ["hi"]})
+        await tester.setup()
+        try:
+            return await tester.run_prompt(0, "hi")
+        finally:
+            await tester.teardown()
+
+    result = asyncio.run(main())
+    assert result.is_successful
+    assert result.first_token_latency > 0
+    assert result.token_count > 0
+
+
+@pytest.mark.parametrize("path, data, expected", [
+    ("output.text", '{"output": {"text": "hello"}}', "hello"),
+    ("candidates.0.content.parts.0.text", '{"candidates": [{"content": {"parts": [{"text": "hi"}]}}]}', "hi"),
+    ("output.text", '{"output": {}}', ""),
+    ("choices.1.delta.content", '{"choices": [{"delta": {"content": "x"}}]}', ""),
+    ("output.text", "plain text", "plain text"),
+])
+def test_extract_text_with_custom_path(path, data, expected):
+    tester = make_tester({"url": "http://127.0.0.1/", "api_text_path": path})
+    assert tester._extract_text(data) == expected
+
+
+def test_trace_phases_are_finished_on_error(mock_server):
+    service, url = mock_server
+    tracer = Tracer("mock", sample_rate=1.0, seed=1)
+
+    async def main():
+        tester = make_tester({"url": url, "api_url": f"{url}/api/chat", "test_prompts": ["hi"]})
+        tester.tracer = tracer
+        await tester.setup()
+        try:
+            await tester.run_prompt(0, "hi")
+            service.settings.error_rate = 1.0
+            await tester.run_prompt(0, "hi")
+        finally:
+            await tester.teardown()
+
+    asyncio.run(main())
+    ok, failed = ([(s.name, s.error) for s in tracer._spans if s.trace_id == trace_id] for trace_id in dict.fromkeys(s.trace_id for s in tracer._spans))
+    assert [name for name, _ in ok] == ["build_request", "wait_headers", "wait_first_token", "stream", "count_tokens", "log", "publish", "transaction"]
+    assert ("wait_first_token", "HttpStatusError") in failed
+    assert failed[-1] == ("transaction", "HttpStatusError")
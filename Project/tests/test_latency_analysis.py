@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from modules.latency_analysis import analyze_lengths, bucket_percentiles, fit_linear, format_length_analysis
+
+
+def test_fit_linear_recovers_known_slope():
+    rng = np.random.default_rng(0)
+    x = rng.integers(10, 4000, size=2000).astype(np.float64)
+    # 固定成本 0.2 秒，每個輸入 token 0.5 毫秒，加上雜訊
+    y = 0.2 + 0.0005 * x + rng.normal(0, 0.05, size=x.size)
+    fit = fit_linear(x, y, np.random.default_rng(1), samples=300)
+    assert fit["slope"] == pytest.approx(0.0005, rel=0.02)
+    assert fit["intercept"] == pytest.approx(0.2, abs=0.01)
+    low, high = fit["slope_ci"]
+    assert low < 0.0005 < high
+    assert low < fit["slope"] < high
+    assert high - low < 0.0001
+    assert fit["r2"] > 0.9
+    assert fit["transactions"] == 2000
+
+
+def test_fit_linear_without_enough_variation():
+    rng = np.random.default_rng(0)
+    assert fit_linear(np.array([1.0, 2.0]), np.array([1.0, 2.0]), rng) is None
+    assert fit_linear(np.full(10, 5.0), np.arange(10.0), rng) is None
+    assert fit_linear(np.arange(10.0), np.arange(10.0), rng, samples=0)["slope_ci"] is None
+
+
+def test_bucket_edges_and_open_last_bucket():
+    tokens = np.array([0, 63, 64, 127, 128, 5000, 100000], dtype=np.float64)
+    values = np.arange(1.0, 8.0)
+    buckets = bucket_percentiles(tokens, values, (0, 64, 128), np.random.default_rng(0), percentiles=(50,), samples=50)
+    assert [(b["min_tokens"], b["max_tokens"], b["transactions"]) for b in buckets] == [(0, 64, 2), (64, 128, 2), (128, None, 3)]
+    assert [b["p50"] for b in buckets] == [1.5, 3.5, 6.0]
+    low, high = buckets[2]["p50_ci"]
+    assert 5.0 <= low <= high <= 7.0
+
+
+def test_buckets_without_data_are_skipped():
+    tokens = np.array([10, 20, 3000], dtype=np.float64)
+    buckets = bucket_percentiles(tokens, np.array([1.0, 2.0, 3.0]), (0, 64, 128, 256), np.random.default_rng(0), samples=10)
+    assert [b["min_tokens"] for b in buckets] == [0, 256]
+    # 只有一筆資料的分組不計算信賴區間
+    assert buckets[1]["p95_ci"] is None
+
+
+def test_empty_inputs():
+    rng = np.random.default_rng(0)
+    assert bucket_percentiles(np.array([]), np.array([]), (0, 64), rng) == []
+    assert analyze_lengths([], [], [], []) is None
+    # 序列長度不一致時不分析
+    assert analyze_lengths([1, 2], [1], [0.1, 0.2], [0.1, 0.2]) is None
+
+
+def test_analyze_lengths_skips_transactions_without_timing():
+    input_tokens = [100, 200, 300, 400]
+    output_tokens = [10, 20, 0, 40]
+    ttft = [0.1, 0.0, 0.3, 0.4]
+    generation = [1.0, 2.0, 0.5, 0.0]
+    analysis = analyze_lengths(input_tokens, output_tokens, ttft, generation, bootstrap=0)
+    assert analysis["transactions"] == 4
+    assert sum(b["transactions"] for b in analysis["input_buckets"]) == 3
+    assert sum(b["transactions"] for b in analysis["output_buckets"]) == 2
+    assert analysis["prefill"]["slope"] == pytest.approx(0.001)
+    assert analysis["decode"] is None
+    assert "decode（輸出）：資料不足" in format_length_analysis(analysis)
@@ -0,0 +1,36 @@
+import pytest
+from modules.load_profile import LoadProfile
+
+
+@pytest.mark.parametrize("stage", [
+    {"type": "step", "step": 10, "interval": 0, "duration": 60},
+    {"type": "step", "step": 10, "interval": -5, "duration": 60},
+    {"type": "step", "step": 10, "duration": 60},
+])
+def test_step_stage_rejects_non_positive_interval(stage):
+    with pytest.raises(ValueError, match="interval"):
+        LoadProfile.from_config([stage])
+
+
+def test_step_stage_targets():
+    profile = LoadProfile.from_config([{"type": "step", "from": 5, "step": 10, "interval": 20, "duration": 60}])
+    assert profile.stages[0].end_users == 25
+    assert [profile.stages[0].target_users(t) for t in (0, 19.9, 20, 45, 59.9, 60)] == [5, 5, 15, 25, 25, 25]
+
+
+@pytest.mark.parametrize("duration, end_users", [(600, 50), (610, 60), (100, 10), (0, 10)])
+def test_step_stage_end_users_is_last_in_stage_target(duration, end_users):
+    profile = LoadProfile.from_config([
+        {"type": "hold", "users": 10, "duration": 60},
+        {"type": "step", "step": 10, "interval": 120, "duration": duration},
+        {"type": "hold", "duration": 60},
+    ])
+    step, hold = profile.stages[1], profile.stages[2]
+    assert step.end_users == end_users
+    assert step.name.startswith(f"step 10→{end_users} ")
+    # 階段結束前的最後一個目標等於 end_users，下一個 hold 階段延續相同的使用者數，邊界上不會跳增
+    if duration:
+        assert profile.target(60 + duration - 1e-6) == (1, end_users)
+    assert profile.target(60 + duration) == (2, end_users)
+    assert hold.start_users == end_users
+    assert profile.max_users == end_users
@@ -0,0 +1,30 @@
+import pytest
+from modules.prompt_source import PromptCorpus
+
+
+def write_csv(tmp_path, content: str) -> str:
+    path = tmp_path / "corpus.csv"
+    path.write_bytes(content.encode("utf-8"))
+    return str(path)
+
+
+def test_csv_multiline_quoted_field_is_one_record(tmp_path):
+    path = write_csv(tmp_path, 'id,prompt\r\n'
+                               '1,"第一行\r\n第二行，含 ""引號"""\r\n'
+                               '2,單行\r\n'
+                               '\r\n'
+                               '3,"a\nb\nc"\r\n')
+    corpus = PromptCorpus(path=path, id_field="id")
+    try:
+        assert len(corpus) == 3
+        assert corpus.read(0) == {"id": "1", "prompt": '第一行\r\n第二行，含 "引號"'}
+        assert corpus.read(1) == {"id": "2", "prompt": "單行"}
+        assert corpus.read(2) == {"id": "3", "prompt": "a\nb\nc"}
+    finally:
+        corpus.close()
+
+
+def test_csv_unterminated_quote_is_rejected(tmp_path):
+    path = write_csv(tmp_path, 'id,prompt\n1,"沒有結束\n2,下一列\n')
+    with pytest.raises(ValueError, match="引號"):
+        PromptCorpus(path=path)
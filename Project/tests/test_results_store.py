@@ -0,0 +1,53 @@
+import pytest
+from modules.base_test_async import TestResult as Result
+from modules.results_store import ResultsStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.db"))
+    rows = [
+        ("run-a", "chat", True, 1.0), ("run-a", "chat", True, 3.0), ("run-a", "chat", False, None),
+        ("run-a", None, True, 2.0),
+        ("run-b", "code", True, 5.0), ("run-b", "code", True, 7.0),
+    ]
+    for i, (run_id, prompt_class, successful, latency) in enumerate(rows):
+        store.record(run_id, "mock", Result(is_successful=successful, is_sent=True, prompt_class=prompt_class,
+                                            send_time=1_700_000_000 + i, first_token_latency=latency or 0.0))
+    store.close()
+    return store
+
+
+def test_percentiles_grouped_in_sql(store):
+    summary = store.percentiles(group_by=("run_id", "prompt_class"), percentiles=(50, 100))
+    assert [(r["run_id"], r["prompt_class"], r["transactions"]) for r in summary] == [
+        ("run-a", None, 1), ("run-a", "chat", 3), ("run-b", "code", 2)]
+    chat = summary[1]
+    assert chat["error_rate"] == pytest.approx(1 / 3)
+    assert (chat["mean"], chat["p50"], chat["p100"]) == (2.0, 2.0, 3.0)
+    assert summary[2]["p50"] == 6.0
+
+
+def test_percentiles_without_grouping_and_filters(store):
+    summary, = store.percentiles(group_by=(), percentiles=(50,))
+    assert summary["all_rows"] == "all"
+    assert summary["transactions"] == 6
+    assert summary["p50"] == 3.0
+    assert store.percentiles(run_id="missing") == []
+    assert [r["transactions"] for r in store.percentiles(group_by=("service",), run_id="run-b")] == [2]
+
+
+def test_percentiles_with_only_failures(store, tmp_path):
+    store = ResultsStore(str(tmp_path / "failed.db"))
+    store.record("run", "mock", Result(is_successful=False, is_sent=True, send_time=1_700_000_000))
+    store.close()
+    summary, = store.percentiles(group_by=("run_id",))
+    assert summary["error_rate"] == 1.0
+    assert summary["mean"] is None and summary["p95"] is None
+
+
+def test_rejects_unknown_columns(store):
+    with pytest.raises(ValueError):
+        store.percentiles(metric="nope")
+    with pytest.raises(ValueError):
+        store.percentiles(group_by=("nope",))
@@ -0,0 +1,127 @@
+import pytest
+from modules.base_test_async import TestResult as Result
+from modules.sla import SlaMonitor, format_verdict, parse_objective
+
+
+def ok(first_token_latency: float = 0.5, **fields) -> Result:
+    return Result(is_successful=True, is_sent=True, first_token_latency=first_token_latency, **fields)
+
+
+def failed() -> Result:
+    return Result(is_successful=False, is_sent=True, error="TimeoutError")
+
+
+def test_parse_objective_forms():
+    objective = parse_objective("p95_first_token_time < 3")
+    assert (objective.kind, objective.field, objective.quantile, objective.threshold) == ("percentile", "first_token_latency", 95.0, 3.0)
+    assert parse_objective({"metric": "median_total_response_time", "op": ">=", "threshold": 1}).quantile == 50.0
+    assert parse_objective("max_max_stall <= 2").quantile == 100.0
+    assert parse_objective("mean_generation_time < 4").kind == "mean"
+    assert parse_objective("failed_rate < 1").kind == "rate"
+    assert parse_objective("tokens_per_second > 2e1").threshold == 20.0
+    assert str(parse_objective(" p99.9_first_token_time<0.5 ")) == "p99.9_first_token_time < 0.5"
+
+
+@pytest.mark.parametrize("spec, message", [
+    ("p95_first_token_time", "無法解析"),
+    ("p95_first_token_time == 3", "無法解析"),
+    ({"metric": "failed_rate", "op": "!=", "threshold": 1}, "比較運算子"),
+    ("p95_unknown_time < 3", "不支援的 SLA 指標"),
+    ("latency < 3", "不支援的 SLA 指標"),
+    ("p0_first_token_time < 3", "百分位數"),
+    ("p150_first_token_time < 3", "百分位數"),
+])
+def test_parse_objective_errors(spec, message):
+    with pytest.raises(ValueError, match=message):
+        parse_objective(spec)
+
+
+def test_monitor_requires_objectives_and_sane_confidence():
+    with pytest.raises(ValueError):
+        SlaMonitor([])
+    with pytest.raises(ValueError):
+        SlaMonitor(["failed_rate < 1"], confidence=0.4)
+
+
+def test_settled_pass():
+    monitor = SlaMonitor(["p95_first_token_time < 3", "failed_rate < 5"], min_transactions=20)
+    for _ in range(19):
+        monitor.on_result(ok())
+    # 未達 min_transactions 之前不判定
+    assert monitor.decisions() == [None, None]
+    for _ in range(400):
+        monitor.on_result(ok())
+        if monitor.settled:
+            break
+    assert monitor.decisions() == ["pass", "pass"]
+    verdict = monitor.verdict()
+    assert verdict["verdict"] == "pass"
+    assert all(o["settled"] for o in verdict["objectives"])
+    assert verdict["objectives"][0]["observed"] == pytest.approx(0.5, rel=0.01)
+
+
+def test_settled_fail():
+    monitor = SlaMonitor(["p95_first_token_time < 3"], min_transactions=20)
+    for _ in range(20):
+        monitor.on_result(ok(5.0))
+    assert monitor.decisions() == ["fail"]
+    assert monitor.settled
+    verdict = monitor.verdict()
+    assert verdict["verdict"] == "fail"
+    assert verdict["objectives"][0]["settled"]
+
+
+def test_unsettled_objective_falls_back_to_observed_value():
+    # 約 5% 的交易超過門檻，正好落在 p95 的無差異區間內，序貫檢定沒有定論
+    results = [ok(5.0) if i % 20 == 0 else ok(1.0) for i in range(40)]
+    monitor = SlaMonitor(["p95_first_token_time < 3"], min_transactions=20)
+    for result in results:
+        monitor.on_result(result)
+    assert monitor.decisions() == [None]
+    assert not monitor.settled
+    objective = monitor.verdict()["objectives"][0]
+    assert not objective["settled"]
+    assert objective["status"] == ("pass" if objective["observed"] < 3 else "fail")
+    assert "未達統計定論" in format_verdict(monitor.verdict())
+
+
+@pytest.mark.parametrize("spec, bad", [("max_first_token_time < 3", ok(4.0)), ("failed_rate < 0", failed())])
+def test_target_of_one_fails_on_first_bad_sample(spec, bad):
+    monitor = SlaMonitor([spec], min_transactions=1)
+    for _ in range(1000):
+        monitor.on_result(ok())
+    # 要求全部符合時，沒有不符合的樣本也無法提前判定通過
+    assert monitor.decisions() == [None]
+    monitor.on_result(bad)
+    assert monitor.decisions() == ["fail"]
+    assert monitor.verdict()["verdict"] == "fail"
+
+
+def test_mean_and_ratio_objectives_settle_with_normal_bounds():
+    monitor = SlaMonitor(["mean_first_token_time < 2", "tokens_per_second > 20"], min_transactions=10)
+    for i in range(200):
+        monitor.on_result(ok(1.0 + 0.01 * (i % 5), generation_time=1.0 + 0.01 * (i % 3), token_count=50))
+    assert monitor.decisions() == ["pass", "pass"]
+    low, high = monitor.verdict()["objectives"][1]["interval"]
+    assert low < 50 / 1.01 < high
+
+
+def test_verdict_from_stats_without_local_transactions():
+    # 分散式測試的 coordinator 沒有逐筆資料，以合併後的統計數據判定
+    monitor = SlaMonitor(["p95_first_token_time < 3", "failed_rate < 1", "tokens_per_second > 20"])
+    verdict = monitor.verdict({"p95_first_token_time": 2.5, "failed_rate": 2.0, "tokens_per_second": None})
+    statuses = {o["metric"]: (o["status"], o["observed"], o["settled"]) for o in verdict["objectives"]}
+    assert statuses == {
+        "p95_first_token_time": ("pass", 2.5, False),
+        "failed_rate": ("fail", 2.0, False),
+        "tokens_per_second": ("fail", None, False),
+    }
+    assert verdict["verdict"] == "fail"
+    assert verdict["transactions"] == 0
+    assert not verdict["early_stopped"]
+
+
+def test_from_config_accepts_a_plain_list():
+    monitor = SlaMonitor.from_config({"sla": ["failed_rate < 1"], "stall_threshold": 2.0})
+    assert [str(o) for o in monitor.objectives] == ["failed_rate < 1"]
+    assert SlaMonitor.from_config({}) is None
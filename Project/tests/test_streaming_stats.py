@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from modules.base_test_async import ResponseMetrics, TestResult as Result
+from utils.streaming_stats import StreamingHistogram, StreamingStats
+
+
+@pytest.mark.parametrize("accuracy", [0.01, 0.05])
+def test_histogram_percentiles_within_relative_accuracy(accuracy):
+    values = np.random.default_rng(1).lognormal(mean=0.0, sigma=1.5, size=20000)
+    histogram = StreamingHistogram(accuracy)
+    histogram.add_many(values)
+    for q in (1, 10, 50, 90, 95, 99, 99.9):
+        expected = np.percentile(values, q, method="lower")
+        assert abs(histogram.percentile(q) - expected) <= accuracy * expected
+    assert histogram.percentile(100) == values.max()
+    assert histogram.count == values.size
+    assert histogram.sum == pytest.approx(values.sum())
+
+
+def test_histogram_add_matches_add_many():
+    values = np.random.default_rng(2).exponential(0.5, size=500)
+    one_by_one = StreamingHistogram()
+    for value in values:
+        one_by_one.add(value)
+    vectorized = StreamingHistogram()
+    vectorized.add_many(values)
+    assert np.array_equal(one_by_one.counts, vectorized.counts)
+
+
+def test_histogram_merge_equals_single_histogram():
+    rng = np.random.default_rng(3)
+    left, right = rng.lognormal(size=3000), rng.lognormal(1.0, size=1000)
+    merged = StreamingHistogram()
+    merged.add_many(left)
+    other = StreamingHistogram()
+    other.add_many(right)
+    merged.merge(other)
+    combined = StreamingHistogram()
+    combined.add_many(np.concatenate([left, right]))
+    assert np.array_equal(merged.counts, combined.counts)
+    assert (merged.count, merged.min, merged.max) == (combined.count, combined.min, combined.max)
+    assert merged.sum == pytest.approx(combined.sum)
+    for q in (50, 95, 99):
+        assert merged.percentile(q) == combined.percentile(q)
+
+
+def test_histogram_merge_rejects_different_settings():
+    with pytest.raises(ValueError):
+        StreamingHistogram(0.01).merge(StreamingHistogram(0.02))
+
+
+def test_empty_histogram():
+    histogram = StreamingHistogram()
+    assert histogram.percentile(95) is None
+    assert histogram.mean is None
+
+
+def test_stats_from_results_match_response_metrics():
+    results = [Result(is_successful=True, is_sent=True, first_token_latency=0.1 * i, total_response_time=i,
+                          generation_time=0.5, token_count=10) for i in range(1, 101)]
+    stats = StreamingStats()
+    for result in results:
+        stats.update(ResponseMetrics.from_results([result]))
+    ttft = stats.histograms["first_token_latency"]
+    assert ttft.count == 100
+    expected = np.percentile([r.first_token_latency for r in results], 95, method="lower")
+    assert abs(ttft.percentile(95) - expected) <= 0.01 * expected
+    assert stats.total_tokens == 1000
+    assert stats.total_generation_time == pytest.approx(50.0)
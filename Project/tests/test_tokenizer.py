@@ -0,0 +1,30 @@
+import asyncio
+import threading
+from utils.tokenizer import TokenCounter
+
+
+def test_count_timed_in_concurrent_event_loops():
+    """ 多個執行緒同時以各自的 event loop 使用共用的 TokenCounter 時，每個請求都要完成 """
+    counter = TokenCounter.from_config({"tokenizer": {"mode": "approximate"}})
+    completed: dict[int, int] = {}
+
+    async def run(worker: int) -> None:
+        async def one(i: int) -> int:
+            count, _ = await asyncio.wait_for(counter.count_timed("x" * (4 * i)), timeout=1)
+            assert count == i
+            return count
+        completed[worker] = len(await asyncio.gather(*(one(i) for i in range(200))))
+
+    threads = [threading.Thread(target=asyncio.run, args=(run(worker),)) for worker in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert completed == {0: 200, 1: 200, 2: 200}
+
+
+def test_counter_is_shared_per_config():
+    a = TokenCounter.from_config({"tokenizer": {"mode": "approximate"}})
+    b = TokenCounter.from_config({"tokenizer": {"mode": "approximate"}})
+    assert a is b
+    assert asyncio.run(a.count("中文")) == 2
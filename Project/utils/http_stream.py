@@ -0,0 +1,186 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+from urllib.parse import urlsplit
+import asyncio
+import ssl
+
+
+class HttpStatusError(Exception):
+    """ 伺服器回應非 2xx 的狀態碼 """
+    def __init__(self, status: int, body: str = "") -> None:
+        super().__init__(f"HTTP {status} {body[:200]}".strip())
+        self.status = status
+
+
+class HttpResponse:
+    """ 串流中的 HTTP 回應，body 以 iter_chunks / iter_lines / iter_sse 逐步讀取 """
+    def __init__(self, reader: asyncio.StreamReader, status: int, headers: Dict[str, str], read_timeout: float) -> None:
+        self.status = status
+        self.headers = headers
+        self.read_timeout = read_timeout
+        self._reader = reader
+        self._chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+        self._remaining = int(headers["content-length"]) if "content-length" in headers and not self._chunked else None
+        self.complete = False       # body 是否已完整讀完（完整讀完才能讓連線回到連線池）
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        """ 依伺服器送出的順序逐段回傳 body（已處理 chunked 編碼） """
+        read = lambda coro: asyncio.wait_for(coro, self.read_timeout)
+        if self._chunked:
+            while True:
+                size_line = await read(self._reader.readline())
+                if not size_line:
+                    raise ConnectionError("連線在 chunked body 結束前中斷")
+                size = int(size_line.split(b";")[0].strip(), 16)
+                if size == 0:
+                    # 略過 trailer
+                    while (await read(self._reader.readline())).strip():
+                        pass
+                    break
+                chunk = await read(self._reader.readexactly(size))
+                await read(self._reader.readline())
+                yield chunk
+        elif self._remaining is not None:
+            while self._remaining > 0:
+                chunk = await read(self._reader.read(min(self._remaining, 65536)))
+                if not chunk:
+                    raise ConnectionError("連線在 body 結束前中斷")
+                self._remaining -= len(chunk)
+                yield chunk
+        else:
+            # 沒有長度資訊：讀到連線關閉為止（連線不可重複使用）
+            while chunk := await read(self._reader.read(65536)):
+                yield chunk
+            self.headers["connection"] = "close"
+        self.complete = True
+
+    async def iter_lines(self) -> AsyncIterator[str]:
+        """ 逐行回傳 body（不含換行字元） """
+        buffer = b""
+        async for chunk in self.iter_chunks():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                yield line.rstrip(b"\r").decode("utf-8", errors="replace")
+        if buffer:
+            yield buffer.rstrip(b"\r").decode("utf-8", errors="replace")
+
+    async def iter_sse(self) -> AsyncIterator[str]:
+        """ 解析 Server-Sent Events，逐一回傳每個事件的 data（多行 data 以換行串接） """
+        data: list[str] = []
+        async for line in self.iter_lines():
+            if not line:
+                if data:
+                    yield "\n".join(data)
+                    data = []
+            elif line.startswith("data:"):
+                data.append(line[6:] if line[5:6] == " " else line[5:])
+        if data:
+            yield "\n".join(data)
+
+    async def read(self) -> bytes:
+        return b"".join([chunk async for chunk in self.iter_chunks()])
+
+
+class HttpStreamClient:
+    """
+    以 asyncio streams 實作的 HTTP/1.1 串流客戶端。
+
+    連線以 keep-alive 保留在連線池中重複使用，每個主機的同時連線數以 max_connections_per_host 限制，
+    同一個 event loop 中的所有虛擬使用者共用一個客戶端即可產生數千條同時進行的串流。
+    """
+    def __init__(self, max_connections_per_host: int = 100, connect_timeout: float = 10, read_timeout: float = 60) -> None:
+        """ 初始化 HttpStreamClient
+
+        參數:
+            - max_connections_per_host (int, optional): 每個主機的同時連線數上限
+            - connect_timeout (float, optional): 建立連線的逾時（秒）
+            - read_timeout (float, optional): 每次讀取的逾時（秒），串流中兩段資料的間隔超過此值即視為失敗
+        """
+        self.max_connections_per_host = max_connections_per_host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.connections_opened = 0
+        self.requests = 0
+        self._idle: Dict[tuple, list[tuple[asyncio.StreamReader, asyncio.StreamWriter]]] = {}
+        self._limits: Dict[tuple, asyncio.Semaphore] = {}
+        self._ssl_context = ssl.create_default_context()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "HttpStreamClient":
+        """ 依配置建立客戶端（連線數上限預設為 concurrency） """
+        return cls(
+            max_connections_per_host=config.get("api_max_connections", config.get("concurrency", 100)),
+            read_timeout=config.get("api_timeout", 60))
+
+    @asynccontextmanager
+    async def request(self, method: str, url: str, headers: Dict[str, str] = None, body: bytes = b"") -> AsyncIterator[HttpResponse]:
+        """
+        送出請求並回傳串流中的回應。離開 context 時，若 body 已完整讀完且伺服器允許 keep-alive，
+        連線會回到連線池，否則關閉連線。
+        """
+        parts = urlsplit(url)
+        secure = parts.scheme == "https"
+        key = (parts.hostname, parts.port or (443 if secure else 80), secure)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        request_headers = {
+            "Host": parts.netloc,
+            "Connection": "keep-alive",
+            "Content-Length": str(len(body)),
+            **(headers or {}),
+        }
+        head = f"{method} {path} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in request_headers.items()) + "\r\n"
+
+        limit = self._limits.setdefault(key, asyncio.Semaphore(self.max_connections_per_host))
+        async with limit:
+            self.requests += 1
+            reader, writer, response = await self._send(key, head.encode("latin-1") + body)
+            reusable = False
+            try:
+                yield response
+                reusable = response.complete and response.headers.get("connection", "").lower() != "close"
+            finally:
+                if reusable:
+                    self._idle.setdefault(key, []).append((reader, writer))
+                else:
+                    writer.close()
+
+    async def close(self) -> None:
+        """ 關閉連線池中所有閒置的連線 """
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+    async def _send(self, key: tuple, payload: bytes) -> tuple[asyncio.StreamReader, asyncio.StreamWriter, HttpResponse]:
+        """ 以閒置連線（或新連線）送出請求並讀取回應標頭；閒置連線已被伺服器關閉時改用新連線重送一次 """
+        idle = self._idle.get(key)
+        while True:
+            reused = bool(idle)
+            if reused:
+                reader, writer = idle.pop()
+            else:
+                host, port, secure = key
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(host, port, ssl=self._ssl_context if secure else None), self.connect_timeout)
+                self.connections_opened += 1
+            try:
+                writer.write(payload)
+                await writer.drain()
+                status_line = await asyncio.wait_for(reader.readline(), self.read_timeout)
+                if not status_line:
+                    raise ConnectionResetError("伺服器關閉了連線")
+                headers = {}
+                while line := (await asyncio.wait_for(reader.readline(), self.read_timeout)).strip():
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+            except (ConnectionError, OSError):
+                writer.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            status = int(status_line.split()[1])
+            return reader, writer, HttpResponse(reader, status, headers, self.read_timeout)
@@ -1,49 +1,123 @@
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import sqlite3
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from datetime import datetime
-import regex as re
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    將日誌記錄輸出為一行 JSON，保留瀏覽器名稱、瀏覽器編號與是否為測試報告等結構化欄位。
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "created": record.created,
+            "name": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "browser_name": getattr(record, "browser_name", None),
+            "browser_index": getattr(record, "browser_index", None),
+            "report": getattr(record, "report", False),
+        }
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
 
 class CustomLogger(logging.Logger):
     """
     自訂 Logger 類別，增加 prettify_logger 方法。
+
+    日誌記錄先放進 queue（QueueHandler），由 QueueListener 在背景執行緒寫入文字日誌、
+    JSON lines 日誌與控制台，event loop 不會因為檔案 I/O 而被阻塞。
     """
-    def __init__(self, name, log_path,level=logging.INFO):
+    def __init__(self, name, log_path, level=logging.INFO, jsonl_path=None, backup_count=5):
         super().__init__(name, level)
         self.log_path = log_path
+        self.jsonl_path = jsonl_path
+        self.backup_count = backup_count
+        self.listener: QueueListener = None
+
+    def flush(self) -> None:
+        """
+        等待 queue 中的日誌全部寫入檔案。
+        """
+        if self.listener is not None and self.listener._thread is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.flush()
+            self.listener.start()
+
+    def close(self) -> None:
+        """
+        寫入剩餘的日誌並關閉所有檔案句柄。
+        """
+        if self.listener is not None:
+            if self.listener._thread is not None:
+                self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
+        for handler in self.handlers[:]:
+            handler.close()
+            self.removeHandler(handler)
 
     def prettify_logger(self) -> None:
         """
-        美化日誌檔案的輸出，主要格式化日誌內容。
+        美化日誌檔案的輸出：測試報告放在最前面，接著依瀏覽器分組列出測試細節。
+
+        以單次串流讀取所有輪轉的 JSON lines 日誌（由舊到新），逐行放進暫存的 SQLite 資料庫，
+        再依瀏覽器編號排序寫出，記憶體用量與日誌大小無關。
         """
+        if not self.jsonl_path:
+            return
         try:
-            # 以讀寫模式打開檔案
-            with open(self.log_path, 'r+', encoding='utf-8') as f:
-                lines = f.read()
-                report_matches = re.findall(r"=*\s測試結果\s=*.*", lines, re.MULTILINE|re.DOTALL)
-                report = report_matches[0].strip() if report_matches else ""
-                
-                details_list = []
-                index = 1
-                while True:
-                    details = re.findall(f"^.*測試瀏覽器:{index}"+r"\s.*$", lines, re.MULTILINE)
-                    if not details:
-                        break
-                    details_list.append('\n'.join(details))
-                    details_list.append('\n========================================================\n')
-                    index += 1
-
-                # 將檔案指標移回檔案開頭，並清空原內容
-                f.seek(0)
-                f.truncate()
-
-                if report:
-                    f.write(report)
-                    f.write('\n\n======================= 測試細節 =======================\n')
-                    
-                if details_list:
-                    for details in details_list:
-                        f.write(details)
+            self.flush()
+            # 輪轉後的檔案：.jsonl.N 最舊，.jsonl 最新
+            segments = [f"{self.jsonl_path}.{i}" for i in range(self.backup_count, 0, -1)] + [self.jsonl_path]
+            report = ""
+            # 空字串代表關閉後自動刪除的暫存資料庫
+            with sqlite3.connect("") as index:
+                index.execute("CREATE TABLE lines (browser_index INTEGER, browser_name TEXT, line TEXT)")
+                batch = []
+                for segment in segments:
+                    if not os.path.exists(segment):
+                        continue
+                    with open(segment, 'r', encoding='utf-8') as f:
+                        for raw in f:
+                            try:
+                                record = json.loads(raw)
+                            except json.JSONDecodeError:
+                                continue
+                            if record.get("report"):
+                                report = record["message"].strip()
+                            elif record.get("browser_name"):
+                                line = f"{record['time']} - {record['name']} - {record['level']} - {record['message']}"
+                                batch.append((record.get("browser_index"), record["browser_name"], line))
+                                if len(batch) >= 1000:
+                                    index.executemany("INSERT INTO lines VALUES (?, ?, ?)", batch)
+                                    batch.clear()
+                index.executemany("INSERT INTO lines VALUES (?, ?, ?)", batch)
+
+                with open(self.log_path, 'w', encoding='utf-8') as f:
+                    if report:
+                        f.write(report)
+                        f.write('\n\n======================= 測試細節 =======================\n')
+
+                    current = None
+                    rows = index.execute(
+                        "SELECT browser_index, browser_name, line FROM lines "
+                        "ORDER BY browser_index IS NULL, browser_index, browser_name, rowid")
+                    for browser_index, browser_name, line in rows:
+                        if current is not None and current != (browser_index, browser_name):
+                            f.write('\n========================================================\n')
+                        elif current is not None:
+                            f.write('\n')
+                        current = (browser_index, browser_name)
+                        f.write(line)
+                    if current is not None:
+                        f.write('\n========================================================\n')
         except Exception as e:
             print(f'日誌美化失敗：{e}')
 
@@ -56,8 +130,9 @@ def setup_logger(
 ) -> CustomLogger:
     """
     建立一個自訂 CustomLogger 實例，日誌檔案名稱格式：
-      serviceX_YYYY-MM-DD-hh-mm-ss.log
-    
+      serviceX_YYYY-MM-DD-hh-mm-ss.log      文字日誌（測試結束後會整理成報告 + 依瀏覽器分組的細節）
+      serviceX_YYYY-MM-DD-hh-mm-ss.jsonl    結構化的 JSON lines 日誌
+
     參數：
     - service_name: 服務名稱，例如 "service1"
     - log_dir: 儲存日誌的目錄，預設為當前目錄下的 "logs" 資料夾
@@ -77,10 +152,11 @@ def setup_logger(
     timestamp = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
     log_filename = f"{service_name}_{timestamp}.log"
     log_path = os.path.join(log_dir, log_filename)
+    jsonl_path = os.path.join(log_dir, f"{service_name}_{timestamp}.jsonl")
 
-    logger = CustomLogger(service_name,log_path)
+    logger = CustomLogger(service_name, log_path, jsonl_path=jsonl_path, backup_count=backup_count)
     logger.setLevel(level)
-    logger.propagate = False  
+    logger.propagate = False
 
     if logger.handlers:
         return logger
@@ -91,12 +167,20 @@ def setup_logger(
     # 檔案日誌處理器
     file_handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+
+    # 結構化日誌處理器
+    jsonl_handler = RotatingFileHandler(jsonl_path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    jsonl_handler.setFormatter(JsonLinesFormatter())
 
     # 控制台日誌處理器
     stream_handler = logging.StreamHandler()
     stream_handler.setFormatter(formatter)
-    logger.addHandler(stream_handler)
+
+    # 日誌先放進 queue，由背景執行緒寫入
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(log_queue))
+    logger.listener = QueueListener(log_queue, file_handler, jsonl_handler, stream_handler, respect_handler_level=True)
+    logger.listener.start()
 
     return logger
 
@@ -110,4 +194,5 @@ if __name__ == "__main__":
     logger.critical("這是 critical 級別的日誌")
 
     # 測試 prettify_logger()
-    
\ No newline at end of file
+    logger.prettify_logger()
+    logger.close()
@@ -0,0 +1,180 @@
+from typing import Any, Dict, Iterable
+import math
+import numpy as np
+
+
+class StreamingHistogram:
+    """
+    固定記憶體、可合併的對數分桶直方圖（與 DDSketch / HDR histogram 相同的概念）。
+
+    值落在 [min_value, max_value] 之間時，估計的分位數與真實值的相對誤差不超過 relative_accuracy；
+    小於 min_value 的值歸在最小的桶，大於 max_value 的值歸在最大的桶（最大值另外精確記錄）。
+    計數存放在固定長度的 numpy 陣列中，記憶體用量與資料筆數無關。
+    """
+    def __init__(self,
+                 relative_accuracy: float = 0.01,
+                 min_value: float = 1e-4,
+                 max_value: float = 1e4) -> None:
+        """ 初始化 StreamingHistogram
+
+        參數:
+            - relative_accuracy (float, optional): 分位數的相對誤差上限，預設為 1%
+            - min_value (float, optional): 可精確表示的最小值（秒），預設為 0.1 毫秒
+            - max_value (float, optional): 可精確表示的最大值（秒），預設為 10000 秒
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy 必須介於 0 與 1 之間")
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._offset = math.floor(math.log(min_value) / self._log_gamma)
+        size = math.ceil(math.log(max_value) / self._log_gamma) - self._offset + 1
+        self.counts = np.zeros(size, dtype=np.int64)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        """ 加入單一數值 """
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def add_many(self, values: Iterable[float]) -> None:
+        """ 以向量化的方式加入多個數值 """
+        values = np.asarray(list(values) if not isinstance(values, np.ndarray) else values, dtype=np.float64)
+        if values.size == 0:
+            return
+        clipped = np.clip(values, self.min_value, self.max_value)
+        indices = np.ceil(np.log(clipped) / self._log_gamma).astype(np.int64) - self._offset
+        np.add.at(self.counts, np.clip(indices, 0, len(self.counts) - 1), 1)
+        self.count += int(values.size)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other: "StreamingHistogram") -> None:
+        """ 合併另一個設定相同的直方圖 """
+        if (other.relative_accuracy, other.min_value, other.max_value) != (self.relative_accuracy, self.min_value, self.max_value):
+            raise ValueError("只能合併設定相同的 StreamingHistogram")
+        self.counts += other.counts
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q: float) -> float | None:
+        """ 估計第 q 百分位數（0~100），沒有資料時回傳 None """
+        if self.count == 0:
+            return None
+        if q >= 100:
+            return self.max
+        rank = q / 100 * (self.count - 1)
+        index = int(np.searchsorted(np.cumsum(self.counts), rank, side="right"))
+        value = 2 * self._gamma ** (index + self._offset) / (self._gamma + 1)
+        # 估計值不會超出實際觀測到的範圍
+        return min(max(value, self.min), self.max)
+
+    def fraction_above(self, value: float) -> float | None:
+        """ 估計大於 value 的資料比例（以 value 所在的桶為界），沒有資料時回傳 None """
+        if self.count == 0:
+            return None
+        return float(self.counts[self._index(value) + 1:].sum()) / self.count
+
+    @property
+    def mean(self) -> float | None:
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """ 序列化（只保存非零的桶） """
+        nonzero = np.nonzero(self.counts)[0]
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "min_value": self.min_value,
+            "max_value": self.max_value,
+            "buckets": {int(i): int(self.counts[i]) for i in nonzero},
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StreamingHistogram":
+        histogram = cls(data["relative_accuracy"], data["min_value"], data["max_value"])
+        for index, count in data["buckets"].items():
+            histogram.counts[int(index)] = count
+        histogram.count = data["count"]
+        histogram.sum = data["sum"]
+        if data["count"]:
+            histogram.min = data["min"]
+            histogram.max = data["max"]
+        return histogram
+
+    def _index(self, value: float) -> int:
+        value = min(max(value, self.min_value), self.max_value)
+        return min(max(math.ceil(math.log(value) / self._log_gamma) - self._offset, 0), len(self.counts) - 1)
+
+
+class StreamingStats:
+    """
+    長時間耐久測試用的串流統計：以 StreamingHistogram 取代逐筆保存的延遲列表，
+    每個工作階段在結果產生時更新，分片之間可直接合併。
+    """
+    # 以直方圖統計的欄位（對應 ResponseMetrics 中的列表欄位）
+    HISTOGRAM_FIELDS = ("first_token_latency", "total_response_time", "generation_time", "wire_first_token_latency",
+                        "inter_token_latency", "max_stall", "time_per_output_token")
+
+    def __init__(self, relative_accuracy: float = 0.01) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.histograms = {name: StreamingHistogram(relative_accuracy) for name in self.HISTOGRAM_FIELDS}
+        self.total_tokens = 0
+        self.total_generation_time = 0.0
+        self.token_count_seconds = 0.0
+        self.token_count_samples = 0
+
+    def update(self, metrics) -> None:
+        """ 以一個 ResponseMetrics（通常是一輪 run_test 的結果）更新統計 """
+        for name in self.HISTOGRAM_FIELDS:
+            values = getattr(metrics, name, None)
+            if values:
+                self.histograms[name].add_many(values)
+        self.total_tokens += sum(metrics.ai_response_token_count or [])
+        self.total_generation_time += sum(metrics.generation_time or [])
+        self.token_count_seconds += sum(metrics.token_count_time or [])
+        self.token_count_samples += len(metrics.token_count_time or [])
+
+    def merge(self, other: "StreamingStats") -> None:
+        """ 合併另一個 StreamingStats """
+        for name in self.HISTOGRAM_FIELDS:
+            self.histograms[name].merge(other.histograms[name])
+        self.total_tokens += other.total_tokens
+        self.total_generation_time += other.total_generation_time
+        self.token_count_seconds += other.token_count_seconds
+        self.token_count_samples += other.token_count_samples
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "histograms": {name: h.to_dict() for name, h in self.histograms.items()},
+            "total_tokens": self.total_tokens,
+            "total_generation_time": self.total_generation_time,
+            "token_count_seconds": self.token_count_seconds,
+            "token_count_samples": self.token_count_samples,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StreamingStats":
+        stats = cls(data["relative_accuracy"])
+        # 舊版資料可能缺少部分欄位，缺少的欄位保留空的直方圖
+        stats.histograms.update({name: StreamingHistogram.from_dict(h) for name, h in data["histograms"].items()})
+        stats.total_tokens = data["total_tokens"]
+        stats.total_generation_time = data["total_generation_time"]
+        stats.token_count_seconds = data["token_count_seconds"]
+        stats.token_count_samples = data["token_count_samples"]
+        return stats
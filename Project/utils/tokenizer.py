@@ -0,0 +1,167 @@
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict
+import asyncio
+import threading
+import time
+import weakref
+import tiktoken
+
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = "cl100k_base", model: str = None) -> tiktoken.Encoding:
+    """ 取得快取的 tiktoken encoder（整個行程共用，只會建立一次） """
+    if model:
+        return tiktoken.encoding_for_model(model)
+    return tiktoken.get_encoding(encoding_name)
+
+
+def encode_batch(texts: list[str], encoding_name: str = "cl100k_base", model: str = None) -> tuple[list[int], float]:
+    """
+    批次計算 token 數（可在 thread/process pool 中執行）
+
+    回傳：
+    - tuple[list[int], float]: 每段文字的 token 數，以及計算所花的時間（秒）
+    """
+    start = time.perf_counter()
+    enc = get_encoding(encoding_name, model)
+    counts = [len(tokens) for tokens in enc.encode_batch(texts, disallowed_special=())]
+    return counts, time.perf_counter() - start
+
+
+def approximate_batch(texts: list[str], chars_per_token: float = 4.0) -> tuple[list[int], float]:
+    """
+    以字元數粗估 token 數，適合超長時間的耐久測試。
+    ASCII 字元以 chars_per_token 個字元估為一個 token，非 ASCII 字元（例如中文）每個字估為一個 token。
+    """
+    start = time.perf_counter()
+    counts = []
+    for text in texts:
+        ascii_chars = len(text.encode("ascii", "ignore"))
+        counts.append(round(ascii_chars / chars_per_token) + (len(text) - ascii_chars))
+    return counts, time.perf_counter() - start
+
+
+# 整個行程共用的執行器，依種類與 worker 數量快取
+_executors: Dict[tuple, Executor] = {}
+_executors_lock = threading.Lock()
+
+def _get_executor(kind: str, max_workers: int = None) -> Executor:
+    with _executors_lock:
+        key = (kind, max_workers)
+        if key not in _executors:
+            if kind == "process":
+                _executors[key] = ProcessPoolExecutor(max_workers=max_workers)
+            else:
+                _executors[key] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tokenizer")
+        return _executors[key]
+
+
+class TokenCounter:
+    """
+    Token 計算服務：
+    - encoder 整個行程共用並快取
+    - 可依服務配置選擇 encoding / model
+    - 同一時間送來的文字會合併為一批，在 thread 或 process pool 中計算，不阻塞 event loop
+    - 可選擇以字元數粗估的 approximate 模式
+    - 另外回傳 token 計算本身的耗時（TestResult.token_count_time），與回應時間分開回報
+    """
+    def __init__(self,
+                 encoding: str = "cl100k_base",
+                 model: str = None,
+                 mode: str = "exact",
+                 executor: str = "thread",
+                 max_workers: int = None,
+                 batch_window: float = 0.005,
+                 chars_per_token: float = 4.0) -> None:
+        """ 初始化 TokenCounter
+
+        參數:
+            - encoding (str, optional): tiktoken encoding 名稱，預設為 cl100k_base
+            - model (str, optional): 模型名稱，若有設定則以 tiktoken.encoding_for_model 取得 encoding
+            - mode (str, optional): exact（精確計算）或 approximate（字元數粗估），預設為 exact
+            - executor (str, optional): thread 或 process，預設為 thread
+            - max_workers (int, optional): 執行器的 worker 數量
+            - batch_window (float, optional): 合併批次的等待時間（秒），預設為 0.005
+            - chars_per_token (float, optional): approximate 模式下每個 token 的 ASCII 字元數
+        """
+        if mode not in ("exact", "approximate"):
+            raise ValueError(f"不支援的 tokenizer mode: {mode}")
+        self.encoding = encoding
+        self.model = model
+        self.mode = mode
+        self.executor_kind = executor
+        self.max_workers = max_workers
+        self.batch_window = batch_window
+        self.chars_per_token = chars_per_token
+        # 同一個 TokenCounter 可能同時被多個執行緒中的 event loop 使用（例如 worker 同時執行多個分片），
+        # 待合併的請求依 event loop 分開保存，每個 loop 只解析自己的 future
+        self._pending: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, list[tuple[str, asyncio.Future]]] = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "TokenCounter":
+        """ 依服務配置中的 tokenizer 欄位建立 TokenCounter，並在相同設定間共用 """
+        options = config.get("tokenizer") or {}
+        key = tuple(sorted(options.items()))
+        with _counters_lock:
+            if key not in _counters:
+                _counters[key] = cls(**options)
+            return _counters[key]
+
+    async def count(self, text: str) -> int:
+        """ 非同步計算 token 數，會與同一時間的其他請求合併成一批在執行器中計算 """
+        count, _ = await self.count_timed(text)
+        return count
+
+    async def count_timed(self, text: str) -> tuple[int, float]:
+        """
+        同 count()，另外回傳這段文字分攤到的計算耗時（秒，依字元數比例分攤整批的耗時）
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            pending = self._pending.setdefault(loop, [])
+            pending.append((text, future))
+            first = len(pending) == 1
+        # 這個 loop 的第一個待合併請求負責排程 flush
+        if first:
+            loop.call_later(self.batch_window, self._flush, loop)
+        return await future
+
+    async def _count_batch(self, texts: list[str]) -> tuple[list[int], float]:
+        if not texts:
+            return [], 0.0
+        if self.mode == "approximate":
+            # 粗估的成本很低，直接在 event loop 上計算
+            counts, elapsed = approximate_batch(texts, self.chars_per_token)
+        else:
+            # 交給模組層級的 encode_batch，讓 process pool 也能 pickle
+            loop = asyncio.get_running_loop()
+            counts, elapsed = await loop.run_in_executor(
+                _get_executor(self.executor_kind, self.max_workers), encode_batch, texts, self.encoding, self.model)
+        return counts, elapsed
+
+    def _flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        with self._lock:
+            batch = self._pending.pop(loop, [])
+        if batch:
+            loop.create_task(self._resolve(batch))
+
+    async def _resolve(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        texts = [text for text, _ in batch]
+        try:
+            counts, elapsed = await self._count_batch(texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        total_chars = sum(len(text) for text in texts) or 1
+        for (text, future), count in zip(batch, counts):
+            if not future.done():
+                future.set_result((count, elapsed * (len(text) or 1) / total_chars))
+
+
+_counters: Dict[tuple, TokenCounter] = {}
+_counters_lock = threading.Lock()
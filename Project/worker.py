@@ -0,0 +1,17 @@
+import argparse
+from cli import LEVEL_MAP
+from modules.distributed import serve_worker
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='啟動分散式負載測試的 worker 伺服器')
+    parser.add_argument('--host', default='0.0.0.0', help='監聽位址 (預設: 0.0.0.0)')
+    parser.add_argument('--port', type=int, default=8765, help='監聽埠號 (預設: 8765)')
+    parser.add_argument(
+        '--log-level',
+        choices=['debug', 'info', 'error'],
+        default='info',
+        help='設定日誌級別 (預設: info)'
+    )
+    
+    args = parser.parse_args()
+    serve_worker(args.host, args.port, LEVEL_MAP[args.log_level])